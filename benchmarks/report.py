@@ -0,0 +1,113 @@
+"""Benchmark of the construction of the report of a parallelized batch.
+
+Compares `RemoteBatch.report`, which gathers the clusters of the shots with
+numpy, against the per-shot and per-cluster loop it replaced, on results of
+the mock backend.
+
+    python benchmarks/report.py --tasks 20 --shots 1000
+"""
+
+from bloqade.atom_arrangement import Chain
+from bloqade.submission.ir.task_results import ColumnarTaskResults
+from itertools import product
+import argparse
+import numpy as np
+import os
+import pandas as pd
+import tempfile
+import time
+
+
+def report_loop(batch) -> pd.DataFrame:
+    """Data of the report of `batch` built shot by shot and cluster by
+    cluster, as `RemoteBatch.report` did before its vectorization."""
+    index = []
+    data = []
+
+    for task_number, task in batch.tasks.items():
+        geometry = task.geometry
+        perfect_sorting = "".join(map(str, geometry.filling))
+        parallel_decoder = geometry.parallel_decoder
+
+        if parallel_decoder:
+            cluster_indices = parallel_decoder.get_cluster_indices()
+        else:
+            cluster_indices = {(0, 0): list(range(len(perfect_sorting)))}
+
+        results = ColumnarTaskResults.from_task_results(task.result())
+        completed = results.completed_shots
+
+        shot_iter = zip(
+            results.pre_sequences[completed], results.post_sequences[completed]
+        )
+
+        for (pre, post), (cluster_coordinate, cluster_index) in product(
+            shot_iter, cluster_indices.items()
+        ):
+            pre_sequence = "".join(map(str, pre[cluster_index]))
+            post_sequence = post[cluster_index].astype(np.int8)
+
+            pfc_sorting = "".join([perfect_sorting[index] for index in cluster_index])
+
+            key = (
+                task_number,
+                cluster_coordinate,
+                pfc_sorting,
+                pre_sequence,
+            )
+
+            index.append(key)
+            data.append(post_sequence)
+
+    index = pd.MultiIndex.from_tuples(
+        index, names=["task_number", "cluster", "perfect_sorting", "pre_sequence"]
+    )
+
+    return pd.DataFrame(data, index=index)
+
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--shots", type=int, default=1000)
+    parser.add_argument("--atoms", type=int, default=4)
+    parser.add_argument("--cluster-spacing", type=float, default=24.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # the mock backend stores the submitted tasks in its state file
+        state_file = os.path.join(directory, "mock_state.txt")
+        batch = (
+            Chain(args.atoms, lattice_spacing=6.1)
+            .rydberg.detuning.uniform.constant("detuning", 1.0)
+            .rabi.amplitude.uniform.constant(15.0, 1.0)
+            .batch_assign(detuning=np.linspace(-1.0, 1.0, args.tasks).tolist())
+            .parallelize(args.cluster_spacing)
+            .quera.mock(state_file=state_file)
+            .run_async(args.shots)
+        )
+        batch.fetch()
+
+    loop_time, expected = best_time(lambda: report_loop(batch), args.repeat)
+    report_time, report = best_time(batch.report, args.repeat)
+    pd.testing.assert_frame_equal(report.dataframe, expected)
+
+    print(f"rows: {len(expected)}")
+    print(f"per-shot loop: {loop_time:.3f}s")
+    print(f"RemoteBatch.report: {report_time:.3f}s")
+    print(f"speedup: {loop_time / report_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ from .assignment_scan import AssignmentScan
 from .check_slices import CheckSlices
 from .is_constant import IsConstant
 from .is_hyperfine import IsHyperfineSequence
+from .scan_breakpoints import ScanBreakpoints
 from .scan_channels import ScanChannels
 from .scan_variables import ScanVariables
 
@@ -11,6 +12,7 @@ __all__ = [
     "CheckSlices",
     "IsConstant",
     "IsHyperfineSequence",
+    "ScanBreakpoints",
     "ScanChannels",
     "ScanVariables",
 ]
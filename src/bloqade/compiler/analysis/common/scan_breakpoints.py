@@ -0,0 +1,142 @@
+import bloqade.ir.control.waveform as waveform
+from bloqade.builder.typing import LiteralType
+from bloqade.compiler.analysis.common.is_constant import IsConstant
+from bloqade.ir.visitor import BloqadeIRVisitor
+
+from decimal import Decimal
+from beartype.typing import Dict, List, Tuple
+from beartype import beartype
+
+# (start, stop, is_constant) of a time interval in which the waveform is smooth
+Segment = Tuple[Decimal, Decimal, bool]
+
+
+class ScanBreakpoints(BloqadeIRVisitor):
+    """Collect the times at which a waveform may fail to be smooth.
+
+    Breakpoints are the boundaries of the instructions in the waveform
+    (e.g. the joints of an `Append`) and the sample clocks of a `Sample`.
+    In between two consecutive breakpoints the waveform is a smooth
+    function of time. The start and the end of the waveform are always
+    included.
+    """
+
+    @beartype
+    def __init__(self, assignments: Dict[str, LiteralType] = {}) -> None:
+        self.assignments = dict(assignments)
+
+    def duration(self, node: waveform.Waveform) -> Decimal:
+        return node.duration(**self.assignments)
+
+    def is_constant(self, node: waveform.Waveform) -> bool:
+        return IsConstant(self.assignments).scan(node)
+
+    def segment(self, node: waveform.Waveform, is_constant: bool) -> List[Segment]:
+        duration = self.duration(node)
+        if duration == 0:
+            return []
+
+        return [(Decimal(0), duration, is_constant)]
+
+    @staticmethod
+    def constant_on(segments: List[Segment], start: Decimal, stop: Decimal) -> bool:
+        # waveforms evaluate to zero past their duration
+        for seg_start, seg_stop, is_constant in segments:
+            if seg_start <= start and stop <= seg_stop:
+                return is_constant
+
+        return not segments or start >= segments[-1][1]
+
+    def generic_visit(self, node: waveform.Waveform) -> List[Segment]:
+        return self.segment(node, self.is_constant(node))
+
+    def visit_waveform_Smooth(self, node: waveform.Smooth) -> List[Segment]:
+        # smoothing removes the discontinuities of the child waveform
+        return self.segment(node, self.is_constant(node.waveform))
+
+    def visit_waveform_Negative(self, node: waveform.Negative) -> List[Segment]:
+        return self.visit(node.waveform)
+
+    def visit_waveform_Scale(self, node: waveform.Scale) -> List[Segment]:
+        return self.visit(node.waveform)
+
+    def visit_waveform_Record(self, node: waveform.Record) -> List[Segment]:
+        return self.visit(node.waveform)
+
+    def visit_waveform_Add(self, node: waveform.Add) -> List[Segment]:
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+
+        times = sorted(
+            {time for start, stop, _ in left + right for time in (start, stop)}
+        )
+
+        return [
+            (
+                start,
+                stop,
+                self.constant_on(left, start, stop)
+                and self.constant_on(right, start, stop),
+            )
+            for start, stop in zip(times[:-1], times[1:])
+        ]
+
+    def visit_waveform_Append(self, node: waveform.Append) -> List[Segment]:
+        segments = []
+        offset = Decimal(0)
+        for wf in node.waveforms:
+            segments.extend(
+                (offset + start, offset + stop, is_constant)
+                for start, stop, is_constant in self.visit(wf)
+            )
+            offset += self.duration(wf)
+
+        return segments
+
+    def visit_waveform_Slice(self, node: waveform.Slice) -> List[Segment]:
+        start = node.start(**self.assignments)
+        stop = node.stop(**self.assignments)
+
+        return [
+            (max(seg_start, start) - start, min(seg_stop, stop) - start, is_constant)
+            for seg_start, seg_stop, is_constant in self.visit(node.waveform)
+            if seg_start < stop and seg_stop > start
+        ]
+
+    def visit_waveform_Sample(self, node: waveform.Sample) -> List[Segment]:
+        clocks, values = node.sample_values(**self.assignments)
+        values = values.tolist()
+
+        if node.interpolation is waveform.Interpolation.Constant:
+            return [
+                (start, stop, True)
+                for start, stop in zip(clocks[:-1], clocks[1:])
+                if start < stop
+            ]
+
+        return [
+            (start, stop, lhs == rhs)
+            for start, stop, lhs, rhs in zip(
+                clocks[:-1], clocks[1:], values[:-1], values[1:]
+            )
+            if start < stop
+        ]
+
+    def scan(self, node: waveform.Waveform) -> Tuple[Decimal, ...]:
+        """Sorted breakpoints of the waveform."""
+        breakpoints = {Decimal(0), self.duration(node)}
+        for start, stop, _ in self.visit(node):
+            breakpoints.update((start, stop))
+
+        return tuple(sorted(breakpoints))
+
+    def scan_constant_intervals(
+        self, node: waveform.Waveform
+    ) -> Tuple[Tuple[Decimal, Decimal], ...]:
+        """Sorted time intervals in which the waveform is constant, adjacent
+        intervals are not merged since the value may jump in between."""
+        return tuple(
+            (start, stop)
+            for start, stop, is_constant in self.visit(node)
+            if is_constant
+        )
@@ -1,22 +1,47 @@
 from decimal import Decimal
+from functools import lru_cache
 
 from beartype import beartype
 from bloqade.ir.visitor import BloqadeIRVisitor
 import bloqade.ir.control.waveform as waveform
 from bloqade.compiler.analysis.python.waveform import WaveformScanResult
-from beartype.typing import Optional, Tuple
+from beartype.typing import Any, Callable, Dict, List, Optional, Tuple
 from random import randint
 
 
+@lru_cache(maxsize=128)
+def _njit(fn: Callable) -> Callable:
+    # reuse the numba dispatcher of python functions shared between waveforms
+    from numba import njit
+
+    return njit(fn)
+
+
 class CodegenPythonWaveform(BloqadeIRVisitor):
+    """Generate a python function of time from a waveform.
+
+    With `parameterized=True` the numbers of the waveform are not written as
+    literals in the generated function but read from the array passed as its
+    second argument, the values of this array are collected in `params`.
+    Waveforms that only differ by their values then generate the same
+    function, which only has to be compiled once.
+    """
+
     def __init__(
         self,
         scan_result: WaveformScanResult,
         time_str: str = "time",
         indent_level: int = 0,
         jit_compiled: bool = True,
+        namespace: Optional[Dict[str, Any]] = None,
+        parameterized: bool = False,
+        params: Optional[List[Decimal]] = None,
     ):
         self.jit_compiled = jit_compiled
+        # globals of the generated function, shared with the nested generators
+        self.namespace = {} if namespace is None else namespace
+        self.parameterized = parameterized
+        self.params = [] if params is None else params
         self.time_str = time_str
         self.bindings = dict(scan_result.bindings)
         self.imports = dict(scan_result.imports)
@@ -34,24 +59,45 @@ class CodegenPythonWaveform(BloqadeIRVisitor):
 
         return func_binding
 
+    def literal(self, value: Decimal) -> str:
+        if not self.parameterized:
+            return str(value)
+
+        self.params.append(value)
+        return f"__bloqade_params[{len(self.params) - 1}]"
+
+    def nested(self, time_str: str, indent_level: int) -> "CodegenPythonWaveform":
+        return CodegenPythonWaveform(
+            WaveformScanResult(self.bindings, self.imports),
+            time_str=time_str,
+            indent_level=indent_level,
+            jit_compiled=self.jit_compiled,
+            namespace=self.namespace,
+            parameterized=self.parameterized,
+            params=self.params,
+        )
+
     def visit(self, node):
         super().visit(node)
         if isinstance(node, waveform.Waveform):
             self.head_binding = self.bindings[node]
 
     def visit_waveform_Constant(self, node: waveform.Constant):
-        self.exprs.append(f"{self.indent_expr}{self.bindings[node]} = {node.value()}")
+        self.exprs.append(
+            f"{self.indent_expr}{self.bindings[node]} = {self.literal(node.value())}"
+        )
 
     def visit_waveform_Linear(self, node: waveform.Linear):
         slope = (node.stop - node.start) / node.duration
 
         self.exprs.append(
             f"{self.indent_expr}{self.bindings[node]} = "
-            f"{slope()} * ({self.time_str}) + {node.start()}"
+            f"{self.literal(slope())} * ({self.time_str}) + "
+            f"{self.literal(node.start())}"
         )
 
     def visit_waveform_Poly(self, node: waveform.Poly):
-        coeff_values = [coeff() for coeff in node.coeffs]
+        coeff_values = [self.literal(coeff()) for coeff in node.coeffs]
         binding = self.bindings[node]
 
         terms = [str(coeff_values[0])] + [
@@ -62,16 +108,22 @@ class CodegenPythonWaveform(BloqadeIRVisitor):
         self.exprs.append(f"{self.indent_expr}{binding} = {term_sum}")
 
     def visit_waveform_PythonFn(self, node: waveform.PythonFn):
-        from numba import njit
-
         sorted_parameters = sorted(node.parameters, key=lambda p: p.name)
 
         args = ", ".join(
-            [f"{param.name} = {param.value}" for param in sorted_parameters]
+            [
+                f"{param.name} = {self.literal(param.value)}"
+                for param in sorted_parameters
+            ]
+        )
+        # parameterized functions must not depend on random names
+        func_binding = (
+            f"__bloqade_fn{len(self.namespace)}"
+            if self.parameterized
+            else self.gen_func_binding()
         )
-        func_binding = self.gen_func_binding()
 
-        globals()[func_binding] = njit(node.fn) if self.jit_compiled else node.fn
+        self.namespace[func_binding] = _njit(node.fn) if self.jit_compiled else node.fn
 
         if args:
             self.exprs.append(
@@ -100,13 +152,15 @@ class CodegenPythonWaveform(BloqadeIRVisitor):
             self.exprs.append(
                 f"{self.indent_expr}{self.bindings[node]} = "
                 f"{self.bindings[node.left]} + {self.bindings[node.right]} "
-                f"if {self.time_str} < {right_duration} else {self.bindings[node.left]}"
+                f"if {self.time_str} < {self.literal(right_duration)} "
+                f"else {self.bindings[node.left]}"
             )
         else:
             self.exprs.append(
                 f"{self.indent_expr}{self.bindings[node]} = "
                 f"{self.bindings[node.left]} + {self.bindings[node.right]} "
-                f"if {self.time_str} < {left_duration} else {self.bindings[node.right]}"
+                f"if {self.time_str} < {self.literal(left_duration)} "
+                f"else {self.bindings[node.right]}"
             )
 
     def visit_waveform_Negative(self, node: waveform.Negative):
@@ -119,16 +173,14 @@ class CodegenPythonWaveform(BloqadeIRVisitor):
         self.visit(node.waveform)
         self.exprs.append(
             f"{self.indent_expr}{self.bindings[node]} = "
-            f"{node.scalar()} * {self.bindings[node.waveform]}"
+            f"{self.literal(node.scalar())} * {self.bindings[node.waveform]}"
         )
 
     def visit_waveform_Slice(self, node: waveform.Slice):
         shift = node.interval.start() if node.interval.start else Decimal("0")
 
-        compiler = CodegenPythonWaveform(
-            WaveformScanResult(self.bindings, self.imports),
-            time_str=f"{self.time_str} + {shift}",
-            indent_level=self.indent_level,
+        compiler = self.nested(
+            f"{self.time_str} + {self.literal(shift)}", self.indent_level
         )
 
         compiler.visit(node.waveform)
@@ -144,31 +196,31 @@ class CodegenPythonWaveform(BloqadeIRVisitor):
 
         wf = node.waveforms[0]
 
-        compiler = CodegenPythonWaveform(
-            WaveformScanResult(self.bindings, self.imports),
-            time_str=f"{self.time_str} - {time_shift}",
-            indent_level=self.indent_level + 1,
+        compiler = self.nested(
+            f"{self.time_str} - {self.literal(time_shift)}", self.indent_level + 1
         )
 
         compiler.visit(wf)
         time_shift += wf.duration()
-        self.exprs.append(f"{self.indent_expr}if {self.time_str} < {time_shift}:")
+        self.exprs.append(
+            f"{self.indent_expr}if {self.time_str} < {self.literal(time_shift)}:"
+        )
         self.exprs.extend(compiler.exprs)
         self.exprs.append(
             f"{compiler.indent_expr}{self.bindings[node]} = {compiler.head_binding}"
         )
 
         for wf in node.waveforms[1:]:
-            compiler = CodegenPythonWaveform(
-                WaveformScanResult(self.bindings, self.imports),
-                time_str=f"{self.time_str} - {time_shift}",
-                indent_level=self.indent_level + 1,
+            compiler = self.nested(
+                f"{self.time_str} - {self.literal(time_shift)}",
+                self.indent_level + 1,
             )
 
             compiler.visit(wf)
             time_shift += wf.duration()
             self.exprs.append(
-                f"{self.indent_expr}elif {self.time_str} <= {time_shift}:"
+                f"{self.indent_expr}elif {self.time_str} <= "
+                f"{self.literal(time_shift)}:"
             )
             self.exprs.extend(compiler.exprs)
             self.exprs.append(
@@ -183,11 +235,13 @@ class CodegenPythonWaveform(BloqadeIRVisitor):
         self, node: waveform.Waveform, func_binding: Optional[str] = None
     ) -> Tuple[str, str]:
         func_binding = self.gen_func_binding() if func_binding is None else func_binding
+        args = "time, __bloqade_params" if self.parameterized else "time"
+        duration = self.literal(node.duration())
         self.visit(node)
         body = "\n".join(self.exprs)
         func = (
-            f"def {func_binding}(time):\n"
-            f"    if time > {node.duration()}:"
+            f"def {func_binding}({args}):\n"
+            f"    if time > {duration}:"
             f"\n        return 0"
             f"\n{body}"
             f"\n    return {self.head_binding}"
@@ -196,8 +250,25 @@ class CodegenPythonWaveform(BloqadeIRVisitor):
         return func_binding, func_code
 
     @beartype
-    def compile(self, node: waveform.Waveform):
-        func_binding, func = self.emit_func(node)
+    def emit_module(
+        self,
+        node: waveform.Waveform,
+        func_binding: Optional[str] = None,
+        cache: bool = False,
+    ) -> Tuple[str, str]:
+        """Generate the source of a module defining the waveform function.
+
+        Args:
+            node (waveform.Waveform): waveform to generate.
+            func_binding (Optional[str]): name of the function, a random name
+                is generated if not given.
+            cache (bool): whether numba should cache the compiled function
+                on disk, only possible if the module is written to a file.
+
+        Returns:
+            Tuple[str, str]: the name of the function and the module source.
+        """
+        func_binding, func = self.emit_func(node, func_binding)
         imports = "\n".join(
             [
                 f"from {module} import {', '.join(funcs)}"
@@ -206,17 +277,31 @@ class CodegenPythonWaveform(BloqadeIRVisitor):
         )
 
         if self.jit_compiled:
+            # the parameters may be a read-only global array of a numba function
+            args = (
+                'float64, Array(float64, 1, "C", readonly=True)'
+                if self.parameterized
+                else "float64"
+            )
+            options = ", cache=True" if cache else ""
             func = (
                 f"{imports}"
                 f"\nfrom numba import njit, float64"
+                f"\nfrom numba.types import Array"
                 f"\n\n"
-                f"@njit(float64(float64))"
+                f"@njit(float64({args}){options})"
                 f"\n{func}"
             )
         else:
             func = f"{imports}\n\n{func}"
 
-        globs = globals()
-        exec(func, globs)
+        return func_binding, func
+
+    @beartype
+    def compile(self, node: waveform.Waveform):
+        func_binding, func = self.emit_module(node)
+
+        # executed in its own namespace so the function is freed with it
+        exec(func, self.namespace)
 
-        return globs[func_binding]
+        return self.namespace[func_binding]
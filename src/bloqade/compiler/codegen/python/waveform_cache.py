@@ -0,0 +1,231 @@
+from collections import OrderedDict
+from hashlib import sha256
+from importlib.util import module_from_spec, spec_from_file_location
+from threading import Lock
+import os
+import sys
+
+import bloqade.ir.control.waveform as waveform
+from bloqade.compiler.analysis.python.waveform import WaveformScan
+from bloqade.compiler.codegen.python.waveform import CodegenPythonWaveform
+from beartype.typing import Any, Callable, Hashable, NamedTuple, Optional, Tuple
+from beartype import beartype
+from numpy.typing import NDArray
+import numpy as np
+
+
+class ParameterizedWaveform:
+    """Waveform function compiled once per waveform structure and called
+    with the values of the waveform as a parameter array."""
+
+    __slots__ = ("kernel", "params")
+
+    def __init__(self, kernel: Callable[[float, NDArray], float], params: NDArray):
+        self.kernel = kernel
+        self.params = params
+
+    def __call__(self, time: float) -> float:
+        return self.kernel(time, self.params)
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class CompiledWaveformCache:
+    """Cache of the waveforms compiled by `CodegenPythonWaveform`.
+
+    Waveforms are generated with their values as parameters, see
+    `CodegenPythonWaveform`, and the compiled kernels are keyed by the
+    generated source. Waveforms with the same structure, e.g. the tasks of a
+    parameter sweep, then share a single compiled kernel called with their
+    own parameters. The bound waveforms are also keyed by the canonicalized
+    waveform IR, i.e. its hash and structural equality, to skip the code
+    generation of repeated waveforms. Functions built from the kernels, e.g.
+    the coefficients of the emulator, are cached with them, see
+    `function`. At most `maxsize` kernels, waveforms and functions are
+    kept, the least recently used ones are evicted first.
+
+    If `cache_dir` is set, the generated source of the kernels is written
+    to that directory and numba caches the compiled kernel next to it, so
+    that the compilation is also reused across processes. Waveforms with a
+    `PythonFn` can not be written to disk and are only cached in memory.
+    The directory can be changed later with `set_cache_dir`, e.g. for the
+    process wide `compiled_waveforms`.
+
+    Args:
+        maxsize (int): maximum number of kernels and of waveforms kept in
+            memory.
+        cache_dir (Optional[str]): directory of the on-disk cache, disabled
+            if `None`. Defaults to None.
+    """
+
+    @beartype
+    def __init__(self, maxsize: int = 256, cache_dir: Optional[str] = None) -> None:
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._kernels = OrderedDict()
+        self._functions = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._kernels)
+
+    def info(self) -> CacheInfo:
+        """Hit/miss counters of the compilations and number of kernels."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._kernels))
+
+    @beartype
+    def set_cache_dir(self, cache_dir: Optional[str]) -> None:
+        """Set the directory of the on-disk cache of the kernels compiled
+        from now on, `None` disables it. The kernels already cached in
+        memory are kept.
+
+        Args:
+            cache_dir (Optional[str]): directory of the on-disk cache.
+
+        Examples:
+
+        ```python
+        >>> from bloqade.compiler.codegen.python.waveform_cache import (
+        ...     compiled_waveforms
+        ... )
+        >>> compiled_waveforms.set_cache_dir("~/.cache/bloqade/waveforms")
+        ```
+        """
+        if cache_dir is not None:
+            cache_dir = os.path.expanduser(cache_dir)
+
+        with self._lock:
+            self.cache_dir = cache_dir
+
+    def clear(self) -> None:
+        """Remove the kernels cached in memory and reset the counters."""
+        with self._lock:
+            self._cache.clear()
+            self._kernels.clear()
+            self._functions.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _get(self, cache: OrderedDict, key: Hashable) -> Any:
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+
+            return value
+
+    def _put(self, cache: OrderedDict, key: Hashable, value: Any) -> None:
+        with self._lock:
+            cache[key] = value
+            while len(cache) > self.maxsize:
+                cache.popitem(last=False)
+
+    def _compile_from_file(
+        self, node: waveform.Waveform
+    ) -> Callable[[float, NDArray], float]:
+        codegen = CodegenPythonWaveform(
+            WaveformScan().scan(node), jit_compiled=True, parameterized=True
+        )
+        func_binding, source = codegen.emit_module(node, "waveform", cache=True)
+
+        # the name of the module is the digest of its source, hence it is
+        # stable across processes unlike the hash of the IR.
+        digest = sha256(source.encode()).hexdigest()[:32]
+        module_name = f"__bloqade_waveform_{digest}"
+        path = os.path.join(self.cache_dir, f"{module_name}.py")
+
+        if not os.path.exists(path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as io:
+                io.write(source)
+
+            os.replace(tmp_path, path)
+
+        module = sys.modules.get(module_name)
+        if module is None:
+            spec = spec_from_file_location(module_name, path)
+            module = module_from_spec(spec)
+            # numba imports the module when loading the cached function
+            sys.modules[module_name] = module
+            spec.loader.exec_module(module)
+
+        return getattr(module, func_binding)
+
+    def _compile(
+        self, node: waveform.Waveform, jit_compiled: bool
+    ) -> ParameterizedWaveform:
+        codegen = CodegenPythonWaveform(
+            WaveformScan().scan(node), jit_compiled=jit_compiled, parameterized=True
+        )
+        func_binding, source = codegen.emit_module(node, "waveform")
+        params = np.array(codegen.params, dtype=np.float64)
+        # python functions called by the kernel are part of its structure
+        key = (source, jit_compiled, tuple(codegen.namespace.items()))
+
+        kernel = self._get(self._kernels, key)
+        if kernel is not None:
+            self.hits += 1
+            return ParameterizedWaveform(kernel, params)
+
+        self.misses += 1
+        if jit_compiled and self.cache_dir is not None and not codegen.namespace:
+            kernel = self._compile_from_file(node)
+        else:
+            # executed in its own namespace so the kernel is freed with it
+            exec(source, codegen.namespace)
+            kernel = codegen.namespace[func_binding]
+
+        self._put(self._kernels, key, kernel)
+        return ParameterizedWaveform(kernel, params)
+
+    @beartype
+    def compile(
+        self, node: waveform.Waveform, jit_compiled: bool = True
+    ) -> ParameterizedWaveform:
+        """Compile `node`, reusing the cached kernel if any.
+
+        Args:
+            node (waveform.Waveform): canonicalized waveform with all its
+                variables assigned.
+            jit_compiled (bool): compile the waveform with numba.
+
+        Returns:
+            ParameterizedWaveform: the compiled waveform, a function of time.
+        """
+        key: Tuple[Hashable, ...] = (node, jit_compiled)
+
+        func = self._get(self._cache, key)
+        if func is not None:
+            self.hits += 1
+            return func
+
+        func = self._compile(node, jit_compiled)
+        self._put(self._cache, key, func)
+        return func
+
+    def function(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """The function cached under `key`, built by calling `build` if
+        missing. The `key` must identify the structure of the function, e.g.
+        its source and the kernels it calls.
+        """
+        func = self._get(self._functions, key)
+        if func is None:
+            func = build()
+            self._put(self._functions, key, func)
+
+        return func
+
+
+compiled_waveforms = CompiledWaveformCache()
+"""Process wide cache of the waveforms compiled for the emulator, only kept
+in memory unless a directory is set with
+`compiled_waveforms.set_cache_dir`."""
@@ -0,0 +1,392 @@
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from functools import partial
+from itertools import accumulate
+
+import bloqade.ir.control.waveform as waveform
+from bloqade.ir.scalar import Scalar
+from bloqade.ir.visitor import BloqadeIRVisitor
+from beartype.typing import Any, Callable, Dict
+from beartype import beartype
+from numpy.typing import NDArray
+from scipy import integrate
+import numpy as np
+
+FloatWaveform = Callable[[float], float]
+ArrayWaveform = Callable[[NDArray], NDArray]
+
+
+class WaveformInterpreter(BloqadeIRVisitor):
+    """Lower a waveform into a python closure evaluated with floats.
+
+    The durations, the offsets of the appended waveforms and the literal
+    coefficients are evaluated once, so that calling the closure only
+    involves float arithmetic. The variables of the waveform must either be
+    assigned in the IR, e.g. the canonicalized IR of a `JITWaveform`, or be
+    given in `assignments`. The closure follows the semantics of
+    `Waveform.eval_decimal`.
+    """
+
+    def __init__(self, assignments: Dict[str, Any] = {}) -> None:
+        self.assignments = dict(assignments)
+
+    def scalar(self, node: Scalar) -> Decimal:
+        return node(**self.assignments)
+
+    def duration(self, node: waveform.Waveform) -> Decimal:
+        return node.duration(**self.assignments)
+
+    def generic_visit(self, node: waveform.Waveform) -> FloatWaveform:
+        # fall back to the decimal evaluation of the IR
+        return partial(node.__call__, **self.assignments)
+
+    def visit_waveform_Constant(self, node: waveform.Constant) -> FloatWaveform:
+        value = float(self.scalar(node.value))
+        duration = float(self.duration(node))
+
+        def constant(time: float) -> float:
+            return 0.0 if time > duration else value
+
+        return constant
+
+    def visit_waveform_Linear(self, node: waveform.Linear) -> FloatWaveform:
+        start = self.scalar(node.start)
+        duration = self.duration(node)
+
+        if duration.is_zero():
+
+            def linear(time: float) -> float:
+                if time > 0.0:
+                    return 0.0
+
+                raise ValueError(
+                    f"Duration of linear waveform is zero: {duration}. "
+                    "Cannot divide by zero."
+                )
+
+            return linear
+
+        slope = float((self.scalar(node.stop) - start) / duration)
+        start = float(start)
+        duration = float(duration)
+
+        def linear(time: float) -> float:
+            return 0.0 if time > duration else slope * time + start
+
+        return linear
+
+    def visit_waveform_Poly(self, node: waveform.Poly) -> FloatWaveform:
+        # highest order first for Horner's method
+        coeffs = [float(self.scalar(coeff)) for coeff in reversed(node.coeffs)]
+        duration = float(self.duration(node))
+
+        def poly(time: float) -> float:
+            if time > duration:
+                return 0.0
+
+            value = 0.0
+            for coeff in coeffs:
+                value = value * time + coeff
+
+            return value
+
+        return poly
+
+    def visit_waveform_PythonFn(self, node: waveform.PythonFn) -> FloatWaveform:
+        assignments = {**node.default_param_values, **self.assignments}
+        kwargs = {param.name: float(param(**assignments)) for param in node.parameters}
+        duration = float(node.duration(**assignments))
+        fn = node.fn
+
+        def python_fn(time: float) -> float:
+            return 0.0 if time > duration else float(fn(time, **kwargs))
+
+        return python_fn
+
+    def visit_waveform_Smooth(self, node: waveform.Smooth) -> FloatWaveform:
+        child = self.visit(node.waveform)
+        kernel = node.kernel
+        radius = float(self.scalar(node.radius))
+        duration = float(self.duration(node))
+        waveform_start = child(0.0)
+        waveform_stop = child(duration)
+
+        if isinstance(kernel, waveform.FiniteSmoothingKernel):
+            bounds = (-1, 1)
+        elif isinstance(kernel, waveform.InfiniteSmoothingKernel):
+            bounds = (-np.inf, np.inf)
+        else:
+            raise ValueError(f"Invalid kernel: {kernel}")
+
+        def clamped(time: float) -> float:
+            if time < 0:
+                return waveform_start
+            elif time > duration:
+                return waveform_stop
+            else:
+                return child(time)
+
+        def smooth(time: float) -> float:
+            def integrand(s):
+                return kernel(s) * clamped(radius * s + time)
+
+            return integrate.quad(integrand, *bounds, epsabs=1e-4, epsrel=1e-4)[0]
+
+        return smooth
+
+    def visit_waveform_Slice(self, node: waveform.Slice) -> FloatWaveform:
+        child = self.visit(node.waveform)
+        start = float(node.start(**self.assignments))
+        duration = float(self.duration(node))
+
+        def sliced(time: float) -> float:
+            return 0.0 if time > duration else child(time + start)
+
+        return sliced
+
+    def visit_waveform_Append(self, node: waveform.Append) -> FloatWaveform:
+        children = list(map(self.visit, node.waveforms))
+        # cumulative offsets are summed exactly before converting to float
+        stops = list(accumulate(map(self.duration, node.waveforms)))
+        starts = [0.0] + list(map(float, stops[:-1]))
+        stops = list(map(float, stops))
+
+        def append(time: float) -> float:
+            # first waveform that ends after `time`
+            index = bisect_left(stops, time)
+            if index == len(stops):
+                return 0.0
+
+            return children[index](time - starts[index])
+
+        return append
+
+    def visit_waveform_Negative(self, node: waveform.Negative) -> FloatWaveform:
+        child = self.visit(node.waveform)
+
+        def negative(time: float) -> float:
+            return -child(time)
+
+        return negative
+
+    def visit_waveform_Scale(self, node: waveform.Scale) -> FloatWaveform:
+        child = self.visit(node.waveform)
+        scalar = float(self.scalar(node.scalar))
+
+        def scale(time: float) -> float:
+            return scalar * child(time)
+
+        return scale
+
+    def visit_waveform_Add(self, node: waveform.Add) -> FloatWaveform:
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+
+        def add(time: float) -> float:
+            return left(time) + right(time)
+
+        return add
+
+    def visit_waveform_Record(self, node: waveform.Record) -> FloatWaveform:
+        return self.visit(node.waveform)
+
+    def visit_waveform_Sample(self, node: waveform.Sample) -> FloatWaveform:
+        clocks, samples = node.sample_values(**self.assignments)
+        stop = float(clocks[-1])
+        times = list(map(float, clocks))
+        values = samples.tolist()
+
+        if node.interpolation is waveform.Interpolation.Constant:
+            inner_times = times[1:]
+
+            def sample(time: float) -> float:
+                if time < 0 or time > stop:
+                    return 0.0
+
+                return values[bisect_right(inner_times, time)]
+
+            return sample
+
+        slopes = [
+            (rhs - lhs) / (t_rhs - t_lhs) if t_rhs != t_lhs else 0.0
+            for lhs, rhs, t_lhs, t_rhs in zip(
+                values[:-1], values[1:], times[:-1], times[1:]
+            )
+        ]
+
+        def sample(time: float) -> float:
+            if time < 0 or time > stop:
+                return 0.0
+
+            index = bisect_left(times, time)
+            if index == 0:
+                return values[0]
+
+            return slopes[index - 1] * (time - times[index - 1]) + values[index - 1]
+
+        return sample
+
+    @beartype
+    def emit(self, node: waveform.Waveform) -> FloatWaveform:
+        """Lower `node` into a function of time returning a float."""
+        return self.visit(node)
+
+
+class WaveformArrayInterpreter(WaveformInterpreter):
+    """Lower a waveform into a python closure evaluated on arrays of times.
+
+    The closure maps a float64 array of times to the array of values of the
+    waveform, using numpy operations for every node except `PythonFn` and
+    `Smooth` which are evaluated point by point.
+    """
+
+    @staticmethod
+    def masked(
+        func: ArrayWaveform, duration: float, offset: float = 0.0
+    ) -> ArrayWaveform:
+        # waveforms evaluate to zero past their duration, `func` is only
+        # called on the times within the duration shifted by `offset`
+        def masked(times: NDArray) -> NDArray:
+            values = np.zeros_like(times)
+            mask = times <= duration
+            values[mask] = func(times[mask] + offset)
+            return values
+
+        return masked
+
+    def pointwise(self, node: waveform.Waveform) -> ArrayWaveform:
+        func = WaveformInterpreter(self.assignments).visit(node)
+
+        def pointwise(times: NDArray) -> NDArray:
+            return np.fromiter(map(func, times), dtype=np.float64, count=len(times))
+
+        return pointwise
+
+    def generic_visit(self, node: waveform.Waveform) -> ArrayWaveform:
+        return self.pointwise(node)
+
+    def visit_waveform_Constant(self, node: waveform.Constant) -> ArrayWaveform:
+        value = float(self.scalar(node.value))
+
+        def constant(times: NDArray) -> NDArray:
+            return np.full_like(times, value)
+
+        return self.masked(constant, float(self.duration(node)))
+
+    def visit_waveform_Linear(self, node: waveform.Linear) -> ArrayWaveform:
+        if self.duration(node).is_zero():
+            return self.pointwise(node)
+
+        start = self.scalar(node.start)
+        duration = self.duration(node)
+        slope = float((self.scalar(node.stop) - start) / duration)
+        start = float(start)
+
+        def linear(times: NDArray) -> NDArray:
+            return slope * times + start
+
+        return self.masked(linear, float(duration))
+
+    def visit_waveform_Poly(self, node: waveform.Poly) -> ArrayWaveform:
+        # highest order first for Horner's method
+        coeffs = [float(self.scalar(coeff)) for coeff in reversed(node.coeffs)]
+
+        def poly(times: NDArray) -> NDArray:
+            values = np.zeros_like(times)
+            for coeff in coeffs:
+                values = values * times + coeff
+
+            return values
+
+        return self.masked(poly, float(self.duration(node)))
+
+    def visit_waveform_PythonFn(self, node: waveform.PythonFn) -> ArrayWaveform:
+        return self.pointwise(node)
+
+    def visit_waveform_Smooth(self, node: waveform.Smooth) -> ArrayWaveform:
+        return self.pointwise(node)
+
+    def visit_waveform_Slice(self, node: waveform.Slice) -> ArrayWaveform:
+        return self.masked(
+            self.visit(node.waveform),
+            float(self.duration(node)),
+            float(node.start(**self.assignments)),
+        )
+
+    def visit_waveform_Append(self, node: waveform.Append) -> ArrayWaveform:
+        children = list(map(self.visit, node.waveforms))
+        # cumulative offsets are summed exactly before converting to float
+        stops = list(accumulate(map(self.duration, node.waveforms)))
+        starts = [0.0] + list(map(float, stops[:-1]))
+        stops = np.array(list(map(float, stops)))
+
+        def append(times: NDArray) -> NDArray:
+            # first waveform that ends after each time
+            indices = np.searchsorted(stops, times, side="left")
+            values = np.zeros_like(times)
+            for index, (child, start) in enumerate(zip(children, starts)):
+                mask = indices == index
+                if mask.any():
+                    values[mask] = child(times[mask] - start)
+
+            return values
+
+        return append
+
+    def visit_waveform_Negative(self, node: waveform.Negative) -> ArrayWaveform:
+        child = self.visit(node.waveform)
+
+        def negative(times: NDArray) -> NDArray:
+            return -child(times)
+
+        return negative
+
+    def visit_waveform_Scale(self, node: waveform.Scale) -> ArrayWaveform:
+        child = self.visit(node.waveform)
+        scalar = float(self.scalar(node.scalar))
+
+        def scale(times: NDArray) -> NDArray:
+            return scalar * child(times)
+
+        return scale
+
+    def visit_waveform_Add(self, node: waveform.Add) -> ArrayWaveform:
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+
+        def add(times: NDArray) -> NDArray:
+            return left(times) + right(times)
+
+        return add
+
+    def visit_waveform_Record(self, node: waveform.Record) -> ArrayWaveform:
+        return self.visit(node.waveform)
+
+    def visit_waveform_Sample(self, node: waveform.Sample) -> ArrayWaveform:
+        clocks, values = node.sample_values(**self.assignments)
+        times = np.array(list(map(float, clocks)))
+        stop = times[-1]
+
+        if node.interpolation is waveform.Interpolation.Constant:
+
+            def interpolate(times_: NDArray) -> NDArray:
+                return values[np.searchsorted(times[1:], times_, side="right")]
+
+        else:
+
+            def interpolate(times_: NDArray) -> NDArray:
+                return np.interp(times_, times, values)
+
+        def sample(times_: NDArray) -> NDArray:
+            result = np.zeros_like(times_)
+            mask = (times_ >= 0) & (times_ <= stop)
+            result[mask] = interpolate(times_[mask])
+            return result
+
+        return sample
+
+    @beartype
+    def emit(self, node: waveform.Waveform) -> ArrayWaveform:
+        """Lower `node` into a function mapping an array of times to the array
+        of values."""
+        return self.visit(node)
@@ -0,0 +1,184 @@
+from bisect import bisect_left
+
+import bloqade.ir.control.waveform as waveform
+from bloqade.compiler.analysis.common.scan_breakpoints import ScanBreakpoints
+from bloqade.compiler.codegen.python.waveform_interpreter import (
+    ArrayWaveform,
+    WaveformArrayInterpreter,
+)
+from beartype.typing import Dict, List, Tuple
+from beartype import beartype
+from numpy.typing import NDArray
+import numpy as np
+
+# fractions of an interval at which the linear interpolation is checked
+_PROBES = np.array([0.25, 0.5, 0.75])
+
+
+class TabulatedWaveform:
+    """Piecewise linear interpolation of a waveform tabulated on a time grid.
+
+    `times` is sorted and contains every breakpoint of the waveform. At a
+    jump the breakpoint is repeated with the limits of the waveform from
+    the left and from the right, `jumps` maps these breakpoints to the
+    value of the waveform at the breakpoint. Before the first time the
+    waveform evaluates to its first value and past the last time to zero.
+    """
+
+    def __init__(
+        self, times: NDArray, values: NDArray, jumps: Dict[float, float] = {}
+    ) -> None:
+        self.times = np.ascontiguousarray(times, dtype=np.float64)
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+        self.jumps = dict(jumps)
+
+        # python lists are faster than numpy arrays for scalar lookups
+        self._times = self.times.tolist()
+        self._values = self.values.tolist()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slopes = np.diff(self.values) / np.diff(self.times)
+
+        # repeated times are never interpolated in between
+        self._slopes = np.where(np.isfinite(slopes), slopes, 0.0).tolist()
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def __call__(self, time: float) -> float:
+        index = bisect_left(self._times, time)
+
+        if index == len(self._times):
+            return 0.0
+
+        if index == 0 or self._times[index] == time:
+            return self.jumps.get(time, self._values[index])
+
+        index -= 1
+        return self._slopes[index] * (time - self._times[index]) + self._values[index]
+
+
+class TabulateWaveform:
+    """Tabulate a waveform on a grid exact at its breakpoints.
+
+    In between two breakpoints the grid is refined until the linear
+    interpolation matches the waveform within `atol + rtol * |value|` at
+    a few probe points of every interval, or until the intervals have been
+    halved `max_depth` times. Piecewise linear waveforms are tabulated
+    exactly with only their breakpoints. The waveform must have all its
+    variables assigned, e.g. the canonicalized IR of a `JITWaveform`.
+
+    Args:
+        atol (float): absolute tolerance of the interpolation.
+        rtol (float): relative tolerance of the interpolation.
+        max_depth (int): maximum number of times an interval is halved.
+    """
+
+    @beartype
+    def __init__(
+        self, atol: float = 1e-7, rtol: float = 1e-7, max_depth: int = 16
+    ) -> None:
+        self.atol = atol
+        self.rtol = rtol
+        self.max_depth = max_depth
+
+    def close(self, lhs: float, rhs: float) -> bool:
+        return abs(lhs - rhs) <= self.atol + self.rtol * max(abs(lhs), abs(rhs))
+
+    def refine(
+        self,
+        func: ArrayWaveform,
+        start: float,
+        stop: float,
+        start_value: float,
+        stop_value: float,
+    ) -> Tuple[NDArray, NDArray]:
+        """Grid of the open interval `(start, stop)` given the limits of the
+        waveform at its ends."""
+        grid_times = []
+        grid_values = []
+
+        starts = np.array([start])
+        stops = np.array([stop])
+        start_values = np.array([start_value])
+        stop_values = np.array([stop_value])
+
+        for depth in range(self.max_depth + 1):
+            probe_times = starts[:, None] + (stops - starts)[:, None] * _PROBES
+            probe_values = func(probe_times.ravel()).reshape(probe_times.shape)
+            linear_values = (
+                start_values[:, None] + (stop_values - start_values)[:, None] * _PROBES
+            )
+
+            scale = np.maximum(np.abs(start_values), np.abs(stop_values))
+            error = np.abs(probe_values - linear_values).max(axis=1)
+            refine = error > self.atol + self.rtol * scale
+
+            if depth == self.max_depth or not refine.any():
+                break
+
+            # the midpoints of the refined intervals are kept on the grid
+            mid_times = probe_times[refine, 1]
+            mid_values = probe_values[refine, 1]
+            grid_times.append(mid_times)
+            grid_values.append(mid_values)
+
+            starts = np.concatenate((starts[refine], mid_times))
+            stops = np.concatenate((mid_times, stops[refine]))
+            start_values = np.concatenate((start_values[refine], mid_values))
+            stop_values = np.concatenate((mid_values, stop_values[refine]))
+
+        if not grid_times:
+            return np.empty(0), np.empty(0)
+
+        grid_times = np.concatenate(grid_times)
+        grid_values = np.concatenate(grid_values)
+        order = np.argsort(grid_times)
+
+        return grid_times[order], grid_values[order]
+
+    @beartype
+    def emit(self, node: waveform.Waveform) -> TabulatedWaveform:
+        """Tabulate `node` and return the interpolating function of time."""
+        func = WaveformArrayInterpreter().emit(node)
+        scan = ScanBreakpoints()
+        segments = scan.visit(node)
+        breakpoints = scan.scan(node)
+
+        points = np.array(list(map(float, breakpoints)))
+        values = func(points)
+        # limits from the left and from the right of every breakpoint
+        lefts = func(np.nextafter(points, -np.inf))
+        rights = func(np.nextafter(points, np.inf))
+        lefts[0] = values[0]
+        rights[-1] = values[-1]
+
+        grid_times: List[NDArray] = []
+        grid_values: List[NDArray] = []
+        jumps = {}
+
+        for index, time in enumerate(points):
+            if self.close(lefts[index], rights[index]) and self.close(
+                lefts[index], values[index]
+            ):
+                grid_times.append(points[index : index + 1])
+                grid_values.append(values[index : index + 1])
+                rights[index] = values[index]
+            else:
+                grid_times.append(np.array([time, time]))
+                grid_values.append(np.array([lefts[index], rights[index]]))
+                jumps[float(time)] = float(values[index])
+
+            if index + 1 == len(points) or scan.constant_on(
+                segments, breakpoints[index], breakpoints[index + 1]
+            ):
+                continue
+
+            refined_times, refined_values = self.refine(
+                func, time, points[index + 1], rights[index], lefts[index + 1]
+            )
+            grid_times.append(refined_times)
+            grid_values.append(refined_values)
+
+        return TabulatedWaveform(
+            np.concatenate(grid_times), np.concatenate(grid_values), jumps
+        )
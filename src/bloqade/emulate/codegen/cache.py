@@ -0,0 +1,417 @@
+from bloqade.emulate.codegen.hamiltonian import CompileCache
+from bloqade.emulate.ir.emulator import Register
+from dataclasses import dataclass, fields, is_dataclass
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict, List, Optional
+import hashlib
+import importlib.metadata
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+import weakref
+import datetime
+import numpy as np
+
+# arrays smaller than this are pickled with the objects instead of mapped
+MIN_MAPPED_BYTES = 4096
+# version of the format of the entries of the persistent caches
+CACHE_VERSION = 1
+# errors raised when loading an entry stored by another version of bloqade or
+# a corrupted one, such entries are removed and built again
+_LOAD_ERRORS = (
+    pickle.UnpicklingError,
+    AttributeError,
+    EOFError,
+    ImportError,
+    IndexError,
+    OSError,
+    TypeError,
+    ValueError,
+)
+
+
+def _canonical(obj: Any) -> Any:
+    """Canonical form of a cache key made of builtin types, the registers
+    being identified by their atom type, sites and blockade radius."""
+    if isinstance(obj, Register):
+        return (
+            "Register",
+            type(obj.atom_type).__name__,
+            tuple(tuple(map(str, site)) for site in obj.sites),
+            str(obj.blockade_radius),
+        )
+    elif isinstance(obj, Enum):
+        return (type(obj).__name__, obj.value)
+    elif is_dataclass(obj):
+        return (type(obj).__name__,) + tuple(
+            _canonical(getattr(obj, f.name)) for f in fields(obj)
+        )
+    elif isinstance(obj, dict):
+        return tuple(
+            sorted((_canonical(key), _canonical(value)) for key, value in obj.items())
+        )
+    elif isinstance(obj, (tuple, list)):
+        return tuple(map(_canonical, obj))
+    elif isinstance(obj, (Decimal, float)):
+        return str(obj)
+    else:
+        return obj
+
+
+def stable_hash(key: Any) -> str:
+    """Hash of a cache key that does not depend on the process."""
+    return hashlib.sha256(repr(_canonical(key)).encode()).hexdigest()
+
+
+class _ArrayPickler(pickle.Pickler):
+    """Pickle an object, saving its large arrays in `.npy` files."""
+
+    def __init__(self, file, directory: str):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+        self.n_arrays = 0
+
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        if (
+            type(obj) is not np.ndarray
+            or obj.dtype.hasobject
+            or obj.nbytes < MIN_MAPPED_BYTES
+        ):
+            return None
+
+        filename = f"{self.n_arrays}.npy"
+        np.save(os.path.join(self.directory, filename), obj)
+        self.n_arrays += 1
+        return filename
+
+
+class _ArrayUnpickler(pickle.Unpickler):
+    """Unpickle an object, mapping the arrays saved by `_ArrayPickler`."""
+
+    def __init__(self, file, directory: str):
+        super().__init__(file)
+        self.directory = directory
+
+    def persistent_load(self, filename: str) -> np.ndarray:
+        # copy-on-write mapping, the pages are shared between the processes
+        array = np.load(os.path.join(self.directory, filename), mmap_mode="c")
+        return array.view(np.ndarray)
+
+
+def _remove_directory(directory: str, pid: int) -> None:
+    # the copies of the cache in other processes must not remove it
+    if os.getpid() == pid:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class ObjectStore:
+    """Objects stored in a directory, one sub-directory per key named after
+    the `stable_hash` of the key, the arrays being memory mapped when loaded.
+
+    The objects are written to a temporary directory which is then renamed,
+    so that processes concurrently storing the same key never read partial
+    entries, the first one to finish wins. The loaded objects are kept in
+    memory, they must not be modified.
+
+    Args:
+        directory (str): directory of the entries, created if missing.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.objects: Dict[str, Any] = {}
+
+    def __contains__(self, key: Any) -> bool:
+        # the entry is loaded, it can not be removed before it is used
+        try:
+            self[key]
+        except KeyError:
+            return False
+
+        return True
+
+    def __getitem__(self, key: Any) -> Any:
+        name = stable_hash(key)
+        if name in self.objects:
+            return self.objects[name]
+
+        path = os.path.join(self.directory, name)
+        try:
+            file = open(os.path.join(path, "object.pkl"), "rb")
+        except FileNotFoundError:
+            raise KeyError(key)
+
+        with file:
+            try:
+                obj = _ArrayUnpickler(file, path).load()
+            except _LOAD_ERRORS:
+                shutil.rmtree(path, ignore_errors=True)
+                raise KeyError(key)
+
+        self.objects[name] = obj
+        self._loaded(path)
+        return obj
+
+    def __setitem__(self, key: Any, obj: Any) -> None:
+        name = stable_hash(key)
+        self.objects[name] = obj
+
+        path = os.path.join(self.directory, name)
+        if os.path.isdir(path):
+            return
+
+        self._write(path, obj)
+        self._stored(path)
+
+    def _loaded(self, path: str) -> None:
+        """Called after the entry at `path` is loaded."""
+
+    def _stored(self, path: str) -> None:
+        """Called after the entry at `path` is stored."""
+
+    def _write(self, path: str, obj: Any) -> None:
+        name = os.path.basename(path)
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = os.path.join(self.directory, f".{name}-{uuid.uuid4().hex}")
+        os.mkdir(tmp_path)
+        try:
+            buffer = io.BytesIO()
+            _ArrayPickler(buffer, tmp_path).dump(obj)
+            with open(os.path.join(tmp_path, "object.pkl"), "wb") as file:
+                file.write(buffer.getvalue())
+
+            os.rename(tmp_path, path)
+        except OSError:
+            # another process stored the same key first
+            if not os.path.isdir(path):
+                raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+# stores of the shared caches attached to in this process
+_shared_stores: "weakref.WeakValueDictionary[str, _SharedStores]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+class _SharedStores:
+    def __init__(self, directory: str, owner_pid: int):
+        self.directory = directory
+        self.space_cache = ObjectStore(os.path.join(directory, "spaces"))
+        self.operator_cache = ObjectStore(os.path.join(directory, "operators"))
+
+        if os.getpid() == owner_pid:
+            weakref.finalize(self, _remove_directory, directory, owner_pid)
+
+    @classmethod
+    def attach(cls, directory: str, owner_pid: int) -> "_SharedStores":
+        stores = _shared_stores.get(directory)
+        if stores is None:
+            stores = cls(directory, owner_pid)
+            _shared_stores[directory] = stores
+
+        return stores
+
+
+class SharedCompileCache(CompileCache):
+    """Compile cache shared between processes.
+
+    The spaces and operators are stored in a temporary directory, in
+    `/dev/shm` if available, the arrays of the configurations, diagonals,
+    index mappings and sparse matrices being saved as `.npy` files. The
+    cache pickles as the path of its directory, processes receiving it map
+    the arrays stored by any other process instead of rebuilding them, so
+    that the operators of the tasks sharing a register are built once and
+    their memory is shared. The directory is removed when the cache is
+    garbage collected in the process that created it.
+
+    Args:
+        directory (Optional[str]): parent directory of the temporary
+            directory of the cache. Defaults to `/dev/shm` if it exists,
+            the default temporary directory otherwise.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        if directory is None and os.path.isdir("/dev/shm"):
+            directory = "/dev/shm"
+
+        self._attach(tempfile.mkdtemp(prefix="bloqade-cache-", dir=directory))
+
+    def _attach(self, directory: str, owner_pid: Optional[int] = None) -> None:
+        self.owner_pid = os.getpid() if owner_pid is None else owner_pid
+        self._stores = _SharedStores.attach(directory, self.owner_pid)
+        self.directory = directory
+        self.space_cache = self._stores.space_cache
+        self.operator_cache = self._stores.operator_cache
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"directory": self.directory, "owner_pid": self.owner_pid}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self._attach(state["directory"], state["owner_pid"])
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """Entry of a `PersistentCompileCache`.
+
+    Attributes:
+        kind (str): "spaces" or "operators".
+        name (str): the hash of the key of the entry.
+        size (int): size of the files of the entry in bytes.
+        last_used (datetime.datetime): last time the entry was stored or
+            loaded.
+    """
+
+    kind: str
+    name: str
+    size: int
+    last_used: datetime.datetime
+
+
+def _entry_size(path: str) -> int:
+    with os.scandir(path) as files:
+        return sum(file.stat().st_size for file in files if file.is_file())
+
+
+class _PersistentStore(ObjectStore):
+    def __init__(self, directory: str, cache: "PersistentCompileCache"):
+        super().__init__(directory)
+        self.cache = cache
+
+    def _loaded(self, path: str) -> None:
+        # the modification time of the entries orders them for the eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _stored(self, path: str) -> None:
+        self.cache.evict(keep=path)
+
+
+class PersistentCompileCache(CompileCache):
+    """Compile cache persisted in a directory across sessions.
+
+    The spaces and operators are stored as in `SharedCompileCache`, their
+    arrays being memory mapped when loaded, and keyed by a stable hash of
+    the register (atom type, sites and blockade radius), level coupling and
+    operator data, so that identical programs skip their construction in
+    later sessions. The entries are stored in a sub-directory named after
+    the version of bloqade, entries that fail to load are rebuilt. The least
+    recently used entries are evicted when the size of the cache exceeds
+    `max_size`. The cache can be shared between processes.
+
+    Args:
+        directory (Optional[str]): directory of the cache. Defaults to
+            `~/.cache/bloqade/compile_cache`.
+        max_size (int): maximum size of the cache in bytes. Defaults to
+            4 GiB.
+
+    Examples:
+
+    ```python
+    >>> cache = PersistentCompileCache(max_size=2**30)
+    >>> batch = program.bloqade.python().run(100, cache_matrices=cache)
+    >>> for entry in cache.entries():
+    ...     print(entry.kind, entry.size, entry.last_used)
+    >>> cache.clear()
+    ```
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_size: int = 2**32):
+        if directory is None:
+            directory = os.path.join(
+                os.path.expanduser("~"), ".cache", "bloqade", "compile_cache"
+            )
+
+        self.directory = directory
+        self.max_size = max_size
+        self.space_cache = _PersistentStore(self._path("spaces"), self)
+        self.operator_cache = _PersistentStore(self._path("operators"), self)
+
+    @property
+    def _root(self) -> str:
+        # the pickled objects are only compatible with the classes of the
+        # version of bloqade that stored them
+        version = importlib.metadata.version("bloqade")
+        return os.path.join(self.directory, f"v{CACHE_VERSION}-bloqade-{version}")
+
+    def _path(self, kind: str) -> str:
+        return os.path.join(self._root, kind)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"directory": self.directory, "max_size": self.max_size}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)
+
+    def entries(self) -> List[CacheEntry]:
+        """The entries of the cache, the least recently used first."""
+        entries = []
+        for kind in ("spaces", "operators"):
+            directory = self._path(kind)
+            if not os.path.isdir(directory):
+                continue
+
+            with os.scandir(directory) as paths:
+                for path in paths:
+                    # skip the entries being written
+                    if path.name.startswith(".") or not path.is_dir():
+                        continue
+
+                    try:
+                        size = _entry_size(path.path)
+                        mtime = path.stat().st_mtime
+                    except FileNotFoundError:
+                        # removed by another process
+                        continue
+
+                    last_used = datetime.datetime.fromtimestamp(mtime)
+                    entries.append(CacheEntry(kind, path.name, size, last_used))
+
+        entries.sort(key=lambda entry: entry.last_used)
+        return entries
+
+    def size(self) -> int:
+        """Total size of the entries of the cache in bytes."""
+        return sum(entry.size for entry in self.entries())
+
+    def evict(self, max_size: Optional[int] = None, keep: Optional[str] = None):
+        """Remove the least recently used entries until the size of the cache
+        is at most `max_size`, defaults to the `max_size` of the cache. The
+        entry at the path `keep` is never removed."""
+        if max_size is None:
+            max_size = self.max_size
+
+        entries = self.entries()
+        size = sum(entry.size for entry in entries)
+        for entry in entries:
+            if size <= max_size:
+                break
+
+            path = os.path.join(self._path(entry.kind), entry.name)
+            if path == keep:
+                continue
+
+            shutil.rmtree(path, ignore_errors=True)
+            size -= entry.size
+
+    def clear(self) -> None:
+        """Remove all the entries of the cache, including the ones stored by
+        other versions of bloqade."""
+        if os.path.isdir(self.directory):
+            with os.scandir(self.directory) as paths:
+                for path in paths:
+                    if path.name.startswith("v") and path.is_dir():
+                        shutil.rmtree(path.path, ignore_errors=True)
+
+
+        self.space_cache.objects.clear()
+        self.operator_cache.objects.clear()
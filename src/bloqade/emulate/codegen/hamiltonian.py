@@ -11,7 +11,7 @@ from bloqade.emulate.ir.emulator import (
     RabiTerm,
     Visitor,
 )
-from bloqade.emulate.ir.space import Space
+from bloqade.emulate.ir.space import Space, SpaceType
 from bloqade.emulate.ir.atom_type import (
     TwoLevelAtomType,
     ThreeLevelAtomType,
@@ -22,17 +22,137 @@ from bloqade.emulate.ir.state_vector import (
     RydbergHamiltonian,
 )
 from bloqade.emulate.sparse_operator import (
+    BitFlipOperator,
     IndexMapping,
     SparseMatrixCSR,
 )
 from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+from numba import njit
 import numpy as np
 from numpy.typing import NDArray
-from typing import Dict, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
+from decimal import Decimal
 from dataclasses import dataclass, field
 
 OperatorData = Union[DetuningOperatorData, RabiOperatorData]
-MatrixTypes = Union[csr_matrix, IndexMapping, NDArray]
+MatrixTypes = Union[csr_matrix, IndexMapping, BitFlipOperator, NDArray]
+
+
+# size of the tables of the interaction between two chunks of atoms
+MAX_CHUNK_STATES = 256
+
+
+def _interaction_matrix(
+    sites: List[Tuple[Decimal, ...]], cutoff: Optional[float] = None
+) -> NDArray:
+    """Upper triangular matrix of the rydberg interaction `C6/r^6` between
+    the sites. Only the pairs within `cutoff` are included if set."""
+    n_atom = len(sites)
+    positions = np.asarray(sites, dtype=np.float64).reshape(n_atom, -1)
+
+    if cutoff is None:
+        pairs = np.stack(np.triu_indices(n_atom, 1), axis=1)
+    elif n_atom > 1:
+        # candidates from the KD-tree, the distance is checked exactly below
+        tree = cKDTree(positions)
+        pairs = tree.query_pairs(cutoff * (1 + 1e-12), output_type="ndarray")
+    else:
+        pairs = np.empty((0, 2), dtype=np.int64)
+
+    distances = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+    with np.errstate(divide="ignore"):
+        values = RB_C6 / distances**6
+
+    mask = values > np.finfo(np.float64).eps
+    if cutoff is not None:
+        mask &= distances <= cutoff
+
+    matrix = np.zeros((n_atom, n_atom), dtype=np.float64)
+    matrix[pairs[mask, 0], pairs[mask, 1]] = values[mask]
+    return matrix
+
+
+def _interaction_tables(
+    matrix: NDArray, n_level: int, rydberg_state: int
+) -> Tuple[int, NDArray, NDArray]:
+    """Split the atoms into chunks of `chunk_size` consecutive atoms, i.e.
+    digits of the configurations in base `n_level**chunk_size`, and tabulate
+    the interaction energy between every pair of chunks as a function of
+    their two digits. The energy within a chunk is added to one of the
+    tables of the chunk. Pairs of chunks without any interaction are
+    skipped, e.g. distant chunks with an interaction cutoff.
+
+    Returns:
+        Tuple[int, NDArray, NDArray]: the size of the chunks, the pairs of
+            chunks and the flattened tables of the pairs.
+    """
+    n_atom = matrix.shape[0]
+    chunk_size = int(np.log(MAX_CHUNK_STATES) / np.log(n_level) + 1e-9)
+    n_chunk = -(-n_atom // chunk_size)
+    base = n_level**chunk_size
+
+    states = np.arange(base)[:, None] // n_level ** np.arange(chunk_size)
+    is_rydberg = (states % n_level == rydberg_state).astype(np.float64)
+
+    def chunk(index):
+        atoms = slice(index * chunk_size, (index + 1) * chunk_size)
+        return atoms, is_rydberg[:, : min(chunk_size, n_atom - atoms.start)]
+
+    tables = {}
+    for index_1 in range(n_chunk):
+        atoms_1, is_rydberg_1 = chunk(index_1)
+        for index_2 in range(index_1 + 1, n_chunk):
+            atoms_2, is_rydberg_2 = chunk(index_2)
+            block = matrix[atoms_1, atoms_2]
+            if block.any():
+                tables[index_1, index_2] = is_rydberg_1 @ block @ is_rydberg_2.T
+
+    for index in range(n_chunk):
+        atoms, is_rydberg_1 = chunk(index)
+        energy = ((is_rydberg_1 @ matrix[atoms, atoms]) * is_rydberg_1).sum(axis=1)
+        if not energy.any():
+            continue
+
+        for index_1, index_2 in tables:
+            if index_1 == index:
+                tables[index_1, index_2] += energy[:, None]
+                break
+            elif index_2 == index:
+                tables[index_1, index_2] += energy[None, :]
+                break
+        else:
+            # only the diagonal is looked up as both digits are the same
+            tables[index, index] = np.diag(energy)
+
+    chunk_pairs = np.array(list(tables.keys()), dtype=np.int64).reshape(-1, 2)
+    flat_tables = np.array(
+        [table.ravel() for table in tables.values()], dtype=np.float64
+    ).reshape(-1, base * base)
+
+    return chunk_size, chunk_pairs, flat_tables
+
+
+@njit(cache=True)
+def _rydberg_interaction_impl(configurations, base, chunk_pairs, tables, output):
+    """Interaction energy of every configuration from the tables of the
+    interaction between its digits in base `base`, see
+    `_interaction_tables`."""
+    n_chunk = chunk_pairs.max() + 1 if chunk_pairs.size > 0 else 0
+    digits = np.zeros(n_chunk, dtype=np.int64)
+
+    for i in range(configurations.size):
+        config = configurations[i]
+        for chunk in range(n_chunk):
+            digits[chunk] = config % base
+            config //= base
+
+        energy = 0.0
+        for k in range(chunk_pairs.shape[0]):
+            index = digits[chunk_pairs[k, 0]] * base + digits[chunk_pairs[k, 1]]
+            energy += tables[k, index]
+
+        output[i] = energy
 
 
 @dataclass
@@ -42,11 +162,27 @@ class CompileCache:
     operator_cache: Dict[Tuple[Register, LevelCoupling, OperatorData], MatrixTypes] = (
         field(default_factory=dict)
     )
-    space_cache: Dict[Register, Tuple[Space, NDArray]] = field(default_factory=dict)
+    space_cache: Dict[Tuple[Register, Optional[float]], Tuple[Space, NDArray]] = (
+        field(default_factory=dict)
+    )
 
 
 class RydbergHamiltonianCodeGen(Visitor):
-    def __init__(self, compile_cache: Optional[CompileCache] = None):
+    """Generate the `RydbergHamiltonian` of an `EmulatorProgram`.
+
+    Args:
+        compile_cache (Optional[CompileCache]): cache of the spaces and
+            operators shared between programs. Defaults to None.
+        interaction_cutoff (Optional[float]): only the rydberg interactions
+            between atoms closer than this distance are included, all pairs
+            of atoms if `None`. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        compile_cache: Optional[CompileCache] = None,
+        interaction_cutoff: Optional[float] = None,
+    ):
         if compile_cache is None:
             compile_cache = CompileCache()
 
@@ -55,6 +191,7 @@ class RydbergHamiltonianCodeGen(Visitor):
         self.level_coupling = None
         self.level_couplings = set()
         self.compile_cache = compile_cache
+        self.interaction_cutoff = interaction_cutoff
 
     def visit_emulator_program(self, emulator_program: EmulatorProgram):
         self.level_couplings = set(list(emulator_program.pulses.keys()))
@@ -67,32 +204,30 @@ class RydbergHamiltonianCodeGen(Visitor):
     def visit_register(self, register: Register):
         self.register = register
 
-        if register in self.compile_cache.space_cache:
-            self.space, self.rydberg = self.compile_cache.space_cache[register]
+        key = (register, self.interaction_cutoff)
+        if key in self.compile_cache.space_cache:
+            self.space, self.rydberg = self.compile_cache.space_cache[key]
             return
 
         self.space = Space.create(register)
-        sites = register.sites
 
         # generate rydberg interaction elements
         self.rydberg = np.zeros(self.space.size, dtype=np.float64)
 
-        for index_1, site_1 in enumerate(sites):
-            site_1 = np.asarray(list(map(float, site_1)))
-            is_rydberg_1 = self.space.is_rydberg_at(index_1)
-            for index_2, sites_2 in enumerate(sites[index_1 + 1 :], index_1 + 1):
-                sites_2 = np.asarray(list(map(float, sites_2)))
-                distance = np.linalg.norm(site_1 - sites_2)
-
-                rydberg_interaction = RB_C6 / (distance**6)
-
-                if rydberg_interaction <= np.finfo(np.float64).eps:
-                    continue
-
-                mask = np.logical_and(is_rydberg_1, self.space.is_rydberg_at(index_2))
-                self.rydberg[mask] += rydberg_interaction
+        n_level = self.space.atom_type.n_level
+        matrix = _interaction_matrix(register.sites, self.interaction_cutoff)
+        chunk_size, chunk_pairs, tables = _interaction_tables(
+            matrix, n_level, self.space.atom_type.State.Rydberg.value
+        )
+        _rydberg_interaction_impl(
+            self.space.configurations,
+            self.space.state_type.type(n_level**chunk_size),
+            chunk_pairs,
+            tables,
+            self.rydberg,
+        )
 
-        self.compile_cache.space_cache[register] = (self.space, self.rydberg)
+        self.compile_cache.space_cache[key] = (self.space, self.rydberg)
 
     def visit_fields(self, fields: Fields):
         terms = fields.detuning + fields.rabi
@@ -151,7 +286,27 @@ class RydbergHamiltonianCodeGen(Visitor):
                 return self.space.transition_state_at(atom_index, fro, to)
 
         # generate rabi operator
-        if len(op_data.target_atoms) == 1:
+        if (
+            self.space.space_type is SpaceType.FullSpace
+            and self.space.atom_type == TwoLevelAtomType()
+        ):
+            # the rabi terms only flip the bits of the configurations which
+            # are also the indices of the full space, no indices are stored.
+            if len(op_data.target_atoms) == 1:
+                # the value of a single atom is part of the amplitude
+                values = [1.0]
+            else:
+                values = list(map(float, op_data.target_atoms.values()))
+
+            if op_data.operator_type is RabiOperatorType.RabiSymmetric:
+                state = None
+            else:
+                state = fro.value
+
+            operator = BitFlipOperator.create(
+                self.space.size, list(op_data.target_atoms.keys()), values, state
+            )
+        elif len(op_data.target_atoms) == 1:
             ((atom_index, _),) = op_data.target_atoms.items()
             operator = IndexMapping(self.space.size, *matrix_ele(atom_index))
         else:
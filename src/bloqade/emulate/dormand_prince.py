@@ -0,0 +1,547 @@
+from dataclasses import dataclass, replace
+from beartype.typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    TYPE_CHECKING,
+)
+from numba import cfunc, complex128, float64, get_num_threads, njit, void
+from numba.core.errors import NumbaExperimentalFeatureWarning
+from numpy.typing import NDArray
+import numpy as np
+import warnings
+
+from bloqade.compiler.codegen.python.waveform_cache import compiled_waveforms
+from bloqade.emulate.ir.emulator import EmulatorProgram, JITWaveform, WaveformRuntime
+from bloqade.emulate.sparse_operator import (
+    _fused_matvec_impl,
+    _fused_matvec_parallel_impl,
+)
+
+if TYPE_CHECKING:
+    from bloqade.emulate.ir.state_vector import RydbergHamiltonian
+
+
+# signature of the compiled coefficients: `(time, params, diag_coeffs,
+# term_coeffs)`, `params` are the values of the waveforms and the
+# coefficients of the `FusedOperator` are written to the output arrays.
+COEFFICIENTS_SIGNATURE = void(float64, float64[::1], float64[::1], complex128[::1])
+
+# Butcher tableau of the Dormand-Prince 5(4) method, see: E. Hairer,
+# S.P. Norsett and G. Wanner, Solving Ordinary Differential Equations I
+_C2, _C3, _C4, _C5 = 1 / 5, 3 / 10, 4 / 5, 8 / 9
+
+_A21 = 1 / 5
+_A31, _A32 = 3 / 40, 9 / 40
+_A41, _A42, _A43 = 44 / 45, -56 / 15, 32 / 9
+_A51, _A52, _A53, _A54 = 19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729
+_A61, _A62, _A63 = 9017 / 3168, -355 / 33, 46732 / 5247
+_A64, _A65 = 49 / 176, -5103 / 18656
+_A71, _A73, _A74, _A75, _A76 = 35 / 384, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84
+
+# difference between the 5th and the embedded 4th order solution
+_E1, _E3, _E4 = 71 / 57600, -71 / 16695, 71 / 1920
+_E5, _E6, _E7 = -17253 / 339200, 22 / 525, -1 / 40
+
+# 4th order continuous extension used to evaluate the state in between steps
+_D1, _D3 = -12715105075 / 11282082432, 87487479700 / 32700410799
+_D4, _D5 = -10690763975 / 1880347072, 701980252875 / 199316789632
+_D6, _D7 = -1453857185 / 822651844, 69997945 / 29380423
+
+_SAFETY = 0.9
+_MIN_FACTOR = 0.2
+_MAX_FACTOR = 10.0
+
+# maximum number of elements of the states returned by a single call of the
+# integrator, longer series of times are integrated in chunks.
+MAX_OUTPUT_SIZE = 2**22
+
+# status codes, matching the ones of scipy's `dopri5`
+_SUCCESS = 1
+_NSTEPS_EXCEEDED = -2
+_STEP_TOO_SMALL = -3
+
+
+@njit(cache=True)
+def _rhs(
+    coefficients, params, operator, parallel, time, diag_coeffs, term_coeffs, y, out
+):
+    # out = -i H(time) y
+    coefficients(time, params, diag_coeffs, term_coeffs)
+    args = (1.0, operator[0], diag_coeffs, operator[1], term_coeffs, *operator[2:])
+    if parallel:
+        _fused_matvec_parallel_impl(*args, -1j, y, out)
+    else:
+        _fused_matvec_impl(*args, -1j, y, out)
+
+
+@njit(cache=True)
+def _error_norm(error, y, y_new, atol, rtol):
+    # RMS norm over the real and imaginary parts, like the solvers of scipy
+    # acting on the real-valued view of the state.
+    total = 0.0
+    for i in range(error.size):
+        scale = atol + rtol * max(abs(y[i].real), abs(y_new[i].real))
+        total += (error[i].real / scale) ** 2
+        scale = atol + rtol * max(abs(y[i].imag), abs(y_new[i].imag))
+        total += (error[i].imag / scale) ** 2
+
+    return np.sqrt(total / (2 * error.size))
+
+
+@njit(cache=True)
+def _initial_step(
+    coefficients,
+    params,
+    operator,
+    parallel,
+    time,
+    diag_coeffs,
+    term_coeffs,
+    y,
+    f0,
+    f1,
+    tmp,
+):
+    # E. Hairer, S.P. Norsett and G. Wanner, Solving Ordinary Differential
+    # Equations I, Sec. II.4
+    y_flat, f0_flat, f1_flat, tmp_flat = (
+        y.reshape(-1),
+        f0.reshape(-1),
+        f1.reshape(-1),
+        tmp.reshape(-1),
+    )
+    d0 = _error_norm(y_flat, y_flat, y_flat, 1.0, 0.0)
+    d1 = _error_norm(f0_flat, y_flat, y_flat, 1.0, 0.0)
+    h0 = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+
+    for i in range(y_flat.size):
+        tmp_flat[i] = y_flat[i] + h0 * f0_flat[i]
+
+    rhs_args = (coefficients, params, operator, parallel)
+    _rhs(*rhs_args, time + h0, diag_coeffs, term_coeffs, tmp, f1)
+
+    for i in range(y_flat.size):
+        tmp_flat[i] = f1_flat[i] - f0_flat[i]
+
+    d2 = _error_norm(tmp_flat, y_flat, y_flat, 1.0, 0.0) / h0
+
+    if max(d1, d2) <= 1e-15:
+        h1 = max(1e-6, h0 * 1e-3)
+    else:
+        h1 = (0.01 / max(d1, d2)) ** (1 / 5)
+
+    return min(100 * h0, h1)
+
+
+@njit(cache=True)
+def _dopri5_impl(
+    coefficients,
+    params,
+    operator,
+    parallel,
+    diag_coeffs,
+    term_coeffs,
+    state,
+    times,
+    breakpoints,
+    atol,
+    rtol,
+    nsteps,
+    clock,
+    output,
+):
+    y = state.copy()
+    # the stages have the precision of the state, the arithmetic is done
+    # in double precision.
+    y_new = np.zeros_like(state)
+    k1 = np.zeros_like(state)
+    k2 = np.zeros_like(state)
+    k3 = np.zeros_like(state)
+    k4 = np.zeros_like(state)
+    k5 = np.zeros_like(state)
+    k6 = np.zeros_like(state)
+    k7 = np.zeros_like(state)
+    tmp = np.zeros_like(state)
+
+    yf, ynf, tf = y.reshape(-1), y_new.reshape(-1), tmp.reshape(-1)
+    k1f, k2f, k3f, k4f = k1.reshape(-1), k2.reshape(-1), k3.reshape(-1), k4.reshape(-1)
+    k5f, k6f, k7f = k5.reshape(-1), k6.reshape(-1), k7.reshape(-1)
+
+    time = clock[0]
+    out_index = 0
+    while out_index < times.size and times[out_index] <= time:
+        output[out_index] = y
+        out_index += 1
+
+    if out_index == times.size:
+        return _SUCCESS
+
+    final_time = times[-1]
+    # breakpoints closer than `eps` to the current time or to the final time
+    # are ignored, they would produce vanishingly small steps.
+    eps = 1e-12 * max(abs(final_time), 1.0)
+    bp_index = 0
+    while bp_index < breakpoints.size and breakpoints[bp_index] <= time + eps:
+        bp_index += 1
+
+    rhs_args = (coefficients, params, operator, parallel)
+    # a resumed integration may start at a breakpoint, use the right limit
+    start = np.nextafter(time, np.inf) if time > 0 else time
+    _rhs(*rhs_args, start, diag_coeffs, term_coeffs, y, k1)
+    step = clock[1]
+    if step <= 0:
+        step = _initial_step(*rhs_args, time, diag_coeffs, term_coeffs, y, k1, k2, tmp)
+
+    max_factor = _MAX_FACTOR
+    step_count = 0
+    while time < final_time:
+        if step_count >= nsteps:
+            return _NSTEPS_EXCEEDED
+
+        step_count += 1
+
+        stop = final_time
+        if bp_index < breakpoints.size and breakpoints[bp_index] < final_time - eps:
+            stop = breakpoints[bp_index]
+
+        # never step across a breakpoint, the waveforms are only smooth
+        # in between two consecutive breakpoints.
+        clipped = time + step >= stop
+        h = stop - time if clipped else step
+
+        if h <= 1e-14 * max(abs(time), 1.0):
+            return _STEP_TOO_SMALL
+
+        for i in range(yf.size):
+            tf[i] = yf[i] + h * _A21 * k1f[i]
+        _rhs(*rhs_args, time + _C2 * h, diag_coeffs, term_coeffs, tmp, k2)
+
+        for i in range(yf.size):
+            tf[i] = yf[i] + h * (_A31 * k1f[i] + _A32 * k2f[i])
+        _rhs(*rhs_args, time + _C3 * h, diag_coeffs, term_coeffs, tmp, k3)
+
+        for i in range(yf.size):
+            tf[i] = yf[i] + h * (_A41 * k1f[i] + _A42 * k2f[i] + _A43 * k3f[i])
+        _rhs(*rhs_args, time + _C4 * h, diag_coeffs, term_coeffs, tmp, k4)
+
+        for i in range(yf.size):
+            tf[i] = yf[i] + h * (
+                _A51 * k1f[i] + _A52 * k2f[i] + _A53 * k3f[i] + _A54 * k4f[i]
+            )
+        _rhs(*rhs_args, time + _C5 * h, diag_coeffs, term_coeffs, tmp, k5)
+
+        for i in range(yf.size):
+            tf[i] = yf[i] + h * (
+                _A61 * k1f[i]
+                + _A62 * k2f[i]
+                + _A63 * k3f[i]
+                + _A64 * k4f[i]
+                + _A65 * k5f[i]
+            )
+        t_new = stop if clipped else time + h
+        _rhs(*rhs_args, t_new, diag_coeffs, term_coeffs, tmp, k6)
+
+        for i in range(yf.size):
+            ynf[i] = yf[i] + h * (
+                _A71 * k1f[i]
+                + _A73 * k3f[i]
+                + _A74 * k4f[i]
+                + _A75 * k5f[i]
+                + _A76 * k6f[i]
+            )
+        _rhs(*rhs_args, t_new, diag_coeffs, term_coeffs, y_new, k7)
+
+        for i in range(yf.size):
+            tf[i] = h * (
+                _E1 * k1f[i]
+                + _E3 * k3f[i]
+                + _E4 * k4f[i]
+                + _E5 * k5f[i]
+                + _E6 * k6f[i]
+                + _E7 * k7f[i]
+            )
+        error = _error_norm(tf, yf, ynf, atol, rtol)
+
+        if error > 1.0:
+            step = h * max(_MIN_FACTOR, _SAFETY * error ** (-1 / 5))
+            max_factor = 1.0
+            continue
+
+        # dense output for the requested times within the step
+        while out_index < times.size and times[out_index] <= t_new:
+            if times[out_index] == t_new:
+                output[out_index] = y_new
+            else:
+                theta = (times[out_index] - time) / h
+                theta1 = 1.0 - theta
+                out = output[out_index].reshape(-1)
+                for i in range(yf.size):
+                    r2 = ynf[i] - yf[i]
+                    r3 = h * k1f[i] - r2
+                    r4 = r2 - h * k7f[i] - r3
+                    r5 = h * (
+                        _D1 * k1f[i]
+                        + _D3 * k3f[i]
+                        + _D4 * k4f[i]
+                        + _D5 * k5f[i]
+                        + _D6 * k6f[i]
+                        + _D7 * k7f[i]
+                    )
+                    out[i] = yf[i] + theta * (
+                        r2 + theta1 * (r3 + theta * (r4 + theta1 * r5))
+                    )
+            out_index += 1
+
+        factor = _SAFETY * error ** (-1 / 5) if error > 0 else max_factor
+        factor = min(max_factor, max(_MIN_FACTOR, factor))
+        max_factor = _MAX_FACTOR
+        # a step shortened by a breakpoint does not limit the next step
+        step = max(step, h * factor) if clipped else h * factor
+
+        time = t_new
+        yf[:] = ynf
+        if clipped and time < final_time:
+            while bp_index < breakpoints.size and breakpoints[bp_index] <= time + eps:
+                bp_index += 1
+            # waveforms may jump at a breakpoint, restart from the right limit
+            _rhs(
+                *rhs_args,
+                np.nextafter(time, np.inf),
+                diag_coeffs,
+                term_coeffs,
+                y,
+                k1,
+            )
+        else:
+            k1f[:] = k7f
+
+    clock[0] = time
+    clock[1] = step
+    return _SUCCESS
+
+
+class CompiledCoefficients(NamedTuple):
+    """Compiled coefficients of a Hamiltonian, see `compile_coefficients`."""
+
+    function: Any
+    params: NDArray
+
+
+def _bind_waveform(
+    bindings: Dict[str, Any], params: List[NDArray], name: str, waveform: JITWaveform
+) -> str:
+    # the kernel is shared by the waveforms with the same structure, the
+    # values of this waveform are a slice of the `params` argument
+    func = replace(waveform, runtime=WaveformRuntime.Numba).emit()
+    start = sum(map(len, params))
+    bindings[name] = func.kernel
+    params.append(func.params)
+    return f"{name}(time, params[{start}:{start + len(func.params)}])"
+
+
+def compile_coefficients(emulator_ir: EmulatorProgram) -> CompiledCoefficients:
+    """Compile the time dependent coefficients of the `FusedOperator` of the
+    Hamiltonian into a single numba `cfunc` with signature
+    `COEFFICIENTS_SIGNATURE`.
+
+    The coefficients follow the ordering of `RydbergHamiltonianCodeGen`:
+    one diagonal per detuning term and one (or two, with a phase)
+    term per rabi term. The values of the waveforms are not part of the
+    function, they are returned as the `params` to call it with, so that
+    the function is compiled once per structure of the waveforms and
+    cached in `compiled_waveforms`.
+    """
+    bindings = {"np": np}
+    params = []
+    lines = ["def coefficients(time, params, diag_coeffs, term_coeffs):"]
+
+    diag_index = 0
+    term_index = 0
+    for fields in emulator_ir.pulses.values():
+        for detuning_term in fields.detuning:
+            value = _bind_waveform(
+                bindings, params, f"detuning_{diag_index}", detuning_term.amplitude
+            )
+            lines.append(f"    diag_coeffs[{diag_index}] = {value}")
+            diag_index += 1
+
+        for rabi_term in fields.rabi:
+            amplitude = _bind_waveform(
+                bindings, params, f"amplitude_{term_index}", rabi_term.amplitude
+            )
+            value = f"{amplitude} / 2"
+
+            if rabi_term.phase is None:
+                lines.append(f"    term_coeffs[{term_index}] = {value}")
+                term_index += 1
+                continue
+
+            phase = _bind_waveform(
+                bindings, params, f"phase_{term_index}", rabi_term.phase
+            )
+            value = f"{value} * np.exp(1j * {phase})"
+            lines.append(f"    rabi_{term_index} = {value}")
+            lines.append(f"    term_coeffs[{term_index}] = rabi_{term_index}")
+            lines.append(
+                f"    term_coeffs[{term_index + 1}] = np.conj(rabi_{term_index})"
+            )
+            term_index += 2
+
+    lines.append("    return")
+
+    source = "\n".join(lines)
+
+    def build():
+        exec(source, bindings)
+        return cfunc(COEFFICIENTS_SIGNATURE)(bindings["coefficients"])
+
+    # the waveforms with the same structure share their kernel
+    kernels = tuple(value for name, value in bindings.items() if name != "np")
+    function = compiled_waveforms.function(("coefficients", source, kernels), build)
+    return CompiledCoefficients(function, np.concatenate([np.zeros(0), *params]))
+
+
+@dataclass
+class DormandPrincePropagator:
+    """Adaptive Dormand-Prince 5(4) integrator of the Schrodinger equation
+    in which the whole time loop is compiled with numba.
+
+    The waveforms and the coefficients of the Hamiltonian are compiled
+    with numba and evaluated without returning to python, the states at
+    the requested times are obtained from the continuous extension of the
+    method. Steps never cross the breakpoints of the Hamiltonian.
+
+    Attributes:
+        hamiltonian (RydbergHamiltonian): The Hamiltonian to integrate.
+        atol (float): Absolute tolerance of the local error. Defaults to 1e-7.
+        rtol (float): Relative tolerance of the local error. Defaults to 1e-14.
+        nsteps (int): Maximum number of steps. Defaults to 2_147_483_647.
+        num_threads (int): Number of threads used by the sparse kernels.
+            Defaults to 1.
+        single_precision (bool): Integrate complex64 states with the
+            operator stored in single precision. Defaults to False.
+        status (int, optional): status code of the last integration,
+            see `AnalogGate._error_check_dop`.
+
+    """
+
+    hamiltonian: "RydbergHamiltonian"
+    atol: float = 1e-7
+    rtol: float = 1e-14
+    nsteps: int = 2_147_483_647
+    num_threads: int = 1
+    single_precision: bool = False
+    status: Optional[int] = None
+
+    def evolve_chunks(
+        self, state: NDArray, times: Sequence[float]
+    ) -> Iterator[NDArray]:
+        """Evolve `state` from time 0, the states are returned in chunks of
+        consecutive times of at most `MAX_OUTPUT_SIZE` elements.
+
+        The integration stops at the last time of every chunk and resumes
+        from there with the same step size, only one chunk is kept in
+        memory if the previous ones are not referenced anymore.
+
+        Args:
+            state (NDArray): initial state of shape (N,) or (N, K).
+            times (Sequence[float]): increasing times at which to
+                return the state.
+
+        Yields:
+            NDArray: arrays of shape `(n,) + state.shape`, the state at the
+                next `n` of the `times`. The integration stops at the first
+                failure, see `status`.
+
+        """
+        if self.single_precision:
+            fused = self.hamiltonian.fused_single
+            state_type = np.complex64
+        else:
+            fused = self.hamiltonian.fused
+            state_type = np.complex128
+
+        operator = (
+            fused.rydberg,
+            fused.diagonals,
+            fused.terms,
+            fused.data,
+            fused.indices,
+            fused.indptr,
+            fused.flip_terms,
+            fused.flip_masks,
+            fused.flip_targets,
+            fused.flip_values,
+        )
+        times = np.asarray(times, dtype=np.float64)
+        columns = np.ascontiguousarray(
+            state.reshape(state.shape[0], -1), dtype=state_type
+        )
+        chunk_size = max(1, MAX_OUTPUT_SIZE // columns.size)
+        # time and step size of the integration, the step is estimated if 0
+        clock = np.zeros(2, dtype=np.float64)
+
+        # the parallel kernels linked into the cached integrator require
+        # the thread pool of numba to be running.
+        get_num_threads()
+        parallel = self.num_threads > 1
+
+        for start in range(0, times.size, chunk_size):
+            chunk_times = times[start : start + chunk_size]
+            output = np.zeros((chunk_times.size,) + columns.shape, dtype=state_type)
+
+            with warnings.catch_warnings():
+                # compiled coefficients are passed as first-class functions
+                warnings.simplefilter("ignore", NumbaExperimentalFeatureWarning)
+                coefficients = self.hamiltonian.compiled_coefficients
+                self.status = _dopri5_impl(
+                    coefficients.function,
+                    coefficients.params,
+                    operator,
+                    parallel,
+                    np.zeros(fused.diagonals.shape[0], dtype=np.float64),
+                    np.zeros(fused.n_terms, dtype=np.complex128),
+                    columns,
+                    chunk_times,
+                    self.hamiltonian.breakpoints,
+                    self.atol,
+                    self.rtol,
+                    self.nsteps,
+                    clock,
+                    output,
+                )
+
+            if self.status != _SUCCESS:
+                return
+
+            columns = output[-1]
+            yield output.reshape((chunk_times.size,) + state.shape)
+
+    def evolve(self, state: NDArray, times: Sequence[float]) -> NDArray:
+        """Evolve `state` from time 0.
+
+        Args:
+            state (NDArray): initial state of shape (N,) or (N, K).
+            times (Sequence[float]): increasing times at which to
+                return the state.
+
+        Returns:
+            NDArray: array of shape `(len(times),) + state.shape`, the
+                state at each of the `times`.
+
+        """
+        chunks = list(self.evolve_chunks(state, times))
+        if len(chunks) == 1:
+            return chunks[0]
+
+        state_type = np.complex64 if self.single_precision else np.complex128
+        output = np.zeros((len(times),) + state.shape, dtype=state_type)
+        if chunks:
+            output[: sum(map(len, chunks))] = np.concatenate(chunks)
+
+        return output
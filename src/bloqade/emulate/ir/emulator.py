@@ -20,6 +20,7 @@ class WaveformRuntime(str, Enum):
     Python = "python"
     Numba = "numba"
     Interpret = "interpret"
+    Tabulated = "tabulated"
 
 
 @dataclass
@@ -57,19 +58,43 @@ class JITWaveform:
 
         return ast_canonicalized
 
+    @cached_property
+    def breakpoints(self) -> Tuple[float, ...]:
+        """Times at which the waveform may fail to be smooth."""
+        from bloqade.compiler.analysis.common import ScanBreakpoints
+
+        return tuple(map(float, ScanBreakpoints().scan(self.canonicalized_ir)))
+
+    @cached_property
+    def constant_intervals(self) -> Tuple[Tuple[float, float], ...]:
+        """Time intervals in which the waveform is constant."""
+        from bloqade.compiler.analysis.common import ScanBreakpoints
+
+        return tuple(
+            (float(start), float(stop))
+            for start, stop in ScanBreakpoints().scan_constant_intervals(
+                self.canonicalized_ir
+            )
+        )
+
     def emit(self) -> Callable[[float], float]:
-        from bloqade.compiler.analysis.python.waveform import WaveformScan
-        from bloqade.compiler.codegen.python.waveform import CodegenPythonWaveform
+        from bloqade.compiler.codegen.python.waveform_cache import compiled_waveforms
+        from bloqade.compiler.codegen.python.waveform_interpreter import (
+            WaveformInterpreter,
+        )
+        from bloqade.compiler.codegen.python.waveform_tabulate import (
+            TabulateWaveform,
+        )
 
         if self.runtime is WaveformRuntime.Interpret:
-            return self.canonicalized_ir
+            return WaveformInterpreter().emit(self.canonicalized_ir)
 
-        scan_results = WaveformScan().scan(self.canonicalized_ir)
-        stub = CodegenPythonWaveform(
-            scan_results, jit_compiled=self.runtime is WaveformRuntime.Numba
-        ).compile(self.canonicalized_ir)
+        if self.runtime is WaveformRuntime.Tabulated:
+            return TabulateWaveform().emit(self.canonicalized_ir)
 
-        return stub
+        return compiled_waveforms.compile(
+            self.canonicalized_ir, jit_compiled=self.runtime is WaveformRuntime.Numba
+        )
 
 
 @JITWaveform.set_serializer
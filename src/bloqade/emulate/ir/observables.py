@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+from beartype.typing import Dict, List, Sequence, Tuple, Union
+from numpy.typing import NDArray
+import numpy as np
+
+from bloqade.emulate.ir.state_vector import (
+    RydbergHamiltonian,
+    StateVector,
+    _density_correlations,
+)
+
+
+@dataclass(frozen=True)
+class Energy:
+    """Average of the Hamiltonian at the time of the state."""
+
+
+@dataclass(frozen=True)
+class Density:
+    """Probability of the atom at `site` to be in the local `state`."""
+
+    site: int
+    state: str = "r"
+
+
+@dataclass(frozen=True)
+class Correlation:
+    """Probability of the atoms at `site_1` and `site_2` to be both in the
+    local `state`."""
+
+    site_1: int
+    site_2: int
+    state: str = "r"
+
+
+@dataclass(frozen=True)
+class DiagonalOperator:
+    """Operator diagonal in the basis of the configurations of the space,
+    `values[i]` being its value for the i-th configuration."""
+
+    values: NDArray
+
+
+Observable = Union[Energy, Density, Correlation, DiagonalOperator]
+
+
+class ObservableEvaluator:
+    """Evaluate a list of observables on the states of an evolution without
+    copying the states.
+
+    The densities and correlations of every local state are computed in a
+    single pass over the probabilities of the configurations, see
+    `StateVector.density_correlations`, the diagonal operators in a single
+    product with the probabilities and the energy reuses a single work
+    array. The observables are normalized by the norm of the state.
+
+    Args:
+        hamiltonian (RydbergHamiltonian): the Hamiltonian of the evolution.
+        observables (Sequence[Observable]): the observables to evaluate.
+
+    Raises:
+        ValueError: Error is raised when a site is out of bounds or empty,
+        when a local state is not valid or when the values of a diagonal
+        operator do not match the size of the space.
+    """
+
+    def __init__(
+        self, hamiltonian: RydbergHamiltonian, observables: Sequence[Observable]
+    ) -> None:
+        space = hamiltonian.space
+        self.hamiltonian = hamiltonian
+        self.observables = list(observables)
+
+        self.energy_columns: List[int] = []
+        # columns and pairs of atoms of the correlations of each local state
+        self.correlations: Dict[int, Tuple[List[int], List[int], List[int]]] = {}
+        diagonal_columns = []
+        diagonal_values = []
+
+        for column, observable in enumerate(self.observables):
+            if isinstance(observable, Energy):
+                self.energy_columns.append(column)
+            elif isinstance(observable, (Density, Correlation)):
+                if observable.state not in space.atom_type.str_to_int:
+                    raise ValueError(
+                        f"state: {observable.state} is not a valid local state."
+                    )
+
+                if isinstance(observable, Density):
+                    sites = (observable.site, observable.site)
+                else:
+                    sites = (observable.site_1, observable.site_2)
+
+                state = space.atom_type.str_to_int[observable.state]
+                columns, atoms_1, atoms_2 = self.correlations.setdefault(
+                    state, ([], [], [])
+                )
+                columns.append(column)
+                atoms_1.append(space.atom_index(sites[0]))
+                atoms_2.append(space.atom_index(sites[1]))
+            elif isinstance(observable, DiagonalOperator):
+                if observable.values.shape != (space.size,):
+                    raise ValueError(
+                        f"expecting diagonal operator to be size {(space.size,)}, "
+                        f"got {observable.values.shape}"
+                    )
+
+                diagonal_columns.append(column)
+                diagonal_values.append(observable.values)
+            else:
+                raise ValueError(f"Unsupported observable: {observable}.")
+
+        self.diagonal_columns = diagonal_columns
+        self.diagonal_values = (
+            np.stack(diagonal_values) if diagonal_values else np.empty((0, space.size))
+        )
+        self.work = None
+        if self.energy_columns:
+            self.work = np.empty(space.size, dtype=np.complex128)
+
+    def __len__(self) -> int:
+        return len(self.observables)
+
+    def evaluate(self, state: StateVector, time: float, out: NDArray) -> NDArray:
+        """Evaluate the observables on `state` at `time` and store them in
+        `out`, an array of size `len(self)`."""
+        space = self.hamiltonian.space
+        probs = np.abs(state.data) ** 2
+        norm = probs.sum()
+        probs /= norm
+
+        for local_state, (columns, atoms_1, atoms_2) in self.correlations.items():
+            correlations = _density_correlations(
+                space.configurations,
+                space.atom_type.n_level,
+                space.n_atoms,
+                local_state,
+                probs,
+            )
+            out[columns] = correlations[atoms_1, atoms_2]
+
+        if self.diagonal_columns:
+            out[self.diagonal_columns] = self.diagonal_values @ probs
+
+        if self.energy_columns:
+            self.hamiltonian._apply(state.data, time, output=self.work)
+            out[self.energy_columns] = np.vdot(state.data, self.work).real / norm
+
+        return out
@@ -1,6 +1,10 @@
 from dataclasses import dataclass
+from functools import cached_property
+from decimal import Decimal
 from numpy.typing import NDArray
-from beartype.typing import TYPE_CHECKING, Any
+from beartype.typing import TYPE_CHECKING, Any, List, Optional, Tuple
+from numba import njit
+from scipy.spatial import cKDTree
 import numpy as np
 from enum import Enum
 
@@ -10,6 +14,259 @@ if TYPE_CHECKING:
     from .state_vector import StateVector
 
 MAX_PRINT_SIZE = 30
+# tables of the ranking larger than the space are allowed up to this size
+MAX_RANKING_SIZE = 4096
+
+# (neighbor_masks, window_masks, window_starts, offsets, counts)
+RankingTables = Tuple[NDArray, NDArray, NDArray, NDArray, NDArray]
+
+
+def _blockade_neighbors(
+    sites: List[Tuple[Decimal, Decimal]], blockade_radius: Decimal
+) -> Tuple[NDArray, NDArray]:
+    """Blockaded neighbors with a lower index of every site, in CSR format."""
+    n_atom = len(sites)
+    positions = np.asarray(sites, dtype=np.float64).reshape(n_atom, -1)
+
+    pairs = np.empty((0, 2), dtype=np.int64)
+    if n_atom > 1:
+        # candidates from the KD-tree, the distance is checked exactly below
+        tree = cKDTree(positions)
+        pairs = tree.query_pairs(
+            float(blockade_radius) * (1 + 1e-12), output_type="ndarray"
+        )
+
+    distances = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+    pairs = pairs[distances <= float(blockade_radius)]
+
+    # neighbors of the site with the larger index
+    sites_1 = pairs.max(axis=1)
+    sites_2 = pairs.min(axis=1)
+    order = np.lexsort((sites_2, sites_1))
+
+    indptr = np.zeros(n_atom + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sites_1, minlength=n_atom), out=indptr[1:])
+
+    return indptr, sites_2[order]
+
+
+@njit(cache=True)
+def _blockade_subspace_impl(rydberg, digits, powers, indptr, indices, capacity):
+    """Enumerate in increasing order the configurations in which no pair of
+    blockaded atoms are both in the rydberg state, in a single pass. The
+    output starts with `capacity` configurations and doubles when full.
+
+    The local states are chosen from the last atom, i.e. the most
+    significant digit, to the first one so that the configurations are
+    generated in order. `blocked` counts the rydberg neighbors of an atom
+    among the atoms already chosen. `digits` are the local states with the
+    type of the configurations.
+    """
+    n_level = digits.size
+    n_atom = powers.size
+    next_state = np.zeros(n_atom, dtype=np.int64)
+    blocked = np.zeros(n_atom, dtype=np.int64)
+    value = digits[0]
+    output = np.empty(max(capacity, 1), dtype=digits.dtype)
+    count = 0
+
+    atom = n_atom - 1
+    while atom < n_atom:
+        if atom < 0:
+            if count == output.size:
+                grown = np.empty(2 * output.size, dtype=digits.dtype)
+                grown[:count] = output
+                output = grown
+
+            output[count] = value
+            count += 1
+            atom = 0
+            continue
+
+        state = next_state[atom]
+        if state > 0:
+            # undo the previous choice of the atom
+            value -= digits[state - 1] * powers[atom]
+            if state - 1 == rydberg:
+                for neighbor in indices[indptr[atom] : indptr[atom + 1]]:
+                    blocked[neighbor] -= 1
+
+        if state == rydberg and blocked[atom] > 0:
+            state += 1
+
+        if state >= n_level:
+            next_state[atom] = 0
+            atom += 1
+            continue
+
+        next_state[atom] = state + 1
+        value += digits[state] * powers[atom]
+        if state == rydberg:
+            for neighbor in indices[indptr[atom] : indptr[atom + 1]]:
+                blocked[neighbor] += 1
+
+        atom -= 1
+
+    if count < output.size:
+        return output[:count].copy()
+
+    return output
+
+
+def _ranking_tables(
+    indptr: NDArray, indices: NDArray, max_size: int
+) -> Optional[RankingTables]:
+    """Tables of `_update_index` for the blockade subspace of two level atoms
+    given the blockaded neighbors with a lower index of every atom, in CSR
+    format.
+
+    The window of atom `k` are the atoms from `k` up to the last atom with a
+    blockaded neighbor lower than `k`. `counts[offsets[k] + mask]` is the
+    number of configurations of the atoms lower than `k` given the atoms of
+    the window in the rydberg state, bit `j` of `mask` standing for atom
+    `k + j`. `window_starts[k]` is the first atom with `k` in its window.
+    Returns `None` if the tables would be larger than `max_size`.
+    """
+    n_atom = indptr.size - 1
+
+    # the configurations are used as bit masks of the rydberg atoms
+    if n_atom >= 63:
+        return None
+
+    upper_masks = np.zeros(n_atom, dtype=np.int64)
+    neighbor_masks = np.zeros(n_atom, dtype=np.int64)
+    lowest_neighbor = np.arange(n_atom)
+
+    for atom in range(n_atom):
+        for neighbor in indices[indptr[atom] : indptr[atom + 1]]:
+            upper_masks[neighbor] |= 1 << atom
+            neighbor_masks[atom] |= 1 << neighbor
+            lowest_neighbor[atom] = min(lowest_neighbor[atom], neighbor)
+
+    neighbor_masks |= upper_masks
+
+    spans = np.zeros(n_atom + 1, dtype=np.int64)
+    window_starts = np.arange(n_atom, dtype=np.int64)
+    for k in range(n_atom - 1, -1, -1):
+        atoms = np.flatnonzero(lowest_neighbor[k:] < k)
+        spans[k] = atoms[-1] + 1 if atoms.size > 0 else 0
+        window_starts[k : k + spans[k]] = k
+
+    # summed as python integers which do not overflow
+    if sum(2 ** int(span) for span in spans) > max_size:
+        return None
+
+    offsets = np.cumsum(np.append(0, 2**spans), dtype=np.int64)
+    # atom `k` itself is never in the rydberg state when looking up its window
+    window_masks = (2 ** spans[:n_atom] - 1) & ~1
+
+    counts = np.zeros(offsets[-1], dtype=np.int64)
+    counts[0] = 1
+
+    for k in range(n_atom):
+        # rydberg atoms of the window of `k + 1` and of the window of `k`
+        rydberg_atoms = np.arange(2 ** spans[k + 1], dtype=np.int64) << (k + 1)
+        lower_masks = (rydberg_atoms >> k) & window_masks[k]
+        rydberg_masks = lower_masks | (1 if spans[k] > 0 else 0)
+
+        lower_counts = counts[offsets[k] : offsets[k + 1]]
+        allowed = (rydberg_atoms & upper_masks[k]) == 0
+
+        new_counts = lower_counts[lower_masks]
+        new_counts += np.where(allowed, lower_counts[rydberg_masks], 0)
+        counts[offsets[k + 1] : offsets[k + 2]] = new_counts
+
+    return (neighbor_masks, window_masks, window_starts, offsets, counts)
+
+
+# inlined to hoist the unpacking of the tables out of the loops of the callers,
+# it must not call inlined functions itself as those would not be inlined.
+@njit(cache=True, inline="always")
+def _update_index(configurations, ranking, index, new_config, site_1, site_2):
+    """Index of `new_config` which only differs from the configuration at
+    `index` by the states of the atoms `site_1 <= site_2`, -1 if not found.
+
+    Every rydberg atom contributes to the index the number of configurations
+    with the atom in the ground state and the same states for the atoms
+    above it, which only depends on the rydberg atoms of the window of the
+    atom, see `_ranking_tables`. Hence only the atoms whose window contains
+    one of the two sites contribute differently to the two indices. Falls
+    back to binary search if `ranking` is `None`.
+    """
+    if ranking is None:
+        index = np.searchsorted(configurations, new_config)
+        if index < configurations.size and configurations[index] == new_config:
+            return index
+
+        return -1
+
+    neighbor_masks, window_masks, window_starts, offsets, counts = ranking
+    config = np.int64(configurations[index])
+    new_config = np.int64(new_config)
+
+    # without branches on the states of the atoms which are hard to predict
+    blocked = 0
+    for atom in range(min(window_starts[site_1], window_starts[site_2]), site_2 + 1):
+        rydberg_atoms = config >> atom
+        index -= (rydberg_atoms & 1) * counts[
+            offsets[atom] + (rydberg_atoms & window_masks[atom])
+        ]
+
+        rydberg_atoms = new_config >> atom
+        index += (rydberg_atoms & 1) * counts[
+            offsets[atom] + (rydberg_atoms & window_masks[atom])
+        ]
+
+        blocked |= (rydberg_atoms & 1) * (new_config & neighbor_masks[atom])
+
+    return -1 if blocked else index
+
+
+@njit(cache=True)
+def _configuration_index(configurations, ranking, config):
+    """Index of `config` in the sorted `configurations`, -1 if not found.
+
+    Ranks `config` in a single pass over the atoms if the tables of the
+    ranking are given, falls back to binary search if `ranking` is `None`.
+    """
+    if ranking is None:
+        # the configuration at `index` and the sites are not used
+        return _update_index(configurations, ranking, 0, config, 0, 0)
+
+    n_atom = ranking[0].size
+    config = np.int64(config)
+    if config < 0 or config >> n_atom:
+        return -1
+
+    # relative to the configuration without rydberg atoms, the first one
+    return _update_index(configurations, ranking, 0, config, 0, n_atom - 1)
+
+
+@njit(cache=True)
+def _configuration_indices(configurations, ranking, configs):
+    indices = np.empty(configs.size, dtype=np.int64)
+    n_atom = ranking[0].size
+    for i in range(configs.size):
+        config = np.int64(configs[i])
+        if config < 0 or config >> n_atom:
+            indices[i] = -1
+        else:
+            indices[i] = _update_index(
+                configurations, ranking, 0, config, 0, n_atom - 1
+            )
+
+    return indices
+
+
+@njit(cache=True)
+def _update_indices(configurations, ranking, indices, new_configs, site):
+    new_indices = np.empty(new_configs.size, dtype=np.int64)
+    for i in range(new_configs.size):
+        new_indices[i] = _update_index(
+            configurations, ranking, indices[i], new_configs[i], site, site
+        )
+
+    return new_indices
 
 
 class SpaceType(str, Enum):
@@ -35,71 +292,110 @@ class Space:
 
         return self.program_register == other.program_register
 
-    @classmethod
-    def create(cls, register: "Register"):
+    @staticmethod
+    def _subspace_args(register: "Register") -> Tuple[int, np.dtype, Optional[Tuple]]:
+        """Size of the full space, type of the configurations and arguments
+        of `_blockade_subspace_impl`, `None` if no atoms are blockaded."""
         sites = register.sites
         n_atom = len(sites)
         atom_type = register.atom_type
-        blockade_radius = register.blockade_radius
         Ns = atom_type.n_level**n_atom
 
-        check_atoms = []
+        min_int_type = np.min_scalar_type(Ns - 1)
+        # default to 32 bit if smaller than 32 bit
+        config_type = np.result_type(min_int_type, np.uint32)
 
-        for index_1, site_1 in enumerate(sites[1:], 1):
-            site_1 = np.asarray(site_1)
-            atoms = []
-            for index_2, site_2 in enumerate(sites[:index_1]):
-                site_2 = np.asarray(site_2)
-                if np.linalg.norm(site_1 - site_2) <= blockade_radius:
-                    atoms.append(index_2)
+        indptr, indices = _blockade_neighbors(sites, register.blockade_radius)
+        if indices.size == 0:
+            return Ns, config_type, None
 
-            check_atoms.append(atoms)
+        digits = np.arange(atom_type.n_level, dtype=config_type)
+        powers = digits.size ** np.arange(n_atom, dtype=config_type)
+        args = (atom_type.State.Rydberg.value, digits, powers, indptr, indices)
+        return Ns, config_type, args
 
-        min_int_type = np.min_scalar_type(Ns - 1)
-        config_type = np.result_type(min_int_type, np.uint32)
+    @classmethod
+    def create(cls, register: "Register"):
+        atom_type = register.atom_type
+        Ns, config_type, args = cls._subspace_args(register)
 
-        if all(len(sub_list) == 0 for sub_list in check_atoms):
-            # default to 32 bit if smaller than 32 bit
+        if args is None:
             configurations = np.arange(Ns, dtype=config_type)
             return cls(SpaceType.FullSpace, atom_type, register, configurations)
 
-        states = np.arange(atom_type.n_level, dtype=config_type)
-        configurations = states
-
-        for index_1, indices in enumerate(check_atoms, 1):
-            # assume no configurations are blocked
-            mask = np.ones_like(configurations, dtype=bool)
-
-            # loop over neighbors within blockade radius
-            # find all non-blockaded configurations, e.g.
-            # places where neighbors are in the ground state.
-            # if the list if empty all configruations are
-            # valid and should be included.
-            for index_2 in indices:
-                is_ground = np.logical_not(
-                    atom_type.is_rydberg_at(configurations, index_2)
-                )
-                np.logical_and(is_ground, mask, out=mask)
-
-            non_blockaded = configurations[mask]
-            np.logical_not(mask, out=mask)
-            blockaded = configurations[mask]
+        # the estimate is usually close, the output grows if it is too small
+        capacity = min(Ns, int(cls.estimate_size(register)) + 1)
+        configurations = _blockade_subspace_impl(*args, capacity)
 
-            # add new configurations
-            # add all configurations because none of the configs are blockading
-            new_non_blockaded = np.kron(non_blockaded, np.ones_like(states)) + np.kron(
-                np.ones_like(non_blockaded), states * atom_type.n_level**index_1
-            )
-            # add all but the rydberg state because some at least one is blockading
-            new_blockaded = np.kron(blockaded, np.ones_like(states[:-1])) + np.kron(
-                np.ones_like(blockaded), states[:-1] * atom_type.n_level**index_1
-            )
+        return cls(SpaceType.SubSpace, atom_type, register, configurations)
 
-            configurations = np.hstack((new_blockaded, new_non_blockaded))
+    @staticmethod
+    def estimate_size(register: "Register") -> float:
+        """Estimated size of the space of `register`, without enumerating it.
+
+        Exact without blockade. Otherwise each atom with `d` blockaded
+        neighbors contributes the factor of an atom of a regular bipartite
+        lattice of degree `d`, `(2 (1 + w)^d - 1)^(1 / 2d)` where `w` is the
+        weight of the rydberg state relative to the other states. The
+        estimate is close for lattices blockaded to their nearest neighbors
+        and too large for denser blockade graphs.
+        """
+        n_level = register.atom_type.n_level
+        n_atom = len(register.sites)
+        indptr, indices = _blockade_neighbors(
+            register.sites, register.blockade_radius
+        )
+        if indices.size == 0:
+            return float(n_level**n_atom)
 
-        configurations.sort()
+        degrees = np.diff(indptr) + np.bincount(indices, minlength=n_atom)
 
-        return cls(SpaceType.SubSpace, atom_type, register, configurations)
+        weight = 1 / (n_level - 1)
+        safe_degrees = np.maximum(degrees, 1)
+        log_factors = np.where(
+            degrees > 0,
+            np.log(2 * (1 + weight) ** safe_degrees - 1) / (2 * safe_degrees),
+            np.log1p(weight),
+        )
+        return float(np.exp(n_atom * np.log(n_level - 1) + log_factors.sum()))
+
+    @cached_property
+    def ranking(self) -> Optional[RankingTables]:
+        """Tables to look up the index of a configuration of two level atoms,
+        see `_update_index`. `None` if the configurations are looked up by
+        binary search instead."""
+        if self.atom_type.n_level != 2:
+            return None
+
+        indptr, indices = _blockade_neighbors(
+            self.program_register.sites, self.program_register.blockade_radius
+        )
+        return _ranking_tables(indptr, indices, max(self.size, MAX_RANKING_SIZE))
+
+    def _search_index_of(self, configs: NDArray) -> NDArray:
+        # numpy narrows down the search of sorted configurations
+        indices = np.searchsorted(self.configurations, configs)
+        mask = indices < self.size
+        mask[mask] = configs[mask] == self.configurations[indices[mask]]
+        return np.where(mask, indices, -1)
+
+    def index_of(self, configs: NDArray) -> NDArray:
+        """Indices of the configurations `configs` in the space, -1 for the
+        configurations not in the space."""
+        if self.ranking is None:
+            return self._search_index_of(configs)
+
+        return _configuration_indices(self.configurations, self.ranking, configs)
+
+    def update_index_of(self, indices: NDArray, configs: NDArray, site: int):
+        """Same as `index_of` for `configs` which only differ from the
+        configurations at `indices` by the state of the atom `site`."""
+        if self.ranking is None:
+            return self._search_index_of(configs)
+
+        return _update_indices(
+            self.configurations, self.ranking, indices, configs, site
+        )
 
     @property
     def index_type(self) -> np.dtype:
@@ -124,6 +420,19 @@ class Space:
     def state_type(self) -> np.dtype:
         return self.configurations.dtype
 
+    def atom_index(self, site_index: int) -> int:
+        """Index in the register of the atom at the site `site_index` of the
+        geometry, raises a ValueError if the site is out of bounds or empty."""
+        if site_index < 0 or site_index >= self.n_sites:
+            raise ValueError(
+                f"site_index: {site_index} out of bounds with {self.n_sites} sites"
+            )
+
+        if not self.program_register.geometry.filling[site_index]:
+            raise ValueError(f"Trying to measure site {site_index} which is empty.")
+
+        return self.program_register.full_index_to_index[site_index]
+
     def is_rydberg_at(self, index: int) -> NDArray:
         return self.atom_type.is_rydberg_at(self.configurations, index)
 
@@ -141,15 +450,15 @@ class Space:
         if self.space_type is SpaceType.FullSpace:
             return (row_indices, col_config)
         else:
-            col_indices = np.searchsorted(self.configurations, col_config)
-            mask = col_indices < self.size
-            mask[mask] = col_config[mask] == self.configurations[col_indices[mask]]
+            rows = row_indices
+            if isinstance(rows, slice):
+                rows = np.arange(self.size)
 
-            if not np.all(mask):
-                if isinstance(row_indices, slice):
-                    row_indices = np.arange(self.size)
+            col_indices = self.update_index_of(rows, col_config, index)
+            mask = col_indices >= 0
 
-                return row_indices[mask], col_indices[mask]
+            if not np.all(mask):
+                return rows[mask], col_indices[mask]
             else:
                 return row_indices, col_indices
 
@@ -164,25 +473,18 @@ class Space:
         if self.space_type is SpaceType.FullSpace:
             return (row_indices, col_config)
         else:
-            col_indices = np.searchsorted(self.configurations, col_config)
-
-            mask = col_indices < self.size
-            col_indices = col_indices[mask]
-            row_indices = row_indices[mask]
+            col_indices = self.update_index_of(row_indices, col_config, index)
 
-            mask = col_config[mask] == self.configurations[col_indices]
-            col_indices = col_indices[mask]
-            row_indices = row_indices[mask]
-
-            return (row_indices, col_indices)
+            mask = col_indices >= 0
+            return (row_indices[mask], col_indices[mask])
 
     def fock_state_to_index(self, fock_state: str) -> int:
         state_int = self.atom_type.string_to_integer(fock_state)
         if self.space_type is SpaceType.FullSpace:
             return state_int
         else:
-            index = np.searchsorted(self.configurations, state_int)
-            if index >= self.size or state_int != self.configurations[index]:
+            index = _configuration_index(self.configurations, self.ranking, state_int)
+            if index < 0:
                 raise ValueError(
                     "state: {fock_state} not in rydberg blockade subspace."
                 )
@@ -207,25 +509,34 @@ class Space:
         state[0] = 1.0
         return StateVector(state, self)
 
-    def sample_state_vector(
-        self, state_vector: NDArray, n_samples: int, project_hyperfine: bool = True
+    def local_states(
+        self, configurations: NDArray, project_hyperfine: bool = True
     ) -> NDArray:
+        """Local states of the atoms, one row per configuration. If
+        `project_hyperfine` the hyperfine state is mapped to the ground state
+        and the rydberg state to 1."""
         from .atom_type import ThreeLevelAtomType
 
-        p = np.abs(state_vector) ** 2
-        sampled_configs = np.random.choice(self.configurations, size=n_samples, p=p)
-
-        sample_fock_states = np.empty((n_samples, self.n_atoms), dtype=np.uint8)
+        configurations = configurations.copy()
+        fock_states = np.empty((configurations.size, self.n_atoms), dtype=np.uint8)
 
         for i in range(self.n_atoms):
-            sample_fock_states[:, i] = sampled_configs % self.atom_type.n_level
-            sampled_configs //= self.atom_type.n_level
+            fock_states[:, i] = configurations % self.atom_type.n_level
+            configurations //= self.atom_type.n_level
 
         if project_hyperfine and isinstance(self.atom_type, ThreeLevelAtomType):
-            sample_fock_states[sample_fock_states == 1] = 0
-            sample_fock_states[sample_fock_states == 2] = 1
+            fock_states[fock_states == 1] = 0
+            fock_states[fock_states == 2] = 1
+
+        return fock_states
+
+    def sample_state_vector(
+        self, state_vector: NDArray, n_samples: int, project_hyperfine: bool = True
+    ) -> NDArray:
+        p = np.abs(state_vector) ** 2
+        sampled_configs = np.random.choice(self.configurations, size=n_samples, p=p)
 
-        return sample_fock_states
+        return self.local_states(sampled_configs, project_hyperfine=project_hyperfine)
 
     def __str__(self):
         # TODO: update this to use unicode
@@ -1,12 +1,21 @@
 import plum
-from bloqade.emulate.ir.emulator import EmulatorProgram
-from bloqade.emulate.ir.space import Space, MAX_PRINT_SIZE
+from bloqade.emulate.ir.emulator import EmulatorProgram, JITWaveform
+from bloqade.emulate.ir.space import Space, MAX_PRINT_SIZE, _update_index
+from bloqade.emulate.dormand_prince import (
+    DormandPrincePropagator,
+    compile_coefficients,
+)
+from bloqade.emulate.krylov import KrylovPropagator
 from bloqade.emulate.sparse_operator import (
+    BitFlipOperator,
+    FusedOperator,
     IndexMapping,
     SparseMatrixCSC,
     SparseMatrixCSR,
+    numba_threads,
 )
 from dataclasses import dataclass, field
+from functools import cached_property
 from numpy.typing import NDArray
 from beartype.typing import List, Callable, Union, Optional, Tuple, Iterator, Sequence
 from beartype.vale import IsAttr, IsEqual
@@ -17,7 +26,9 @@ from scipy.integrate import ode
 from scipy.sparse import csr_matrix, diags
 from numba import njit
 
-SparseOperator = Union[IndexMapping, SparseMatrixCSR, SparseMatrixCSC]
+SparseOperator = Union[
+    IndexMapping, SparseMatrixCSR, SparseMatrixCSC, BitFlipOperator
+]
 
 
 RealArray = Annotated[NDArray[np.floating], IsAttr["ndim", IsEqual[1]]]
@@ -26,7 +37,7 @@ StateArray = Union[RealArray, Complexarray]
 
 
 @njit(cache=True)
-def _expt_one_body_op(configs, n_level, psi, site, op):
+def _expt_one_body_op(configs, n_level, psi, site, op, ranking=None):
     res = np.zeros(psi.shape[1:], dtype=np.complex128)
 
     divisor = n_level**site
@@ -36,20 +47,23 @@ def _expt_one_body_op(configs, n_level, psi, site, op):
         for row, ele in enumerate(op[:, col]):
             new_config = config - (col * divisor) + (row * divisor)
 
-            j = np.searchsorted(configs, new_config)
+            j = _update_index(configs, ranking, i, new_config, site, site)
 
-            if j < configs.size and configs[j] == new_config:
+            if j >= 0:
                 res += ele * psi[i, ...] * np.conj(psi[j, ...])
 
     return res
 
 
 @njit(cache=True)
-def _expt_two_body_op(configs, n_level, psi, sites, data, indices, indptr):
+def _expt_two_body_op(
+    configs, n_level, psi, sites, data, indices, indptr, ranking=None
+):
     res = np.zeros(psi.shape[1:], dtype=np.complex128)
 
     divisor_1 = n_level ** sites[1]
     divisor_2 = n_level ** sites[0]
+    site_1, site_2 = min(sites), max(sites)
 
     for i, config in enumerate(configs):
         col_1 = (config // divisor_1) % n_level
@@ -70,14 +84,115 @@ def _expt_two_body_op(configs, n_level, psi, sites, data, indices, indptr):
                 + (row_2 * divisor_2)
             )
 
-            j = np.searchsorted(configs, new_config)
+            j = _update_index(configs, ranking, i, new_config, site_1, site_2)
 
-            if j < configs.size and configs[j] == new_config:
+            if j >= 0:
                 res += ele * psi[i, ...] * np.conj(psi[j, ...])
 
     return res
 
 
+@njit(cache=True)
+def _density_correlations(configs, n_level, n_atom, state, probs):
+    """Matrix of the probabilities of the atoms `i` and `j` to be both in
+    `state`, the probability of atom `i` to be in `state` on the diagonal."""
+    output = np.zeros((n_atom, n_atom), dtype=np.float64)
+    atoms = np.empty(n_atom, dtype=np.int64)
+
+    for i in range(configs.size):
+        prob = probs[i]
+        if prob == 0:
+            continue
+
+        config = np.int64(configs[i])
+        count = 0
+        for atom in range(n_atom):
+            if n_level == 2:
+                local_state = (config >> atom) & 1
+            else:
+                local_state = config % n_level
+                config //= n_level
+
+            if local_state == state:
+                atoms[count] = atom
+                count += 1
+
+        for first in range(count):
+            for second in range(first, count):
+                output[atoms[first], atoms[second]] += prob
+
+    for atom in range(n_atom):
+        for other in range(atom):
+            output[atom, other] = output[other, atom]
+
+    return output
+
+
+@njit(cache=True)
+def _expt_local_ops(configs, n_level, psi, sites, ops, ranking=None):
+    """Expectation values of the operators `ops[k]` acting on the atoms
+    `sites[k, 0] <= sites[k, 1]` in a single pass over the state.
+
+    One body operators are stored with `sites[k, 0] == sites[k, 1]` in the
+    top left `n_level x n_level` block of `ops[k]`. Two body operators are
+    indexed by `n_level * state[sites[k, 0]] + state[sites[k, 1]]`.
+    """
+    res = np.zeros(ops.shape[0], dtype=np.complex128)
+
+    for i in range(configs.size):
+        config = np.int64(configs[i])
+        amplitude = psi[i]
+        if amplitude == 0:
+            continue
+
+        for k in range(ops.shape[0]):
+            site_1 = sites[k, 0]
+            site_2 = sites[k, 1]
+            divisor_1 = np.int64(n_level) ** site_1
+            divisor_2 = np.int64(n_level) ** site_2
+            col_1 = (config // divisor_1) % n_level
+
+            if site_1 == site_2:
+                for row in range(n_level):
+                    ele = ops[k, row, col_1]
+                    if ele == 0:
+                        continue
+
+                    if row == col_1:
+                        res[k] += ele * amplitude * np.conj(amplitude)
+                        continue
+
+                    new_config = config + (row - col_1) * divisor_1
+                    j = _update_index(configs, ranking, i, new_config, site_1, site_1)
+                    if j >= 0:
+                        res[k] += ele * amplitude * np.conj(psi[j])
+
+                continue
+
+            col_2 = (config // divisor_2) % n_level
+            col = col_1 * n_level + col_2
+
+            for row in range(n_level**2):
+                ele = ops[k, row, col]
+                if ele == 0:
+                    continue
+
+                # diagonal elements, e.g. density-density correlations
+                if row == col:
+                    res[k] += ele * amplitude * np.conj(amplitude)
+                    continue
+
+                row_1, row_2 = divmod(row, n_level)
+                new_config = (
+                    config + (row_1 - col_1) * divisor_1 + (row_2 - col_2) * divisor_2
+                )
+                j = _update_index(configs, ranking, i, new_config, site_1, site_2)
+                if j >= 0:
+                    res[k] += ele * amplitude * np.conj(psi[j])
+
+    return res
+
+
 @dataclass(frozen=True)
 class StateVector:
     data: NDArray
@@ -120,6 +235,7 @@ class StateVector:
 
             value = _expt_two_body_op(
                 configs=self.space.configurations,
+                ranking=self.space.ranking,
                 n_level=self.space.atom_type.n_level,
                 psi=self.data,
                 sites=site_indices,
@@ -164,6 +280,7 @@ class StateVector:
 
         value = _expt_one_body_op(
             configs=self.space.configurations,
+            ranking=self.space.ranking,
             n_level=self.space.atom_type.n_level,
             psi=self.data,
             site=site_index,
@@ -199,6 +316,117 @@ class StateVector:
         """
         ...
 
+    def _probabilities(self) -> NDArray:
+        probs = np.abs(self.data) ** 2
+        return probs / probs.sum()
+
+    @beartype
+    def density_correlations(self, state: str = "r") -> NDArray:
+        """Return the probabilities of every pair of sites to be both in the
+        local `state`, computed in a single pass over the state vector.
+
+        Args:
+            state (str): local state of the atoms, e.g. "g" or "r".
+                Defaults to "r".
+
+        Returns:
+            NDArray: symmetric matrix of size `n_sites x n_sites` with the
+            densities of the sites on the diagonal, `nan` for empty sites.
+
+        Raises:
+            ValueError: Error is raised when `state` is not a local state of
+            the atoms.
+
+        """
+        if state not in self.space.atom_type.str_to_int:
+            raise ValueError(f"state: {state} is not a valid local state.")
+
+        correlations = _density_correlations(
+            configs=self.space.configurations,
+            n_level=self.space.atom_type.n_level,
+            n_atom=self.space.n_atoms,
+            state=self.space.atom_type.str_to_int[state],
+            probs=self._probabilities(),
+        )
+
+        sites = list(self.space.program_register.full_index_to_index.keys())
+        output = np.full((self.space.n_sites, self.space.n_sites), np.nan)
+        output[np.ix_(sites, sites)] = correlations
+
+        return output
+
+    @beartype
+    def densities(self, state: str = "r") -> NDArray:
+        """Return the probability of every site to be in the local `state`.
+
+        Args:
+            state (str): local state of the atoms, e.g. "g" or "r".
+                Defaults to "r".
+
+        Returns:
+            NDArray: densities of the sites, `nan` for empty sites.
+
+        """
+        return np.diag(self.density_correlations(state)).copy()
+
+    @beartype
+    def local_traces(
+        self, operators: Sequence[Tuple[np.ndarray, Union[int, Tuple[int, int]]]]
+    ) -> NDArray:
+        """Return the expectation values of a list of one and two body
+        operators, computed in a single pass over the state vector.
+
+        Args:
+            operators (Sequence[Tuple[np.ndarray, int | Tuple[int, int]]]): pairs
+                of an operator and the site(s) it acts on, see `local_trace`.
+
+        Returns:
+            NDArray: the expectation values of the operators normalized by
+            the norm of the state.
+
+        Raises:
+            ValueError: Error is raised when the dimension of an operator is
+            not consistent with its sites or a site is out of bounds or empty.
+
+        """
+        n_level = self.space.atom_type.n_level
+        sites = np.zeros((len(operators), 2), dtype=np.int64)
+        ops = np.zeros((len(operators), n_level**2, n_level**2), dtype=np.complex128)
+
+        for k, (matrix, site_index) in enumerate(operators):
+            if isinstance(site_index, int):
+                site_index = (site_index,)
+
+            shape = (n_level ** len(site_index),) * 2
+            if matrix.shape != shape:
+                raise ValueError(
+                    f"expecting operator to be size {shape}, got {matrix.shape}"
+                )
+
+            atoms = [self.space.atom_index(index) for index in site_index]
+            if len(atoms) == 2 and atoms[0] > atoms[1]:
+                # the kernel expects the sites in increasing order
+                atoms.reverse()
+                matrix = (
+                    matrix.reshape((n_level,) * 4)
+                    .transpose(1, 0, 3, 2)
+                    .reshape(shape)
+                )
+
+            sites[k] = (atoms[0], atoms[-1])
+            ops[k, : shape[0], : shape[1]] = matrix
+
+        values = _expt_local_ops(
+            configs=self.space.configurations,
+            ranking=self.space.ranking,
+            n_level=n_level,
+            psi=self.data,
+            sites=sites,
+            ops=ops,
+        )
+
+        return values / np.vdot(self.data, self.data).real
+
     def sample(self, shots: int, project_hyperfine: bool = True) -> NDArray:
         """Sample the state vector and return bitstrings."""
         return self.space.sample_state_vector(
@@ -318,49 +546,185 @@ class RydbergHamiltonian:
     detuning_ops: List[DetuningOperator] = field(default_factory=list)
     rabi_ops: List[RabiOperator] = field(default_factory=list)
 
-    def _ode_complex_kernel(self, time: float, register: NDArray, output: NDArray):
-        diagonal = sum(
-            (detuning.get_diagonal(time) for detuning in self.detuning_ops),
-            start=self.rydberg,
-        )
+    @cached_property
+    def fused(self) -> FusedOperator:
+        """Contiguous representation of the Hamiltonian that applies the
+        diagonal and all rabi terms in a single pass, see `FusedOperator`."""
+        return self._fused_operator(np.float64)
 
-        np.multiply(diagonal, register, out=output)
+    @cached_property
+    def fused_single(self) -> FusedOperator:
+        """Same as `fused` with the data stored in single precision."""
+        return self._fused_operator(np.float32)
+
+    def _fused_operator(self, dtype: np.dtype) -> FusedOperator:
+        terms = []
         for rabi_op in self.rabi_ops:
-            rabi_op.dot(register, output, time)
+            if isinstance(rabi_op.op, BitFlipOperator):
+                term = rabi_op.op
+            else:
+                term = rabi_op.op.tocsr().tocoo()
+
+            terms.append(term)
+            if rabi_op.phase is not None:
+                terms.append(term.T)
+
+        diagonals = [detuning.diagonal for detuning in self.detuning_ops]
+
+        return FusedOperator.create(self.rydberg, diagonals, terms, dtype=dtype)
+
+    @cached_property
+    def compiled_coefficients(self):
+        """Numba compiled function evaluating the coefficients of `fused`,
+        see `compile_coefficients`."""
+        return compile_coefficients(self.emulator_ir)
+
+    @property
+    def _waveforms(self) -> Iterator[JITWaveform]:
+        for fields in self.emulator_ir.pulses.values():
+            for detuning_term in fields.detuning:
+                yield detuning_term.amplitude
+
+            for rabi_term in fields.rabi:
+                yield rabi_term.amplitude
+                if rabi_term.phase is not None:
+                    yield rabi_term.phase
+
+    @cached_property
+    def breakpoints(self) -> NDArray:
+        """Sorted times at which the Hamiltonian may fail to be smooth,
+        e.g. the joints of piecewise waveforms."""
+        breakpoints = {0.0, self.emulator_ir.duration}
+        for waveform in self._waveforms:
+            breakpoints.update(waveform.breakpoints)
+
+        return np.array(sorted(breakpoints), dtype=np.float64)
+
+    @cached_property
+    def constant_segments(self) -> NDArray:
+        """Boolean mask, element `i` is True if the Hamiltonian is constant
+        between `breakpoints[i]` and `breakpoints[i + 1]`."""
+        starts = self.breakpoints[:-1]
+        stops = self.breakpoints[1:]
+
+        mask = np.ones(starts.size, dtype=np.bool_)
+        for waveform in self._waveforms:
+            is_constant = np.zeros(starts.size, dtype=np.bool_)
+            for start, stop in waveform.constant_intervals:
+                is_constant |= (start <= starts) & (stops <= stop)
+
+            mask &= is_constant
+
+        return mask
+
+    def segments(self, start: float, stop: float) -> List[Tuple[float, float, bool]]:
+        """Split the time interval `[start, stop]` at the breakpoints.
 
-        output *= -1j
-        return output
+        Returns:
+            List[Tuple[float, float, bool]]: `(start, stop, is_constant)` for
+            each piece, `is_constant` is True if the Hamiltonian does not
+            depend on time within the piece.
+        """
+        if stop <= start:
+            return []
+
+        breakpoints = self.breakpoints
+        # ignore breakpoints that would produce vanishingly small pieces
+        eps = 1e-12 * max(abs(start), abs(stop), 1.0)
+        inner = breakpoints[(breakpoints > start + eps) & (breakpoints < stop - eps)]
+        times = [start, *inner.tolist(), stop]
+
+        segments = []
+        for lhs, rhs in zip(times[:-1], times[1:]):
+            index = np.searchsorted(breakpoints, 0.5 * (lhs + rhs)) - 1
+            is_constant = 0 <= index < self.constant_segments.size and bool(
+                self.constant_segments[index]
+            )
+            segments.append((lhs, rhs, is_constant))
 
-    def _ode_real_kernel(self, time: float, register: NDArray, output: NDArray):
-        # this is needed to use solver that only work on real-valued states
-        return self._ode_complex_kernel(
-            time, register.view(np.complex128), output
-        ).view(np.float64)
+        return segments
 
-    def _ode_complex_kernel_int(self, time: float, register: NDArray, output: NDArray):
-        diagonal = sum(
-            (detuning.get_diagonal(time) for detuning in self.detuning_ops),
+    def _fused_coefficients(self, time: float) -> Tuple[NDArray, NDArray]:
+        diag_coeffs = np.array(
+            [
+                detuning.amplitude(time) if detuning.amplitude else 1.0
+                for detuning in self.detuning_ops
+            ],
+            dtype=np.float64,
         )
 
+        term_coeffs = []
+        for rabi_op in self.rabi_ops:
+            amplitude = rabi_op.amplitude(time) / 2
+            if rabi_op.phase is None:
+                term_coeffs.append(amplitude)
+            else:
+                amplitude *= np.exp(1j * rabi_op.phase(time))
+                term_coeffs.append(amplitude)
+                term_coeffs.append(np.conj(amplitude))
+
+        return diag_coeffs, np.array(term_coeffs, dtype=np.complex128)
+
+    def _ode_complex_kernel(
+        self, time: float, register: NDArray, output: NDArray, num_threads: int = 1
+    ):
+        diag_coeffs, term_coeffs = self._fused_coefficients(time)
+        return self.fused.matvec(
+            diag_coeffs,
+            term_coeffs,
+            register,
+            out=output,
+            scale=-1j,
+            num_threads=num_threads,
+        )
+
+    def _ode_real_kernel(
+        self, time: float, register: NDArray, output: NDArray, num_threads: int = 1
+    ):
+        # this is needed to use solver that only work on real-valued states,
+        # `output` carries the shape of the state, e.g. (N,) or (N, K).
+        register = register.view(np.complex128).reshape(output.shape)
+        return (
+            self._ode_complex_kernel(time, register, output, num_threads)
+            .view(np.float64)
+            .reshape(-1)
+        )
+
+    def _ode_complex_kernel_int(
+        self, time: float, register: NDArray, output: NDArray, num_threads: int = 1
+    ):
+        diag_coeffs, term_coeffs = self._fused_coefficients(time)
+
         u = np.exp(-1j * self.rydberg * time)
+        u = u.reshape((-1,) + (1,) * (register.ndim - 1))
 
         int_register = u * register
 
-        np.multiply(diagonal, int_register, out=output)
-        for rabi_op in self.rabi_ops:
-            rabi_op.dot(int_register, output, time)
+        self.fused.matvec(
+            diag_coeffs,
+            term_coeffs,
+            int_register,
+            out=output,
+            scale=-1j,
+            rydberg_scale=0.0,
+            num_threads=num_threads,
+        )
 
         np.conj(u, out=u)
         np.multiply(u, output, out=output)
 
-        output *= -1j
         return output
 
-    def _ode_real_kernel_int(self, time: float, register: NDArray, output: NDArray):
+    def _ode_real_kernel_int(
+        self, time: float, register: NDArray, output: NDArray, num_threads: int = 1
+    ):
         # this is needed to use solver that only work on real-valued states
-        return self._ode_complex_kernel_int(
-            time, register.view(np.complex128), output
-        ).view(np.float64)
+        register = register.view(np.complex128).reshape(output.shape)
+        return (
+            self._ode_complex_kernel_int(time, register, output, num_threads)
+            .view(np.float64)
+            .reshape(-1)
+        )
 
     def _check_register(self, register: np.ndarray):
         register_shape = (self.space.size,)
@@ -384,16 +748,8 @@ class RydbergHamiltonian:
         if output is None:
             output = np.zeros_like(register, dtype=np.complex128)
 
-        diagonal = sum(
-            (detuning.get_diagonal(time) for detuning in self.detuning_ops),
-            start=self.rydberg,
-        )
-
-        np.multiply(diagonal, register, out=output)
-        for rabi_op in self.rabi_ops:
-            rabi_op.dot(register, output, time)
-
-        return output
+        diag_coeffs, term_coeffs = self._fused_coefficients(time)
+        return self.fused.matvec(diag_coeffs, term_coeffs, register, out=output)
 
     @beartype
     def average(
@@ -484,9 +840,16 @@ class RydbergHamiltonian:
 
 @dataclass(frozen=True)
 class AnalogGate:
-    SUPPORTED_SOLVERS = ["lsoda", "dop853", "dopri5"]
+    SUPPORTED_SOLVERS = ["lsoda", "dop853", "dopri5", "krylov", "jit_dopri5"]
 
     hamiltonian: RydbergHamiltonian
+    num_threads: int = 1
+    single_precision: bool = False
+
+    @property
+    def state_type(self) -> np.dtype:
+        """Data type of the evolved states."""
+        return np.complex64 if self.single_precision else np.complex128
 
     @staticmethod
     def _error_check_dop(status_code: int):
@@ -539,7 +902,7 @@ class AnalogGate:
     def _error_check(solver_name: str, status_code: int):
         if solver_name == "lsoda":
             AnalogGate._error_check_lsoda(status_code)
-        elif solver_name in ["dop853", "dopri5"]:
+        elif solver_name in ["dop853", "dopri5", "jit_dopri5"]:
             AnalogGate._error_check_dop(status_code)
 
     def _check_args(
@@ -551,23 +914,35 @@ class AnalogGate:
         nsteps: int,
         times: Sequence[float],
     ):
-        duration = self.hamiltonian.emulator_ir.duration
-        times = [duration] if len(times) == 0 else times
         if state_vec is None:
-            state_vec = self.hamiltonian.space.zero_state(np.complex128)
+            state_vec = self.hamiltonian.space.zero_state(self.state_type)
 
         if state_vec.space != self.hamiltonian.space:
             raise ValueError("State vector not in the same space as the Hamiltonian.")
 
+        times = self._check_times(solver_name, times)
+
+        return state_vec, solver_name, atol, rtol, nsteps, times
+
+    def _check_times(self, solver_name: str, times: Sequence[float]):
+        duration = self.hamiltonian.emulator_ir.duration
+        times = [duration] if len(times) == 0 else times
+
         if solver_name not in AnalogGate.SUPPORTED_SOLVERS:
             raise ValueError(f"'{solver_name}' not supported.")
 
+        if self.single_precision and solver_name != "jit_dopri5":
+            raise ValueError(
+                f"'{solver_name}' solver does not support single precision, "
+                "use 'jit_dopri5' instead."
+            )
+
         if any(time > duration or time < 0.0 for time in times):
             raise ValueError(
                 f"Times must be between 0 and duration {duration}. found {times}"
             )
 
-        return state_vec, solver_name, atol, rtol, nsteps, times
+        return times
 
     def _apply(
         self,
@@ -582,22 +957,191 @@ class AnalogGate:
         state_vec, solver_name, atol, rtol, nsteps, times = self._check_args(
             state_vec, solver_name, atol, rtol, nsteps, times
         )
-        state_data = np.asarray(state_vec.data).astype(np.complex128, copy=False)
 
-        solver = ode(self.hamiltonian._ode_real_kernel)
-        solver.set_f_params(np.zeros_like(state_data, dtype=np.complex128))
-        solver.set_initial_value(state_data.view(np.float64))
+        for state_data in self._threaded(
+            self._evolve(state_vec.data, solver_name, atol, rtol, nsteps, times)
+        ):
+            yield StateVector(state_data, self.hamiltonian.space)
+
+    def _threaded(self, states: Iterator[NDArray]) -> Iterator[NDArray]:
+        # the kernels run with `num_threads` threads while the states are
+        # evolved, the threads of the caller are restored in between
+        while True:
+            with numba_threads(self.num_threads):
+                state = next(states, None)
+
+            if state is None:
+                return
+
+            yield state
+
+    def _ode_solver(
+        self,
+        kernel: Callable,
+        state_data: NDArray,
+        solver_name: str,
+        atol: float,
+        rtol: float,
+        nsteps: int,
+    ) -> ode:
+        # the solver works on flat real-valued arrays, the kernels reshape
+        # the state to the shape of the output buffer, e.g. (N,) or (N, K).
+        solver = ode(kernel)
+        solver.set_f_params(
+            np.zeros_like(state_data, dtype=np.complex128), self.num_threads
+        )
+        solver.set_initial_value(state_data.view(np.float64).reshape(-1))
         solver.set_integrator(solver_name, atol=atol, rtol=rtol, nsteps=nsteps)
+        return solver
+
+    def _evolve(
+        self,
+        state_data: NDArray,
+        solver_name: str,
+        atol: float,
+        rtol: float,
+        nsteps: int,
+        times: Sequence[float],
+    ) -> Iterator[NDArray]:
+        state_data = np.ascontiguousarray(state_data, dtype=self.state_type)
+
+        if solver_name == "krylov":
+            yield from self._evolve_krylov(state_data, atol, rtol, nsteps, times)
+            return
+
+        if solver_name == "jit_dopri5":
+            yield from self._evolve_jit(state_data, atol, rtol, nsteps, times)
+            return
+
+        solver = self._ode_solver(
+            self.hamiltonian._ode_real_kernel,
+            state_data,
+            solver_name,
+            atol,
+            rtol,
+            nsteps,
+        )
+
+        if self.hamiltonian.constant_segments.any() and np.all(np.diff(times) >= 0):
+            yield from self._evolve_piecewise(
+                solver, state_data.shape, solver_name, atol, rtol, nsteps, times
+            )
+            return
 
         for time in times:
             if solver.t == time:
-                yield StateVector(solver.y.view(np.complex128), self.hamiltonian.space)
+                yield solver.y.view(np.complex128).reshape(state_data.shape)
                 continue
 
             solver.integrate(time)
             AnalogGate._error_check(solver_name, solver.get_return_code())
 
-            yield StateVector(solver.y.view(np.complex128), self.hamiltonian.space)
+            yield solver.y.view(np.complex128).reshape(state_data.shape)
+
+    def _evolve_piecewise(
+        self,
+        solver: ode,
+        shape: Tuple[int, ...],
+        solver_name: str,
+        atol: float,
+        rtol: float,
+        nsteps: int,
+        times: Sequence[float],
+    ) -> Iterator[NDArray]:
+        # apply the exact propagator on time intervals where the hamiltonian
+        # is constant and only use the ODE solver on the time dependent parts.
+        propagator = KrylovPropagator(
+            self.hamiltonian,
+            atol=atol,
+            rtol=rtol,
+            nsteps=nsteps,
+            num_threads=self.num_threads,
+        )
+
+        current_time = 0.0
+        for time in times:
+            for start, stop, is_constant in self.hamiltonian.segments(
+                current_time, time
+            ):
+                if is_constant:
+                    state_data = solver.y.view(np.complex128).reshape(shape)
+                    state_data = propagator.integrate_constant(state_data, start, stop)
+                    solver.set_initial_value(
+                        state_data.view(np.float64).reshape(-1), stop
+                    )
+                    continue
+
+                if solver.t != start:
+                    solver.set_initial_value(solver.y, start)
+
+                solver.integrate(stop)
+                AnalogGate._error_check(solver_name, solver.get_return_code())
+
+            current_time = time
+            yield solver.y.view(np.complex128).reshape(shape)
+
+    def _evolve_krylov(
+        self,
+        state_data: NDArray,
+        atol: float,
+        rtol: float,
+        nsteps: int,
+        times: Sequence[float],
+    ) -> Iterator[NDArray]:
+        state_data = state_data.copy()
+
+        # every column of a batch gets its own step size control
+        columns = state_data.reshape(state_data.shape[0], -1).T
+        propagators = [
+            KrylovPropagator(
+                self.hamiltonian,
+                atol=atol,
+                rtol=rtol,
+                nsteps=nsteps,
+                num_threads=self.num_threads,
+            )
+            for _ in range(columns.shape[0])
+        ]
+
+        current_time = 0.0
+        for time in times:
+            if time < current_time:
+                raise ValueError("'krylov' solver requires `times` to be increasing.")
+
+            for column, propagator in zip(columns, propagators):
+                column[:] = propagator.integrate(column.copy(), current_time, time)
+
+            current_time = time
+
+            yield state_data.copy()
+
+    def _evolve_jit(
+        self,
+        state_data: NDArray,
+        atol: float,
+        rtol: float,
+        nsteps: int,
+        times: Sequence[float],
+    ) -> Iterator[NDArray]:
+        if np.any(np.diff(times) < 0):
+            raise ValueError(
+                "'jit_dopri5' solver requires `times` to be increasing."
+            )
+
+        propagator = DormandPrincePropagator(
+            self.hamiltonian,
+            atol=atol,
+            rtol=rtol,
+            nsteps=nsteps,
+            num_threads=self.num_threads,
+            single_precision=self.single_precision,
+        )
+        # the states are integrated in chunks to bound the memory of long
+        # series of times, a failed chunk is not yielded.
+        for states in propagator.evolve_chunks(state_data, times):
+            yield from states
+
+        AnalogGate._error_check("jit_dopri5", propagator.status)
 
     def _apply_interaction_picture(
         self,
@@ -612,31 +1156,57 @@ class AnalogGate:
         state_vec, solver_name, atol, rtol, nsteps, times = self._check_args(
             state_vec, solver_name, atol, rtol, nsteps, times
         )
-        state_data = np.asarray(state_vec.data).astype(np.complex128, copy=False)
 
-        solver = ode(self.hamiltonian._ode_real_kernel_int)
-        solver.set_f_params(np.zeros_like(state_data, dtype=np.complex128))
-        solver.set_initial_value(state_data.view(np.float64))
-        solver.set_integrator(solver_name, atol=atol, rtol=rtol, nsteps=nsteps)
+        states = self._evolve_interaction_picture(
+            state_vec.data, solver_name, atol, rtol, nsteps, times
+        )
+        for state_data in self._threaded(states):
+            yield StateVector(state_data, self.hamiltonian.space)
 
-        state_vec_t = state_vec
+    def _evolve_interaction_picture(
+        self,
+        state_data: NDArray,
+        solver_name: str,
+        atol: float,
+        rtol: float,
+        nsteps: int,
+        times: Sequence[float],
+    ) -> Iterator[NDArray]:
+        if solver_name in ["krylov", "jit_dopri5"]:
+            raise ValueError(
+                f"'{solver_name}' solver does not support the interaction picture."
+            )
+
+        state_data = np.ascontiguousarray(state_data, dtype=np.complex128)
+
+        solver = self._ode_solver(
+            self.hamiltonian._ode_real_kernel_int,
+            state_data,
+            solver_name,
+            atol,
+            rtol,
+            nsteps,
+        )
+
+        state_data_t = state_data
+        rydberg = self.hamiltonian.rydberg.reshape(
+            (-1,) + (1,) * (state_data.ndim - 1)
+        )
 
         for time in times:
             if time == solver.t:
                 # if the time is the same as the current time,
                 # do not call the integrator, just yield state
-                yield state_vec_t
+                yield state_data_t
                 continue
 
             solver.integrate(time)
             AnalogGate._error_check(solver_name, solver.get_return_code())
             # go back to the schrodinger picture
-            u = np.exp(-1j * time * self.hamiltonian.rydberg)
-            state_vec_t = StateVector(
-                u * solver.y.view(np.complex128), self.hamiltonian.space
-            )
+            u = np.exp(-1j * time * rydberg)
+            state_data_t = u * solver.y.view(np.complex128).reshape(state_data.shape)
             # yield the state vector in the schrodinger picture
-            yield state_vec_t
+            yield state_data_t
 
     @beartype
     def apply(
@@ -668,6 +1238,115 @@ class AnalogGate:
                 times=times,
             )
 
+    @beartype
+    def apply_batch(
+        self,
+        states: NDArray,
+        solver_name: str = "dop853",
+        atol: float = 1e-7,
+        rtol: float = 1e-14,
+        nsteps: int = 2_147_483_647,
+        times: Union[Sequence[float], RealArray] = (),
+        interaction_picture: bool = False,
+    ) -> Iterator[NDArray]:
+        """Evolve a batch of state vectors in a single integration.
+
+        Args:
+            states (NDArray): The initial states stored as the columns of
+                an (N, K) array, N being the size of the Hilbert space.
+            solver_name (str, optional): Which SciPy Solver to use, "krylov"
+                for the adaptive Krylov propagator or "jit_dopri5" for the numba
+                compiled Dormand-Prince integrator. Defaults to "dop853".
+            atol (float, optional): Absolute tolerance for ODE solver.
+                Defaults to 1e-7.
+            rtol (float, optional): Relative tolerance for ODE solver.
+                Defaults to 1e-14.
+            nsteps (int, optional): Maximum number of steps allowed per
+                integration step. Defaults to 2_147_483_647.
+            times (Union[Sequence[float], RealArray], optional): The times to
+                evaluate the states at. Defaults to the end of the program.
+            interaction_picture (bool, optional): Use the interaction picture
+                when solving schrodinger equation. Defaults to False.
+
+        Returns:
+            Iterator[NDArray]: An iterator of (N, K) arrays holding the evolved
+                states at each time step.
+        """
+        if states.ndim != 2 or states.shape[0] != self.hamiltonian.space.size:
+            raise ValueError(
+                f"Expecting `states` to have shape ({self.hamiltonian.space.size}, K),"
+                f" got shape {states.shape}"
+            )
+
+        times = self._check_times(solver_name, times)
+
+        if interaction_picture:
+            evolve = self._evolve_interaction_picture
+        else:
+            evolve = self._evolve
+
+        return self._threaded(evolve(states, solver_name, atol, rtol, nsteps, times))
+
+    @beartype
+    def observe(
+        self,
+        observables: Sequence,
+        state: Optional[StateVector] = None,
+        solver_name: str = "dop853",
+        atol: float = 1e-7,
+        rtol: float = 1e-14,
+        nsteps: int = 2_147_483_647,
+        times: Union[Sequence[float], RealArray] = (),
+        interaction_picture: bool = False,
+    ) -> NDArray:
+        """Evolve a state vector and evaluate observables at each time step
+        without keeping the states.
+
+        Args:
+            observables (Sequence[Observable]): The observables to evaluate,
+                see `bloqade.emulate.ir.observables`.
+            state (Optional[StateVector], optional): The initial state, the
+                zero state if not provided. Defaults to None.
+            solver_name (str, optional): Which SciPy Solver to use, "krylov"
+                for the adaptive Krylov propagator or "jit_dopri5" for the numba
+                compiled Dormand-Prince integrator. Defaults to "dop853".
+            atol (float, optional): Absolute tolerance for ODE solver.
+                Defaults to 1e-7.
+            rtol (float, optional): Relative tolerance for ODE solver.
+                Defaults to 1e-14.
+            nsteps (int, optional): Maximum number of steps allowed per
+                integration step. Defaults to 2_147_483_647.
+            times (Union[Sequence[float], RealArray], optional): The times to
+                evaluate the observables at. Defaults to the end of the program.
+            interaction_picture (bool, optional): Use the interaction picture
+                when solving schrodinger equation. Defaults to False.
+
+        Returns:
+            NDArray: (n_times, n_observables) array of the observables.
+        """
+        from bloqade.emulate.ir.observables import ObservableEvaluator
+
+        evaluator = ObservableEvaluator(self.hamiltonian, observables)
+        if state is None:
+            state = self.hamiltonian.space.zero_state(self.state_type)
+
+        times = self._check_times(solver_name, times)
+        values = np.zeros((len(times), len(evaluator)), dtype=np.float64)
+
+        states = self.apply(
+            state,
+            solver_name=solver_name,
+            atol=atol,
+            rtol=rtol,
+            nsteps=nsteps,
+            times=times,
+            interaction_picture=interaction_picture,
+        )
+        for time, row, state_t in zip(times, values, states):
+            evaluator.evaluate(state_t, time, row)
+
+        return values
+
     @beartype
     def run(
         self,
@@ -690,8 +1369,56 @@ class AnalogGate:
             interaction_picture=interaction_picture,
         )
 
-        state = self.hamiltonian.space.zero_state()
+        state = self.hamiltonian.space.zero_state(self.state_type)
         (result,) = self.apply(state, **options)
         result.normalize()
 
         return result.sample(shots, project_hyperfine=project_hyperfine)
+
+    @beartype
+    def distribution(
+        self,
+        solver_name: str = "dop853",
+        atol: float = 1e-14,
+        rtol: float = 1e-7,
+        nsteps: int = 2_147_483_647,
+        interaction_picture: bool = False,
+        project_hyperfine: bool = True,
+    ) -> Tuple[NDArray[np.uint8], NDArray[np.float64]]:
+        """Run the emulation with all atoms in the ground state and return
+        the exact distribution of the measurements of the final state, i.e.
+        the outcome of infinitely many shots.
+
+        Returns:
+            Tuple[NDArray[np.uint8], NDArray[np.float64]]: the distinct
+                measured local states of the atoms, one row per outcome, and
+                the probabilities of the outcomes. Outcomes of vanishing
+                probability are omitted.
+        """
+        options = dict(
+            solver_name=solver_name,
+            atol=atol,
+            rtol=rtol,
+            nsteps=nsteps,
+            interaction_picture=interaction_picture,
+        )
+
+        state = self.hamiltonian.space.zero_state(self.state_type)
+        (result,) = self.apply(state, **options)
+
+        probabilities = np.abs(result.data).astype(np.float64) ** 2
+        probabilities /= probabilities.sum()
+        (nonzero,) = np.nonzero(probabilities)
+
+        space = self.hamiltonian.space
+        outcomes = space.local_states(
+            space.configurations[nonzero], project_hyperfine=project_hyperfine
+        )
+        probabilities = probabilities[nonzero]
+
+        if project_hyperfine and space.atom_type.n_level > 2:
+            # configurations differing by hyperfine atoms are measured the same
+            outcomes, inverse = np.unique(outcomes, axis=0, return_inverse=True)
+            probabilities = np.bincount(inverse.ravel(), weights=probabilities)
+
+        return outcomes, probabilities
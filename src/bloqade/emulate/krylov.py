@@ -0,0 +1,352 @@
+from dataclasses import dataclass, field
+from beartype.typing import Callable, Optional, Tuple, TYPE_CHECKING
+from numpy.typing import NDArray
+from scipy.linalg import eigh_tridiagonal
+import numpy as np
+
+if TYPE_CHECKING:
+    from bloqade.emulate.ir.state_vector import RydbergHamiltonian
+
+
+# coefficients of the 4th order commutator-free Magnus integrator
+# with two exponentials, see: S. Blanes and P.C. Moan, Applied
+# Numerical Mathematics 56 (2006) 1519–1537
+_CF4_C1 = 0.5 - np.sqrt(3) / 6
+_CF4_C2 = 0.5 + np.sqrt(3) / 6
+_CF4_A1 = (3 - 2 * np.sqrt(3)) / 12
+_CF4_A2 = (3 + 2 * np.sqrt(3)) / 12
+
+_SAFETY = 0.9
+_MIN_FACTOR = 0.2
+_MAX_FACTOR = 5.0
+# step size control of the exponential of a constant hamiltonian
+_SHRINK_FACTOR = 0.8
+_GROW_FACTOR = 1.25
+
+Coefficients = Tuple[float, NDArray, NDArray]
+
+
+@dataclass
+class LanczosBasis:
+    """Lanczos decomposition of a hermitian operator acting on a vector.
+
+    Attributes:
+        basis (NDArray): orthonormal Krylov vectors, one per row.
+        alpha (NDArray): diagonal of the projected tridiagonal matrix.
+        beta (NDArray): off-diagonal of the projected tridiagonal matrix,
+            `beta[dim - 1]` is the norm of the residual vector.
+        norm (float): norm of the input vector.
+        dim (int): dimension of the Krylov subspace.
+        exact (bool): True if the Krylov subspace is invariant under the
+            operator, e.g. a happy breakdown occured.
+
+    """
+
+    basis: NDArray
+    alpha: NDArray
+    beta: NDArray
+    norm: float = 0.0
+    dim: int = 0
+    exact: bool = False
+
+    @classmethod
+    def allocate(cls, krylov_dim: int, size: int, dtype=np.complex128):
+        return cls(
+            basis=np.zeros((krylov_dim, size), dtype=dtype),
+            alpha=np.zeros(krylov_dim, dtype=np.float64),
+            beta=np.zeros(krylov_dim, dtype=np.float64),
+        )
+
+    @property
+    def max_dim(self) -> int:
+        return self.alpha.size
+
+    def expm_coeffs(self, dt: float) -> Tuple[NDArray, float]:
+        """Coefficients of exp(-i dt H) v in the Krylov basis and the
+        a posteriori estimate of the error of the approximation."""
+        dim = self.dim
+        if dim == 1:
+            energies = self.alpha[:1]
+            vectors = np.ones((1, 1))
+        else:
+            energies, vectors = eigh_tridiagonal(
+                self.alpha[:dim], self.beta[: dim - 1]
+            )
+
+        coeffs = vectors @ (np.exp(-1j * dt * energies) * vectors[0, :])
+        coeffs *= self.norm
+
+        if self.exact:
+            return coeffs, 0.0
+
+        return coeffs, abs(self.beta[dim - 1] * coeffs[-1])
+
+    def expm(self, dt: float, out: NDArray) -> NDArray:
+        coeffs, _ = self.expm_coeffs(dt)
+        return np.dot(coeffs.astype(out.dtype), self.basis[: self.dim], out=out)
+
+    def build(
+        self,
+        matvec: Callable[[NDArray, NDArray], NDArray],
+        vector: NDArray,
+        dt: Optional[float] = None,
+        tol: float = 0.0,
+    ) -> "LanczosBasis":
+        """Run the Lanczos iteration starting from `vector`, if `dt` is
+        provided the iteration stops as soon as exp(-i dt H) v is converged
+        within `tol`."""
+        basis, alpha, beta = self.basis, self.alpha, self.beta
+
+        self.norm = np.linalg.norm(vector)
+        self.exact = False
+        self.dim = 0
+
+        if self.norm == 0:
+            basis[0, :] = 0
+            alpha[0] = 0
+            beta[0] = 0
+            self.dim = 1
+            self.exact = True
+            return self
+
+        np.divide(vector, self.norm, out=basis[0])
+
+        for j in range(self.max_dim):
+            self.dim = j + 1
+            w = matvec(basis[j])
+            alpha[j] = np.vdot(basis[j], w).real
+
+            w -= alpha[j] * basis[j]
+            if j > 0:
+                w -= beta[j - 1] * basis[j - 1]
+
+            beta[j] = np.linalg.norm(w)
+
+            if beta[j] <= 1e-12 * max(abs(alpha[j]), 1.0):
+                self.exact = True
+                return self
+
+            if dt is not None and self.expm_coeffs(dt)[1] <= tol:
+                return self
+
+            if j + 1 < self.max_dim:
+                np.divide(w, beta[j], out=basis[j + 1])
+
+        return self
+
+
+@dataclass
+class KrylovPropagator:
+    """Adaptive short-time Krylov (Lanczos) propagator.
+
+    Time dependence of the Hamiltonian is handled with a 4th order
+    commutator-free Magnus integrator, the local error is estimated with
+    step doubling. Because the exponentials are computed in a Krylov
+    subspace the step size is not limited by the norm of the Hamiltonian,
+    only by how fast it changes in time. On time intervals in which the
+    Hamiltonian is constant the exponential is applied directly.
+
+    """
+
+    hamiltonian: "RydbergHamiltonian"
+    atol: float = 1e-7
+    rtol: float = 1e-14
+    nsteps: int = 2_147_483_647
+    krylov_dim: int = 30
+    num_threads: int = 1
+    step_size: Optional[float] = None
+    constant_step_size: Optional[float] = None
+    lanczos: Optional[LanczosBasis] = field(default=None, repr=False)
+
+    def _coefficients(self, time: float) -> Coefficients:
+        return (1.0, *self.hamiltonian._fused_coefficients(time))
+
+    @staticmethod
+    def _combine(a: float, lhs: Coefficients, b: float, rhs: Coefficients):
+        return tuple(a * x + b * y for x, y in zip(lhs, rhs))
+
+    def _matvec(self, coeffs: Coefficients):
+        rydberg_scale, diag_coeffs, term_coeffs = coeffs
+        fused = self.hamiltonian.fused
+
+        def matvec(vector: NDArray) -> NDArray:
+            return fused.matvec(
+                diag_coeffs,
+                term_coeffs,
+                vector,
+                rydberg_scale=rydberg_scale,
+                num_threads=self.num_threads,
+            )
+
+        return matvec
+
+    def _expm(
+        self, coeffs: Coefficients, dt: float, state: NDArray, tol: float
+    ) -> Optional[NDArray]:
+        lanczos = self.lanczos.build(self._matvec(coeffs), state, dt, tol)
+        if lanczos.expm_coeffs(dt)[1] > tol:
+            return None
+
+        return lanczos.expm(dt, np.empty_like(state))
+
+    def _cf4(
+        self, time: float, state: NDArray, dt: float, tol: float
+    ) -> Optional[NDArray]:
+        h1 = self._coefficients(time + _CF4_C1 * dt)
+        h2 = self._coefficients(time + _CF4_C2 * dt)
+
+        first = self._combine(2 * _CF4_A2, h1, 2 * _CF4_A1, h2)
+        second = self._combine(2 * _CF4_A1, h1, 2 * _CF4_A2, h2)
+
+        result = self._expm(first, 0.5 * dt, state, tol)
+        if result is not None:
+            result = self._expm(second, 0.5 * dt, result, tol)
+
+        return result
+
+    def _magnus_step(
+        self, time: float, state: NDArray, dt: float, tol: float
+    ) -> Tuple[Optional[NDArray], float]:
+        # the local error is estimated by step doubling, the tolerance is
+        # split between the krylov approximations and the magnus expansion.
+        krylov_tol = 0.1 * tol
+
+        half_dt = 0.5 * dt
+        result = self._cf4(time, state, half_dt, krylov_tol)
+        if result is not None:
+            result = self._cf4(time + half_dt, result, half_dt, krylov_tol)
+
+        estimate = None
+        if result is not None:
+            estimate = self._cf4(time, state, dt, krylov_tol)
+
+        if estimate is None:
+            # krylov approximation did not converge, reduce step size
+            return None, _MIN_FACTOR * dt
+
+        # the error of the magnus expansion is of order dt^5
+        error = np.linalg.norm(result - estimate) / 15
+        if error == 0:
+            factor = _MAX_FACTOR
+        else:
+            factor = _SAFETY * (tol / error) ** (1 / 5)
+            factor = min(_MAX_FACTOR, max(_MIN_FACTOR, factor))
+
+        if error > tol:
+            return None, factor * dt
+
+        return result, factor * dt
+
+    def _integrate_smooth(
+        self, state: NDArray, start: float, stop: float, nsteps: int
+    ) -> Tuple[NDArray, int]:
+        time = start
+
+        while time < stop:
+            if nsteps >= self.nsteps:
+                raise RuntimeError("Krylov: Larger nsteps is needed.")
+
+            proposed = stop - time if self.step_size is None else self.step_size
+            tol = self.atol + self.rtol * np.linalg.norm(state)
+
+            dt = min(proposed, stop - time)
+            result, next_dt = self._magnus_step(time, state, dt, tol)
+            nsteps += 1
+
+            if next_dt < np.finfo(np.float64).eps * max(abs(time), 1.0):
+                raise RuntimeError("Krylov: Step size becomes too small.")
+
+            if result is None:
+                self.step_size = next_dt
+                continue
+
+            state = result
+            time = stop if dt == stop - time else time + dt
+
+            if dt < proposed:
+                # do not let a step clipped to a checkpoint
+                # shrink the step size for the rest of the evolution
+                self.step_size = max(next_dt, proposed)
+            else:
+                self.step_size = next_dt
+
+        return state, nsteps
+
+    def _allocate(self, state: NDArray):
+        if self.lanczos is None or self.lanczos.basis.shape[1] != state.size:
+            self.lanczos = LanczosBasis.allocate(
+                self.krylov_dim, state.size, dtype=state.dtype
+            )
+
+    def _integrate_constant(
+        self, state: NDArray, start: float, stop: float, nsteps: int
+    ) -> Tuple[NDArray, int]:
+        matvec = self._matvec(self._coefficients(0.5 * (start + stop)))
+        time = start
+
+        while time < stop:
+            if nsteps >= self.nsteps:
+                raise RuntimeError("Krylov: Larger nsteps is needed.")
+
+            proposed = (
+                stop - time
+                if self.constant_step_size is None
+                else self.constant_step_size
+            )
+            tol = self.atol + self.rtol * np.linalg.norm(state)
+
+            dt = min(proposed, stop - time)
+            lanczos = self.lanczos.build(matvec, state, dt, tol)
+            nsteps += 1
+
+            # the krylov basis does not depend on the step size,
+            # shrink the step until the approximation is converged.
+            converged = True
+            while lanczos.expm_coeffs(dt)[1] > tol:
+                converged = False
+                dt *= _SHRINK_FACTOR
+
+                if dt < np.finfo(np.float64).eps * max(abs(time), 1.0):
+                    raise RuntimeError("Krylov: Step size becomes too small.")
+
+            state = lanczos.expm(dt, np.empty_like(state))
+            time = stop if dt == stop - time else time + dt
+
+            if converged:
+                self.constant_step_size = max(proposed, _GROW_FACTOR * dt)
+            else:
+                self.constant_step_size = dt
+
+        return state, nsteps
+
+    def integrate_constant(self, state: NDArray, start: float, stop: float) -> NDArray:
+        """Evolve `state` from time `start` to time `stop` assuming the
+        Hamiltonian does not depend on time in between. `state` can also be
+        an (N, K) array, in which case each column is evolved."""
+        if state.ndim == 2:
+            return np.stack(
+                [self.integrate_constant(column, start, stop) for column in state.T],
+                axis=1,
+            )
+
+        state = np.ascontiguousarray(state)
+        self._allocate(state)
+        state, _ = self._integrate_constant(state, start, stop, 0)
+        return state
+
+    def integrate(self, state: NDArray, start: float, stop: float) -> NDArray:
+        """Evolve `state` from time `start` to time `stop`."""
+        self._allocate(state)
+
+        # the magnus expansion is only accurate if the hamiltonian is smooth
+        # within a step, never step across a breakpoint of the waveforms.
+        nsteps = 0
+        for segment_start, segment_stop, is_constant in self.hamiltonian.segments(
+            start, stop
+        ):
+            integrate = (
+                self._integrate_constant if is_constant else self._integrate_smooth
+            )
+            state, nsteps = integrate(state, segment_start, segment_stop, nsteps)
+
+        return state
@@ -0,0 +1,250 @@
+from bloqade.emulate.codegen.hamiltonian import CompileCache
+from bloqade.emulate.schedule import ParallelPlan, schedule
+from bloqade.emulate.sparse_operator import numba_thread_count
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from beartype.typing import (
+    Any,
+    Callable,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+from numba import set_num_threads
+import multiprocessing
+import os
+
+# environment variables of the sizes of the thread pools of BLAS libraries
+THREAD_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+)
+
+# compile cache of the current worker of an `EmulatorPool`
+_worker_cache: Optional[CompileCache] = None
+# number of threads of the tasks of the current worker, set by the plan
+_worker_threads: Optional[int] = None
+
+
+def worker_compile_cache() -> Optional[CompileCache]:
+    """The compile cache kept by the current worker of an `EmulatorPool`
+    between calls, `None` outside of the workers or if disabled."""
+    return _worker_cache
+
+
+def worker_num_threads() -> Optional[int]:
+    """The number of threads the `ParallelPlan` of the `EmulatorPool` gives
+    to the task running in the current worker, `None` outside of the workers
+    or without a plan."""
+    return _worker_threads
+
+
+def _limit_threads(num_threads: int) -> None:
+    """Limit the threads of numba and, if `threadpoolctl` is installed, of
+    the BLAS libraries loaded in the process."""
+    global _worker_threads
+
+    _worker_threads = num_threads
+    # the default of the worker, the evolutions set their own threads
+    set_num_threads(numba_thread_count(num_threads))
+
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+
+    threadpool_limits(num_threads)
+
+
+def _warmup() -> None:
+    # compile the kernels of a small emulation with the default solvers
+    from bloqade.atom_arrangement import Chain
+
+    program = (
+        Chain(2, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.constant(1.0, 0.01)
+        .rabi.amplitude.uniform.constant(1.0, 0.01)
+        .bloqade.python()
+    )
+    for solver_name in ("dop853", "jit_dopri5"):
+        program.run(1, solver_name=solver_name)
+
+
+def _initialize_worker(
+    cache_matrices: bool, warmup: bool, num_threads: Optional[int] = None
+) -> None:
+    global _worker_cache
+
+    if num_threads is not None:
+        # the libraries loaded later read the environment
+        for variable in THREAD_VARIABLES:
+            os.environ[variable] = str(num_threads)
+
+        _limit_threads(num_threads)
+
+    _worker_cache = CompileCache() if cache_matrices else None
+    if warmup:
+        _warmup()
+
+
+def _run_chunk(
+    function: Callable,
+    chunk: List[Tuple[Hashable, Tuple]],
+    num_threads: Optional[int] = None,
+) -> List[Tuple[Hashable, Any]]:
+    if num_threads is not None:
+        _limit_threads(num_threads)
+
+    return [(key, function(*args)) for key, args in chunk]
+
+
+class EmulatorPool:
+    """Pool of worker processes running emulation tasks, reusable between
+    calls of `run`, `rerun` and `run_callback`.
+
+    The workers are started when the pool is created and compile the
+    kernels of the emulator while idle, they keep a compile cache between
+    calls for the tasks without one. The tasks are submitted in chunks and
+    their results are collected in the order of completion.
+
+    Args:
+        num_workers (Optional[int]): number of worker processes. Defaults to
+            the number of processors.
+        chunksize (Optional[int]): number of tasks per submission, the
+            maximum number when the costs of the tasks are given. Defaults
+            to a quarter of the tasks per worker.
+        cache_matrices (bool): keep a compile cache in each worker. The
+            cache grows with the distinct registers and operators emulated,
+            shut down the pool to release it. Defaults to True.
+        warmup (bool): compile the kernels of the emulator in the workers
+            when the pool starts. Defaults to True.
+        mp_context (Optional[str]): start method of the workers, see
+            `multiprocessing.get_context`. Defaults to the platform default.
+        plan (Optional[ParallelPlan]): threads of the workers, see
+            `ParallelPlan`. The threads of numba and of the BLAS libraries
+            are limited to the threads of the plan, the chunks are submitted
+            as the workers become free, the last ones with more threads.
+            The number of threads of the plan replaces the `num_threads`
+            given to `run` and `run_callback`. Defaults to None.
+
+    Examples:
+
+    ```python
+    >>> with EmulatorPool(num_workers=4) as pool:
+    ...     for detuning in detunings:
+    ...         batch = program.bloqade.python().run(100, detuning, pool=pool)
+    ```
+    """
+
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        chunksize: Optional[int] = None,
+        cache_matrices: bool = True,
+        warmup: bool = True,
+        mp_context: Optional[str] = None,
+        plan: Optional[ParallelPlan] = None,
+    ):
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+
+        if num_workers < 1:
+            raise ValueError(f"num_workers must be positive, got {num_workers}.")
+
+        if chunksize is not None and chunksize < 1:
+            raise ValueError(f"chunksize must be positive, got {chunksize}.")
+
+        self.num_workers = num_workers
+        self.chunksize = chunksize
+        self.plan = plan
+        num_threads = None if plan is None else plan.num_threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context(mp_context),
+            initializer=_initialize_worker,
+            initargs=(cache_matrices, warmup, num_threads),
+        )
+        # start all the workers now so that they warm up before the first call
+        for _ in range(num_workers):
+            self._executor.submit(int)
+
+    def imap_unordered(
+        self,
+        function: Callable,
+        items: List[Tuple[Hashable, Tuple]],
+        chunksize: Optional[int] = None,
+        costs: Optional[Sequence[float]] = None,
+    ) -> Iterator[Tuple[Hashable, Any]]:
+        """Call `function(*args)` in the workers for each `(key, args)` of
+        `items` and yield the `(key, result)` in the order of completion.
+
+        If the `costs` of the items are given, the costly items are submitted
+        first and the cheap ones are packed together, see `schedule`. The
+        `function` and its arguments must be picklable. The pending calls are
+        cancelled if a call raises.
+        """
+        if chunksize is None:
+            chunksize = self.chunksize
+
+        if costs is not None:
+            chunks = [
+                [items[index] for index in chunk]
+                for chunk in schedule(costs, self.num_workers, chunksize)
+            ]
+        else:
+            if chunksize is None:
+                chunksize = max(1, -(-len(items) // (4 * self.num_workers)))
+
+            starts = range(0, len(items), chunksize)
+            chunks = [items[start : start + chunksize] for start in starts]
+
+        if self.plan is not None:
+            yield from self._imap_planned(function, chunks)
+            return
+
+        futures = [
+            self._executor.submit(_run_chunk, function, chunk) for chunk in chunks
+        ]
+        try:
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _imap_planned(
+        self, function: Callable, chunks: List[List[Tuple[Hashable, Tuple]]]
+    ) -> Iterator[Tuple[Hashable, Any]]:
+        # a chunk per free worker, its threads depend on the chunks left
+        chunks = chunks[::-1]
+        running = set()
+        try:
+            while chunks or running:
+                while chunks and len(running) < self.num_workers:
+                    num_running = min(len(chunks) + len(running), self.num_workers)
+                    num_threads = self.plan.threads(num_running)
+                    running.add(
+                        self._executor.submit(
+                            _run_chunk, function, chunks.pop(), num_threads
+                        )
+                    )
+
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        finally:
+            for future in running:
+                future.cancel()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the workers of the pool."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def __enter__(self) -> "EmulatorPool":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.shutdown()
@@ -0,0 +1,188 @@
+from bloqade.emulate.ir.emulator import EmulatorProgram, Register
+from bloqade.emulate.ir.space import Space
+from beartype.typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+from dataclasses import dataclass
+import numpy as np
+import os
+
+if TYPE_CHECKING:
+    from bloqade.emulate.pool import EmulatorPool
+
+# spaces smaller than this are emulated with a single thread
+MIN_THREADED_SIZE = 2**14
+# speedup of each additional thread of the sparse kernels
+THREAD_EFFICIENCY = 0.75
+
+
+def task_cost(
+    program: EmulatorProgram, space_sizes: Optional[Dict[Register, float]] = None
+) -> float:
+    """Relative cost of the emulation of `program`.
+
+    The cost is the size of the space of the register, times the duration of
+    the program, times the number of non-zero elements per row of the
+    Hamiltonian: one for the interactions and one per detuning term, plus the
+    number of target atoms of each rabi term. The size of the space is
+    estimated from the blockade graph of the register, see
+    `Space.estimate_size`, `space_sizes` memoizes the sizes of the registers.
+    """
+    if space_sizes is None:
+        space_sizes = {}
+
+    register = program.register
+    if register not in space_sizes:
+        space_sizes[register] = Space.estimate_size(register)
+
+    n_elements = 1
+    for fields in program.pulses.values():
+        n_elements += len(fields.detuning)
+        n_elements += sum(len(term.operator_data.target_atoms) for term in fields.rabi)
+
+    return float(space_sizes[register]) * program.duration * n_elements
+
+
+def task_costs(
+    programs: Sequence[EmulatorProgram],
+    space_sizes: Optional[Dict[Register, float]] = None,
+) -> List[float]:
+    """The `task_cost` of each program, the sizes of the spaces of the
+    registers shared by the programs are estimated once."""
+    if space_sizes is None:
+        space_sizes = {}
+
+    return [task_cost(program, space_sizes) for program in programs]
+
+
+def schedule(
+    costs: Sequence[float], num_workers: int, chunksize: Optional[int] = None
+) -> List[List[int]]:
+    """Group the indices of the tasks with the given `costs` into chunks
+    submitted to `num_workers` workers, to minimize the time to run all
+    the tasks.
+
+    The tasks are ordered by decreasing cost, so that the longest ones start
+    first and the shortest ones fill the idle workers at the end. Tasks are
+    packed together until the cost of their chunk reaches a quarter of the
+    average cost per worker, the costly tasks having a chunk of their own.
+
+    Args:
+        costs (Sequence[float]): cost of each task, see `task_cost`.
+        num_workers (int): number of workers running the chunks.
+        chunksize (Optional[int]): maximum number of tasks per chunk.
+            Defaults to no limit.
+
+    Returns:
+        List[List[int]]: the indices of the tasks of each chunk, in the
+            order of submission.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    target = costs.sum() / (4 * num_workers)
+
+    chunks = []
+    chunk = []
+    chunk_cost = 0.0
+    # stable, the tasks of equal costs keep their order
+    for index in np.argsort(-costs, kind="stable").tolist():
+        chunk.append(index)
+        chunk_cost += costs[index]
+        if chunk_cost >= target or len(chunk) == chunksize:
+            chunks.append(chunk)
+            chunk = []
+            chunk_cost = 0.0
+
+    if chunk:
+        chunks.append(chunk)
+
+    return chunks
+
+
+def _speedup(num_threads: int, sizes: np.ndarray) -> np.ndarray:
+    """Estimated speedup of the emulations of spaces of the given `sizes`
+    with `num_threads` threads."""
+    speedup = 1 + (num_threads - 1) * THREAD_EFFICIENCY
+    return np.where(sizes >= MIN_THREADED_SIZE, speedup, 1.0)
+
+
+@dataclass(frozen=True)
+class ParallelPlan:
+    """Processes and threads used to run a batch of emulations, see
+    `plan_parallelism`.
+
+    Attributes:
+        num_workers (int): number of worker processes.
+        num_threads (int): number of threads of each worker.
+        max_threads (int): maximum number of threads of a task, given to the
+            last tasks of the batch once fewer tasks than workers are left.
+        num_cores (int): number of cores planned for.
+        makespan (float): estimated time to run the batch, in units of
+            `task_cost`.
+    """
+
+    num_workers: int
+    num_threads: int
+    max_threads: int
+    num_cores: int
+    makespan: float
+
+    def threads(self, num_running: int) -> int:
+        """Number of threads of a task started while `num_running` tasks,
+        including itself, are running."""
+        num_threads = self.num_cores // max(num_running, 1)
+        return max(self.num_threads, min(num_threads, self.max_threads))
+
+    def pool(self, **options) -> "EmulatorPool":
+        """An `EmulatorPool` following the plan, see `EmulatorPool` for the
+        `options`."""
+        from bloqade.emulate.pool import EmulatorPool
+
+        return EmulatorPool(num_workers=self.num_workers, plan=self, **options)
+
+
+def plan_parallelism(
+    costs: Sequence[float],
+    sizes: Sequence[float],
+    num_cores: Optional[int] = None,
+) -> ParallelPlan:
+    """Split `num_cores` cores into processes and threads per process to run
+    tasks with the given costs and sizes of their spaces.
+
+    The makespan of each split is estimated from the cost of the tasks sped
+    up by the threads, see `THREAD_EFFICIENCY`, and the split with the
+    smallest one is chosen, the one with the most processes on ties. Many
+    small tasks are run by as many processes, a few large tasks by threads.
+
+    Args:
+        costs (Sequence[float]): cost of each task, see `task_cost`.
+        sizes (Sequence[float]): estimated size of the space of each task.
+        num_cores (Optional[int]): number of cores to use. Defaults to the
+            number of processors.
+
+    Returns:
+        ParallelPlan: the chosen plan.
+    """
+    if num_cores is None:
+        num_cores = os.cpu_count() or 1
+
+    if num_cores < 1:
+        raise ValueError(f"num_cores must be positive, got {num_cores}.")
+
+    costs = np.asarray(costs, dtype=np.float64)
+    sizes = np.asarray(sizes, dtype=np.float64)
+
+    max_threads = num_cores if np.any(sizes >= MIN_THREADED_SIZE) else 1
+    best = ParallelPlan(1, 1, 1, num_cores, float(costs.sum()))
+    for num_workers in range(1, max(min(costs.size, num_cores), 1) + 1):
+        num_threads = num_cores // num_workers
+        times = costs / _speedup(num_threads, sizes)
+        makespan = float(max(times.sum() / num_workers, times.max(initial=0.0)))
+
+        if makespan <= best.makespan:
+            best = ParallelPlan(
+                num_workers,
+                min(num_threads, max_threads),
+                max_threads,
+                num_cores,
+                makespan,
+            )
+
+    return best
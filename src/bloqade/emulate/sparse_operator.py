@@ -1,36 +1,89 @@
+from contextlib import contextmanager
 from dataclasses import dataclass
 from functools import cached_property
 from scipy.sparse import csr_matrix, csc_matrix, coo_matrix
 import numpy as np
 from numpy.typing import NDArray
-from beartype.typing import Union
-from numba import njit
+from beartype.typing import Iterator, List, Optional, Union
+from numba import config, get_num_threads, njit, prange, set_num_threads
+from numba.extending import overload
 
 # from beartype.vale import IsAttr, IsEqual
 # from beartype import beartype
 # from typing import Annotated
 
 
-@njit(cache=True)
+def _as_columns(array):
+    """View of `array` as an (N, K) array, a vector is a single column."""
+    return array if array.ndim == 2 else array[:, None]
+
+
+@overload(_as_columns)
+def _as_columns_overload(array):
+    if array.ndim == 2:
+        return lambda array: array
+
+    if array.layout == "C":
+        return lambda array: array.reshape((array.size, 1))
+
+    return lambda array: np.expand_dims(array, 1)
+
+
+# the kernels below accept vectors as well as (N, K) arrays, the thread-parallel
+# versions are compiled from the same code with `prange` over the rows. Rows
+# are independent so the output can be written without synchronization.
+@njit(cache=True, error_model="numpy")
 def _csc_matvec_impl(ncol, data, indices, indptr, scale, input, output):
+    x = _as_columns(input)
+    y = _as_columns(output)
     for i in range(ncol):
-        for j in range(indptr[i], indptr[i + 1]):
-            output[indices[j]] += scale * data[j] * input[i]
+        for k in range(y.shape[1]):
+            value = scale * x[i, k]
+            for j in range(indptr[i], indptr[i + 1]):
+                y[indices[j], k] += data[j] * value
 
     return output
 
 
-@njit(cache=True)
-def _csr_matvec_impl(nrow, data, indices, indptr, scale, input, output):
-    zero = type(output[0])(0)
-    for i in range(nrow):
-        row_out = zero
-        for j in range(indptr[i], indptr[i + 1]):
-            row_out += data[j] * input[indices[j]]
+def _csr_kernel(parallel: bool):
+    loop = prange if parallel else range
 
-        output[i] += scale * row_out
+    @njit(cache=True, parallel=parallel, error_model="numpy")
+    def _csr_impl(nrow, data, indices, indptr, scale, input, output):
+        x = _as_columns(input)
+        y = _as_columns(output)
+        for i in loop(nrow):
+            for k in range(y.shape[1]):
+                row_out = 0 * y[i, k]
+                for j in range(indptr[i], indptr[i + 1]):
+                    row_out += data[j] * x[indices[j], k]
 
-    return output
+                y[i, k] += scale * row_out
+
+        return output
+
+    return _csr_impl
+
+
+_csr_matvec_impl = _csr_kernel(parallel=False)
+_csr_matvec_parallel_impl = _csr_kernel(parallel=True)
+
+
+def numba_thread_count(num_threads: int) -> int:
+    """`num_threads` bounded by the size of the thread pool of numba."""
+    return max(1, min(num_threads, config.NUMBA_NUM_THREADS))
+
+
+@contextmanager
+def numba_threads(num_threads: int) -> Iterator[None]:
+    """Run the parallel kernels with `num_threads` threads within the
+    context, the previous number of threads is restored on exit."""
+    previous = get_num_threads()
+    set_num_threads(numba_thread_count(num_threads))
+    try:
+        yield
+    finally:
+        set_num_threads(previous)
 
 
 @dataclass(frozen=True)
@@ -55,10 +108,21 @@ class SparseMatrixCSC:
     def T(self):
         return SparseMatrixCSR(self.data, self.indices, self.indptr, self.shape[::-1])
 
-    def matvec(self, other, out=None, scale=1):
+    @cached_property
+    def _csr(self) -> "SparseMatrixCSR":
+        # the scatter of the CSC kernel can not be parallelized without
+        # conflicts, the parallel kernels use the CSR format instead.
+        return SparseMatrixCSR.create(self.tocsr())
+
+    def matvec(self, other, out=None, scale=1, num_threads: int = 1):
         if out is None:
             out = np.zeros_like(other, dtype=np.result_type(scale, self.data, other))
 
+        if num_threads > 1:
+            return self._csr.matvec(
+                other, out=out, scale=scale, num_threads=num_threads
+            )
+
         return _csc_matvec_impl(
             self.shape[1], self.data, self.indices, self.indptr, scale, other, out
         )
@@ -86,45 +150,296 @@ class SparseMatrixCSR:
     def T(self):
         return SparseMatrixCSC(self.data, self.indices, self.indptr, self.shape[::-1])
 
-    def matvec(self, other, out=None, scale=1):
+    def matvec(self, other, out=None, scale=1, num_threads: int = 1):
         if out is None:
             out = np.zeros_like(other, dtype=np.result_type(scale, self.data, other))
 
-        return _csr_matvec_impl(
+        impl = _csr_matvec_parallel_impl if num_threads > 1 else _csr_matvec_impl
+        return impl(
             self.shape[0], self.data, self.indices, self.indptr, scale, other, out
         )
 
 
-@njit(cache=True)
+@njit(cache=True, error_model="numpy")
 def _index_mapping_row_col_sliced(scale, input, output):
-    for i in range(output.size):
-        output[i] += scale * input[i]
+    x = _as_columns(input)
+    y = _as_columns(output)
+    for i in range(y.shape[0]):
+        for k in range(y.shape[1]):
+            y[i, k] += scale * x[i, k]
 
     return output
 
 
-@njit(cache=True)
+@njit(cache=True, error_model="numpy")
 def _index_mapping_row_sliced(col_indices, scale, input, output):
+    x = _as_columns(input)
+    y = _as_columns(output)
     for i in range(col_indices.size):
-        output[i] += scale * input[col_indices[i]]
+        col = col_indices[i]
+        for k in range(y.shape[1]):
+            y[i, k] += scale * x[col, k]
 
     return output
 
 
-@njit(cache=True)
+@njit(cache=True, error_model="numpy")
 def _index_mapping_col_sliced(row_indices, scale, input, output):
+    x = _as_columns(input)
+    y = _as_columns(output)
     for i in range(row_indices.size):
-        output[row_indices[i]] += scale * input[i]
+        row = row_indices[i]
+        for k in range(y.shape[1]):
+            y[row, k] += scale * x[i, k]
 
     return output
 
 
-@njit(cache=True)
-def _index_mapping_impl(col_indices, row_indices, scale, input, output):
-    for i in range(row_indices.size):
-        output[row_indices[i]] += scale * input[col_indices[i]]
+def _index_mapping_kernel(parallel: bool):
+    loop = prange if parallel else range
+
+    @njit(cache=True, parallel=parallel, error_model="numpy")
+    def _index_mapping_impl(col_indices, row_indices, scale, input, output):
+        # the row indices have to be unique for the parallel writes to be
+        # conflict-free
+        x = _as_columns(input)
+        y = _as_columns(output)
+        for i in loop(row_indices.size):
+            row = row_indices[i]
+            col = col_indices[i]
+            for k in range(y.shape[1]):
+                y[row, k] += scale * x[col, k]
+
+        return output
+
+    return _index_mapping_impl
 
-    return output
+
+_index_mapping_impl = _index_mapping_kernel(parallel=False)
+_index_mapping_parallel_impl = _index_mapping_kernel(parallel=True)
+
+
+def _bit_flip_kernel(parallel: bool):
+    loop = prange if parallel else range
+
+    @njit(cache=True, parallel=parallel, error_model="numpy")
+    def _bit_flip_impl(masks, targets, values, scale, input, output):
+        x = _as_columns(input)
+        y = _as_columns(output)
+        for i in loop(y.shape[0]):
+            for k in range(y.shape[1]):
+                row_out = 0 * y[i, k]
+                for j in range(masks.size):
+                    if targets[j] < 0 or (i & masks[j]) == targets[j]:
+                        row_out += values[j] * x[i ^ masks[j], k]
+
+                y[i, k] += scale * row_out
+
+        return output
+
+    return _bit_flip_impl
+
+
+_bit_flip_impl = _bit_flip_kernel(parallel=False)
+_bit_flip_parallel_impl = _bit_flip_kernel(parallel=True)
+
+
+def _fused_kernel(parallel: bool):
+    loop = prange if parallel else range
+
+    @njit(cache=True, parallel=parallel, error_model="numpy")
+    def _fused_impl(
+        rydberg_scale,
+        rydberg,
+        diag_coeffs,
+        diagonals,
+        term_coeffs,
+        terms,
+        data,
+        indices,
+        indptr,
+        flip_terms,
+        flip_masks,
+        flip_targets,
+        flip_values,
+        scale,
+        input,
+        output,
+    ):
+        x = _as_columns(input)
+        y = _as_columns(output)
+        for i in loop(y.shape[0]):
+            diagonal = rydberg_scale * rydberg[i]
+            for j in range(diag_coeffs.size):
+                diagonal += diag_coeffs[j] * diagonals[j, i]
+
+            for k in range(y.shape[1]):
+                row_out = diagonal * x[i, k]
+
+                # elements of a row are grouped by term so that the
+                # coefficient of each term is only applied once per row.
+                start = indptr[i]
+                end = indptr[i + 1]
+                while start < end:
+                    term = terms[start]
+                    term_out = data[start] * x[indices[start], k]
+                    start += 1
+                    while start < end and terms[start] == term:
+                        term_out += data[start] * x[indices[start], k]
+                        start += 1
+
+                    row_out += term_coeffs[term] * term_out
+
+                # terms flipping a bit of the row index, grouped by term as well
+                j = 0
+                while j < flip_terms.size:
+                    term = flip_terms[j]
+                    term_out = 0 * x[i, k]
+                    while j < flip_terms.size and flip_terms[j] == term:
+                        mask = flip_masks[j]
+                        if flip_targets[j] < 0 or (i & mask) == flip_targets[j]:
+                            term_out += flip_values[j] * x[i ^ mask, k]
+                        j += 1
+
+                    row_out += term_coeffs[term] * term_out
+
+                y[i, k] = scale * row_out
+
+        return output
+
+    return _fused_impl
+
+
+_fused_matvec_impl = _fused_kernel(parallel=False)
+_fused_matvec_parallel_impl = _fused_kernel(parallel=True)
+
+
+@dataclass(frozen=True)
+class FusedOperator:
+    """Diagonal plus a sum of off-diagonal terms stored in a single CSR
+    structure, each non-zero element is tagged with the index of the term
+    it belongs to so that all terms can be applied in one pass.
+
+    The operator applied is:
+
+        rydberg_scale * diag(rydberg) + sum_k diag_coeffs[k] * diag(diagonals[k])
+            + sum_j term_coeffs[terms[j]] * data[j] |row(j)><indices[j]|
+            + sum_k term_coeffs[flip_terms[k]] * flip_values[k] * F_k
+
+    where `F_k` flips the bits `flip_masks[k]` of the index of the state,
+    see `BitFlipOperator`, its rows are restricted to `i & flip_masks[k] ==
+    flip_targets[k]` unless `flip_targets[k]` is negative.
+
+    """
+
+    rydberg: NDArray
+    diagonals: NDArray
+    data: NDArray
+    indices: NDArray
+    indptr: NDArray
+    terms: NDArray
+    flip_terms: NDArray
+    flip_masks: NDArray
+    flip_targets: NDArray
+    flip_values: NDArray
+    n_terms: int
+
+    @staticmethod
+    def create(
+        rydberg: NDArray,
+        diagonals: List[NDArray],
+        terms: List[Union[coo_matrix, "BitFlipOperator"]],
+        dtype: np.dtype = np.float64,
+    ) -> "FusedOperator":
+        size = rydberg.size
+        index_type = np.int32 if size < np.iinfo(np.int32).max else np.int64
+
+        if len(diagonals) > 0:
+            diagonals = np.ascontiguousarray(np.stack(diagonals), dtype=dtype)
+        else:
+            diagonals = np.zeros((0, size), dtype=dtype)
+
+        term_type = np.min_scalar_type(max(len(terms) - 1, 0))
+        flips = [(k, t) for k, t in enumerate(terms) if isinstance(t, BitFlipOperator)]
+        terms = [(k, t) for k, t in enumerate(terms) if isinstance(t, coo_matrix)]
+
+        rows = np.concatenate(
+            [np.zeros(0, dtype=index_type)] + [t.row for _, t in terms]
+        )
+        cols = np.concatenate(
+            [np.zeros(0, dtype=index_type)] + [t.col for _, t in terms]
+        )
+        data = np.concatenate([np.zeros(0)] + [t.data for _, t in terms])
+        term_indices = np.concatenate(
+            [np.zeros(0, dtype=term_type)]
+            + [np.full(t.nnz, k, dtype=term_type) for k, t in terms]
+        )
+
+        order = np.lexsort((term_indices, rows))
+        indptr = np.zeros(size + 1, dtype=index_type)
+        np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+
+        return FusedOperator(
+            rydberg=np.asarray(rydberg, dtype=dtype),
+            diagonals=diagonals,
+            data=np.ascontiguousarray(data[order], dtype=dtype),
+            indices=np.ascontiguousarray(cols[order], dtype=index_type),
+            indptr=indptr,
+            terms=term_indices[order],
+            flip_terms=np.concatenate(
+                [np.zeros(0, dtype=term_type)]
+                + [np.full(t.masks.size, k, dtype=term_type) for k, t in flips]
+            ),
+            flip_masks=np.concatenate(
+                [np.zeros(0, dtype=np.int64)] + [t.masks for _, t in flips]
+            ),
+            flip_targets=np.concatenate(
+                [np.zeros(0, dtype=np.int64)] + [t.targets for _, t in flips]
+            ),
+            flip_values=np.concatenate(
+                [np.zeros(0, dtype=dtype)] + [t.values for _, t in flips]
+            ).astype(dtype),
+            n_terms=len(terms) + len(flips),
+        )
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return (self.rydberg.size, self.rydberg.size)
+
+    def matvec(
+        self,
+        diag_coeffs: NDArray,
+        term_coeffs: NDArray,
+        other: NDArray,
+        out: Optional[NDArray] = None,
+        scale=1,
+        rydberg_scale: float = 1.0,
+        num_threads: int = 1,
+    ):
+        if out is None:
+            out = np.zeros_like(
+                other, dtype=np.result_type(scale, term_coeffs, other, np.float64)
+            )
+
+        impl = _fused_matvec_parallel_impl if num_threads > 1 else _fused_matvec_impl
+        return impl(
+            rydberg_scale,
+            self.rydberg,
+            diag_coeffs,
+            self.diagonals,
+            term_coeffs,
+            self.terms,
+            self.data,
+            self.indices,
+            self.indptr,
+            self.flip_terms,
+            self.flip_masks,
+            self.flip_targets,
+            self.flip_values,
+            scale,
+            other,
+            out,
+        )
 
 
 # use csr_matrix/csc_matrix for rabi-terms that span multiple sites.
@@ -171,15 +486,25 @@ class IndexMapping:
 
         return _matvec_imp
 
-    def matvec(self, other, out=None, scale=1):
+    @cached_property
+    def _unique_rows(self) -> bool:
+        rows, _ = self._coo_indices
+        return np.unique(rows).size == rows.size
+
+    def matvec(self, other, out=None, scale=1, num_threads: int = 1):
         if out is None:
             out = np.zeros_like(other, dtype=np.result_type(scale, other))
 
+        if num_threads > 1 and self._unique_rows:
+            rows, cols = self._coo_indices
+            return _index_mapping_parallel_impl(cols, rows, scale, other, out)
+
         return self._matvec_dispatcher(
             self.col_indices, self.row_indices, scale, other, out
         )
 
-    def tocoo(self) -> coo_matrix:
+    @cached_property
+    def _coo_indices(self):
         if isinstance(self.row_indices, slice):
             row_slice = self.row_indices
             start = row_slice.start if row_slice.start is not None else 0
@@ -207,6 +532,10 @@ class IndexMapping:
         else:
             cols = self.col_indices
 
+        return rows, cols
+
+    def tocoo(self) -> coo_matrix:
+        rows, cols = self._coo_indices
         data = np.ones(rows.size)
 
         return coo_matrix((data, (rows, cols)), shape=(self.n_row, self.n_row))
@@ -216,3 +545,80 @@ class IndexMapping:
 
     def tocsr(self):
         return self.tocoo().tocsr()
+
+
+@dataclass(frozen=True)
+class BitFlipOperator:
+    """Matrix-free sum of bit flips of the index of the basis states, e.g. a
+    sum of `X` operators of two level atoms in the full space. Element `k`
+    of the sum maps the state `j` to `j ^ masks[k]` with weight `values[k]`.
+    Only the rows `i` with `i & masks[k] == targets[k]` are kept unless
+    `targets[k]` is negative, e.g. `targets[k] == masks[k]` for a raising
+    operator. The indices are computed on the fly instead of being stored.
+    """
+
+    n_row: int
+    masks: NDArray
+    targets: NDArray
+    values: NDArray
+
+    @staticmethod
+    def create(
+        n_row: int, sites: List[int], values: List[float], state: Optional[int] = None
+    ) -> "BitFlipOperator":
+        """Sum of the flips of the bits `sites` weighted by `values`, only
+        flipping the bits to `state` if set."""
+        masks = np.left_shift(1, np.asarray(sites, dtype=np.int64))
+        if state is None:
+            targets = np.full(masks.size, -1, dtype=np.int64)
+        else:
+            targets = masks * state
+
+        return BitFlipOperator(
+            n_row, masks, targets, np.asarray(values, dtype=np.float64)
+        )
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return (self.n_row, self.n_row)
+
+    @property
+    def T(self) -> "BitFlipOperator":
+        # the transposed flip is restricted to the rows of the other state
+        targets = np.where(self.targets < 0, self.targets, self.masks ^ self.targets)
+        return BitFlipOperator(self.n_row, self.masks, targets, self.values)
+
+    def matvec(self, other, out=None, scale=1, num_threads: int = 1):
+        if out is None:
+            out = np.zeros_like(other, dtype=np.result_type(scale, self.values, other))
+
+        impl = _bit_flip_parallel_impl if num_threads > 1 else _bit_flip_impl
+        return impl(self.masks, self.targets, self.values, scale, other, out)
+
+    def tocoo(self) -> coo_matrix:
+        index = np.arange(self.n_row)
+        rows = []
+        cols = []
+        data = []
+        for mask, target, value in zip(self.masks, self.targets, self.values):
+            row = index if target < 0 else index[(index & mask) == target]
+            rows.append(row)
+            cols.append(row ^ mask)
+            data.append(np.full(row.size, value))
+
+        return coo_matrix(
+            (
+                np.concatenate([np.zeros(0)] + data),
+                (
+                    np.concatenate([np.zeros(0, dtype=int)] + rows),
+                    np.concatenate([np.zeros(0, dtype=int)] + cols),
+                ),
+            ),
+            shape=self.shape,
+        )
+
+    def tocsc(self):
+        return self.tocoo().tocsc()
+
+    def tocsr(self):
+        return self.tocoo().tocsr()
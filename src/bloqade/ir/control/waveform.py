@@ -25,6 +25,7 @@ from beartype import beartype
 from enum import Enum
 
 import numpy as np
+from numpy.typing import NDArray
 import inspect
 import scipy.integrate as integrate
 from bloqade.visualization import get_ir_figure
@@ -89,6 +90,26 @@ class Waveform(HashTrait, CanonicalizeTrait):
     def eval_decimal(self, clock_s: Decimal, **kwargs) -> Decimal:
         raise NotImplementedError
 
+    def sample_array(self, times: NDArray, **assignments) -> NDArray:
+        """Evaluate the waveform at every time of `times`.
+
+        The waveform is lowered once into vectorized numpy operations, which
+        is much faster than calling the waveform at each time.
+
+        Args:
+            times (NDArray): times (in us) at which to evaluate the waveform.
+            **assignments: values of the variables of the waveform.
+
+        Returns:
+            NDArray: float64 array of values of the waveform at `times`.
+        """
+        from bloqade.compiler.codegen.python.waveform_interpreter import (
+            WaveformArrayInterpreter,
+        )
+
+        times = np.asarray(times, dtype=np.float64)
+        return WaveformArrayInterpreter(assignments).emit(self)(times)
+
     def add(self, other: "Waveform") -> "Waveform":
         return self.canonicalize(Add(self, other))
 
@@ -110,7 +131,7 @@ class Waveform(HashTrait, CanonicalizeTrait):
 
         duration = float(self.duration(**assignments))
         times = np.linspace(0, duration, npoints + 1)
-        values = [self.__call__(time, **assignments) for time in times]
+        values = self.sample_array(times, **assignments)
         return times, values
 
     def show(self, **assignments):
@@ -849,23 +870,39 @@ class Sample(Waveform):
     def duration(self):
         return self.waveform.duration
 
-    def samples(self, **kwargs) -> Tuple[List[Decimal], List[Decimal]]:
+    def clocks(self, **kwargs) -> List[Decimal]:
+        """Times of the samples, every `dt` and at the end of the waveform."""
         duration = self.duration(**kwargs)
         dt = self.dt(**kwargs)
 
         clock = Decimal("0.0")
         clocks = []
-        values = []
         while clock <= duration - dt:
-            values.append(self.waveform.eval_decimal(clock, **kwargs))
             clocks.append(clock)
             clock += dt
 
-        values.append(self.waveform.eval_decimal(duration, **kwargs))
         clocks.append(duration)
 
+        return clocks
+
+    def samples(self, **kwargs) -> Tuple[List[Decimal], List[Decimal]]:
+        clocks = self.clocks(**kwargs)
+        values = [self.waveform.eval_decimal(clock, **kwargs) for clock in clocks]
+
         return clocks, values
 
+    def sample_values(self, **kwargs) -> Tuple[List[Decimal], NDArray]:
+        """Times of the samples and the float values of the waveform at these
+        times, evaluated at once with `sample_array`.
+
+        The values are only as exact as floats, `samples` gives the exact
+        values sent to the hardware.
+        """
+        clocks = self.clocks(**kwargs)
+        times = np.array(list(map(float, clocks)))
+
+        return clocks, self.waveform.sample_array(times, **kwargs)
+
     def eval_decimal(self, clock_s: Decimal, **kwargs) -> Decimal:
         times, values = self.samples(**kwargs)
 
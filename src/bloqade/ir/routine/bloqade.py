@@ -15,13 +15,23 @@ from beartype.typing import (
     NamedTuple,
     Iterator,
     Sequence,
+    Union,
 )
 from pydantic.v1.dataclasses import dataclass
 import dataclasses
+import functools
 import numpy as np
 
 from bloqade.emulate.codegen.hamiltonian import CompileCache, RydbergHamiltonianCodeGen
+from bloqade.emulate.codegen.cache import SharedCompileCache
+from bloqade.emulate.pool import (
+    EmulatorPool,
+    worker_compile_cache,
+    worker_num_threads,
+)
+from bloqade.emulate.schedule import ParallelPlan, plan_parallelism, task_costs
 from bloqade.emulate.ir.state_vector import AnalogGate, RydbergHamiltonian, StateVector
+from bloqade.emulate.ir.observables import Observable
 import traceback
 
 
@@ -31,6 +41,38 @@ class BloqadeServiceOptions(RoutineBase):
         return BloqadePythonRoutine(self.source, self.circuit, self.params)
 
 
+def _compile_cache(
+    cache_matrices: Union[bool, CompileCache], multiprocessing: bool = False
+) -> Optional[CompileCache]:
+    if isinstance(cache_matrices, CompileCache):
+        return cache_matrices
+    elif cache_matrices and multiprocessing:
+        return SharedCompileCache()
+    elif cache_matrices:
+        return CompileCache()
+    else:
+        return None
+
+
+def _run_callback_task(runner, emulator_ir, metadata):
+    """Run a task of `run_callback`, returning the exception it raises if any."""
+    try:
+        return runner.run_task(emulator_ir, metadata)
+    except BaseException as e:
+        return e
+
+
+def _run_pool_callback_task(runner, emulator_ir, metadata):
+    # the workers of an `EmulatorPool` keep their compile cache between calls
+    if runner.compile_cache is None:
+        runner.compile_cache = worker_compile_cache()
+
+    if worker_num_threads() is not None:
+        runner.num_threads = worker_num_threads()
+
+    return _run_callback_task(runner, emulator_ir, metadata)
+
+
 def cast_to_float(x):
     if isinstance(x, abc.Sequence):
         return [float(i) for i in x]
@@ -58,6 +100,7 @@ class BloqadeEmulation:
 
     task_data: TaskData
     compile_cache: Optional[CompileCache] = None
+    interaction_cutoff: Optional[float] = None
     _hamiltonian: Optional[RydbergHamiltonian] = dataclasses.field(
         init=False, default=None
     )
@@ -66,9 +109,9 @@ class BloqadeEmulation:
     def hamiltonian(self) -> RydbergHamiltonian:
         """Return the Hamiltonian object for the given task data."""
         if self._hamiltonian is None:
-            _hamiltonian = RydbergHamiltonianCodeGen(self.compile_cache).emit(
-                self.task_data.emulator_ir
-            )
+            _hamiltonian = RydbergHamiltonianCodeGen(
+                self.compile_cache, self.interaction_cutoff
+            ).emit(self.task_data.emulator_ir)
             object.__setattr__(self, "_hamiltonian", _hamiltonian)
         return self._hamiltonian
 
@@ -99,14 +142,17 @@ class BloqadeEmulation:
         nsteps: int = 2147483647,
         times: Sequence[float] = (),
         interaction_picture: bool = False,
+        num_threads: int = 1,
+        single_precision: bool = False,
     ) -> Iterator[StateVector]:
         """Evolve an initial state vector using the Hamiltonian
 
         Args:
             state (Optional[StateVector], optional): The initial state vector to
             evolve. if not provided, the zero state will be used. Defaults to None.
-            solver_name (str, optional): Which SciPy Solver to use. Defaults to
-            "dop853".
+            solver_name (str, optional): Which SciPy Solver to use, "krylov"
+            for the adaptive Krylov propagator or "jit_dopri5" for the numba
+            compiled Dormand-Prince integrator. Defaults to "dop853".
             atol (float, optional): Absolute tolerance for ODE solver. Defaults
             to 1e-14.
             rtol (float, optional): Relative tolerance for adaptive step in
@@ -118,14 +164,22 @@ class BloqadeEmulation:
             the end of the bloqade program.
             interaction_picture (bool, optional): Use the interaction picture when
             solving schrodinger equation. Defaults to False.
+            num_threads (int, optional): Number of threads used by the sparse
+            kernels of a single task. Defaults to 1.
+            single_precision (bool, optional): Evolve a complex64 state with the
+            Hamiltonian stored in single precision, requires the "jit_dopri5"
+            solver. Defaults to False.
 
         Returns:
             Iterator[StateVector]: An iterator of the state vectors at each time step.
 
         """
-        state = self.zero_state(np.complex128) if state is None else state
-
-        U = AnalogGate(self.hamiltonian)
+        U = AnalogGate(
+            self.hamiltonian,
+            num_threads=num_threads,
+            single_precision=single_precision,
+        )
+        state = self.zero_state(U.state_type) if state is None else state
 
         return U.apply(
             state,
@@ -137,18 +191,137 @@ class BloqadeEmulation:
             interaction_picture=interaction_picture,
         )
 
+    def observe(
+        self,
+        observables: Sequence[Observable],
+        state: Optional[StateVector] = None,
+        solver_name: str = "dop853",
+        atol: float = 1e-7,
+        rtol: float = 1e-14,
+        nsteps: int = 2147483647,
+        times: Sequence[float] = (),
+        interaction_picture: bool = False,
+        num_threads: int = 1,
+        single_precision: bool = False,
+    ) -> np.ndarray:
+        """Evolve an initial state vector and evaluate observables at each time
+        step, the memory does not grow with the number of time steps as the
+        states are not kept.
+
+        Args:
+            observables (Sequence[Observable]): The observables to evaluate,
+            e.g. `Energy()`, `Density(site)`, `Correlation(site_1, site_2)` or
+            `DiagonalOperator(values)` from `bloqade.emulate.ir.observables`.
+            state (Optional[StateVector], optional): The initial state vector to
+            evolve. if not provided, the zero state will be used. Defaults to None.
+            solver_name (str, optional): Which SciPy Solver to use, "krylov"
+            for the adaptive Krylov propagator or "jit_dopri5" for the numba
+            compiled Dormand-Prince integrator. Defaults to "dop853".
+            atol (float, optional): Absolute tolerance for ODE solver. Defaults
+            to 1e-7.
+            rtol (float, optional): Relative tolerance for adaptive step in
+            ODE solver. Defaults to 1e-14.
+            nsteps (int, optional): Maximum number of steps allowed per integration
+            step. Defaults to 2147483647.
+            times (Sequence[float], optional): The times to evaluate the
+            observables at. Defaults to (). If not provided the observables will
+            be evaluated at the end of the bloqade program.
+            interaction_picture (bool, optional): Use the interaction picture when
+            solving schrodinger equation. Defaults to False.
+            num_threads (int, optional): Number of threads used by the sparse
+            kernels of a single task. Defaults to 1.
+            single_precision (bool, optional): Evolve a complex64 state with the
+            Hamiltonian stored in single precision, requires the "jit_dopri5"
+            solver. Defaults to False.
+
+        Returns:
+            np.ndarray: (n_times, n_observables) array of the observables.
+
+        """
+        U = AnalogGate(
+            self.hamiltonian,
+            num_threads=num_threads,
+            single_precision=single_precision,
+        )
+
+        return U.observe(
+            observables,
+            state,
+            times=times,
+            solver_name=solver_name,
+            atol=atol,
+            rtol=rtol,
+            nsteps=nsteps,
+            interaction_picture=interaction_picture,
+        )
+
+    def evolve_batch(
+        self,
+        states: np.ndarray,
+        solver_name: str = "dop853",
+        atol: float = 1e-7,
+        rtol: float = 1e-14,
+        nsteps: int = 2147483647,
+        times: Sequence[float] = (),
+        interaction_picture: bool = False,
+        num_threads: int = 1,
+        single_precision: bool = False,
+    ) -> Iterator[np.ndarray]:
+        """Evolve a batch of initial state vectors in a single integration
+
+        Args:
+            states (np.ndarray): The initial state vectors stored as the columns
+            of an (N, K) array, N being the size of the Hilbert space.
+            solver_name (str, optional): Which SciPy Solver to use, "krylov"
+            for the adaptive Krylov propagator or "jit_dopri5" for the numba
+            compiled Dormand-Prince integrator. Defaults to "dop853".
+            atol (float, optional): Absolute tolerance for ODE solver. Defaults
+            to 1e-7.
+            rtol (float, optional): Relative tolerance for adaptive step in
+            ODE solver. Defaults to 1e-14.
+            nsteps (int, optional): Maximum number of steps allowed per integration
+            step. Defaults to 2147483647.
+            times (Sequence[float], optional): The times to evaluate the states
+            at. Defaults to (). If not provided the states will be evaluated at
+            the end of the bloqade program.
+            interaction_picture (bool, optional): Use the interaction picture when
+            solving schrodinger equation. Defaults to False.
+            num_threads (int, optional): Number of threads used by the sparse
+            kernels of a single task. Defaults to 1.
+            single_precision (bool, optional): Evolve complex64 states with the
+            Hamiltonian stored in single precision, requires the "jit_dopri5"
+            solver. Defaults to False.
+
+        Returns:
+            Iterator[np.ndarray]: An iterator of (N, K) arrays with the evolved
+            state vectors at each time step.
+
+        """
+        U = AnalogGate(
+            self.hamiltonian,
+            num_threads=num_threads,
+            single_precision=single_precision,
+        )
+
+        return U.apply_batch(
+            states,
+            times=times,
+            solver_name=solver_name,
+            atol=atol,
+            rtol=rtol,
+            nsteps=nsteps,
+            interaction_picture=interaction_picture,
+        )
+
 
 @dataclass(frozen=True, config=__pydantic_dataclass_config__)
 class BloqadePythonRoutine(RoutineBase):
     @staticmethod
     def process_tasks(runner, tasks, results):
-        while not tasks.empty():
-            try:
-                task_id, (emulator_ir, metadata) = tasks.get()
-                result = runner.run_task(emulator_ir, metadata)
-                results.put((task_id, result))
-            except BaseException as e:
-                results.put((task_id, e))
+        # the queue ends with a `None` per worker, `tasks.empty()` can be true
+        # before the items put by the parent are visible to the workers
+        for task_id, (emulator_ir, metadata) in iter(tasks.get, None):
+            results.put((task_id, _run_callback_task(runner, emulator_ir, metadata)))
 
     @dataclass(config=__pydantic_dataclass_config__)
     class EmuRunner:
@@ -156,6 +329,10 @@ class BloqadePythonRoutine(RoutineBase):
         solver_args: Dict
         callback: Callable
         callback_args: Tuple
+        num_threads: int = 1
+        single_precision: bool = False
+        observables: Tuple = ()
+        times: Tuple = ()
 
         def run_task(self, emulator_ir, metadata_dict):
             hamiltonian = RydbergHamiltonianCodeGen(
@@ -166,10 +343,19 @@ class BloqadePythonRoutine(RoutineBase):
             metadata = MetaData(
                 **{k: cast_to_float(v) for k, v in metadata_dict.items()}
             )
-            zero_state = hamiltonian.space.zero_state(np.complex128)
-            (wrapped_register,) = AnalogGate(hamiltonian).apply(
-                zero_state, **self.solver_args
+            gate = AnalogGate(
+                hamiltonian,
+                num_threads=self.num_threads,
+                single_precision=self.single_precision,
             )
+            zero_state = hamiltonian.space.zero_state(gate.state_type)
+            if self.observables:
+                values = gate.observe(
+                    self.observables, zero_state, times=self.times, **self.solver_args
+                )
+                return self.callback(values, metadata, hamiltonian, *self.callback_args)
+
+            (wrapped_register,) = gate.apply(zero_state, **self.solver_args)
             return self.callback(
                 wrapped_register, metadata, hamiltonian, *self.callback_args
             )
@@ -200,16 +386,14 @@ class BloqadePythonRoutine(RoutineBase):
         args: Tuple[LiteralType, ...] = (),
         name: Optional[str] = None,
         blockade_radius: LiteralType = 0.0,
-        cache_matrices: bool = False,
+        cache_matrices: Union[bool, CompileCache] = False,
         waveform_runtime: str = "interpret",
         use_hyperfine: bool = False,
+        multiprocessing: bool = False,
     ) -> LocalBatch:
         from bloqade.task.bloqade import BloqadeTask
 
-        if cache_matrices:
-            matrix_cache = CompileCache()
-        else:
-            matrix_cache = None
+        matrix_cache = _compile_cache(cache_matrices, multiprocessing)
 
         tasks = OrderedDict()
         ir_iter = self._generate_ir(
@@ -223,6 +407,63 @@ class BloqadePythonRoutine(RoutineBase):
 
         return LocalBatch(self.source, tasks, name)
 
+    @beartype
+    def plan(
+        self,
+        args: Tuple[LiteralType, ...] = (),
+        blockade_radius: float = 0.0,
+        waveform_runtime: str = "interpret",
+        use_hyperfine: bool = False,
+        num_cores: Optional[int] = None,
+    ) -> ParallelPlan:
+        """Plan the processes and threads used to run the batch of this
+        program on `num_cores` cores, see `plan_parallelism`.
+
+        The cost of each task is estimated from the size of its space, its
+        duration and its number of drive terms, without building its
+        Hamiltonian. Batches of many small tasks are planned with a process
+        per core, batches of a few large tasks with threads.
+
+        Args:
+            args (Tuple[LiteralType, ...], optional): The values for parameters
+            defined in `args`. Defaults to ().
+            blockade_radius (float, optional): Use the Blockade subspace given a
+            particular radius. Defaults to 0.0.
+            waveform_runtime: (str, optional): Specify which runtime to use for
+            waveforms. Defaults to "interpret".
+            use_hyperfine (bool, optional): Plan the emulation of the hyperfine
+            level. Defaults to False.
+            num_cores (Optional[int], optional): Number of cores to use. Defaults
+            to the number of processors.
+
+        Returns:
+            ParallelPlan: the plan, its `pool` method starts an `EmulatorPool`
+            following it.
+
+        Examples:
+
+        ```python
+        >>> plan = program.bloqade.python().plan(blockade_radius=6.0)
+        >>> plan.num_workers, plan.num_threads
+        (2, 4)
+        >>> with plan.pool() as pool:
+        ...     batch = program.bloqade.python().run(
+        ...         100, blockade_radius=6.0, pool=pool
+        ...     )
+        ```
+        """
+        programs = [
+            task_data.emulator_ir
+            for task_data in self._generate_ir(
+                args, blockade_radius, waveform_runtime, use_hyperfine
+            )
+        ]
+        space_sizes = {}
+        costs = task_costs(programs, space_sizes)
+        sizes = [space_sizes[program.register] for program in programs]
+
+        return plan_parallelism(costs, sizes, num_cores)
+
     @beartype
     def run(
         self,
@@ -232,13 +473,17 @@ class BloqadePythonRoutine(RoutineBase):
         blockade_radius: float = 0.0,
         waveform_runtime: str = "interpret",
         interaction_picture: bool = False,
-        cache_matrices: bool = False,
+        cache_matrices: Union[bool, CompileCache] = False,
         multiprocessing: bool = False,
         num_workers: Optional[int] = None,
         solver_name: str = "dop853",
         atol: float = 1e-7,
         rtol: float = 1e-14,
         nsteps: int = 2_147_483_647,
+        num_threads: int = 1,
+        single_precision: bool = False,
+        exact: bool = False,
+        pool: Optional[EmulatorPool] = None,
     ) -> LocalBatch:
         """Run the current program using bloqade python backend
 
@@ -249,36 +494,47 @@ class BloqadePythonRoutine(RoutineBase):
             name (Optional[str], optional): Name to give this run. Defaults to None.
             blockade_radius (float, optional): Use the Blockade subspace given a
             particular radius. Defaults to 0.0.
-            waveform_runtime: (bool, optional): Use Numba to compile the waveforms,
-            Defaults to False.
+            waveform_runtime: (str, optional): Specify which runtime to use for
+            waveforms, "tabulated" interpolates the waveforms from a table
+            computed once. Defaults to "interpret".
             interaction_picture (bool, optional): Use the interaction picture when
             solving schrodinger equation. Defaults to False.
-            cache_matrices (bool, optional): Reuse previously evaluated matrcies when
-            possible. Defaults to False.
+            cache_matrices (Union[bool, CompileCache], optional): Reuse previously
+            evaluated matrcies when possible, with `multiprocessing` the matrices
+            are shared between the processes, see `SharedCompileCache`. A
+            `CompileCache` is used as is, e.g. a `PersistentCompileCache` to reuse
+            the matrices across sessions. Defaults to False.
             multiprocessing (bool, optional): Use multiple processes to process the
             batches. Defaults to False.
             num_workers (Optional[int], optional): Number of processes to run with
             multiprocessing. Defaults to None.
-            solver_name (str, optional): Which SciPy Solver to use. Defaults to
-            "dop853".
+            solver_name (str, optional): Which SciPy Solver to use, "krylov"
+            for the adaptive Krylov propagator or "jit_dopri5" for the numba
+            compiled Dormand-Prince integrator. Defaults to "dop853".
             atol (float, optional): Absolute tolerance for ODE solver. Defaults to
             1e-14.
             rtol (float, optional): Relative tolerance for adaptive step in ODE solver.
             Defaults to 1e-7.
             nsteps (int, optional): Maximum number of steps allowed per integration
             step. Defaults to 2_147_483_647, the maximum value.
-
-        Raises:
-            ValueError: Cannot use multiprocessing and cache_matrices at the same time.
+            num_threads (int, optional): Number of threads used by the sparse
+            kernels of a single task, values larger than 1 select the parallel
+            kernels. Defaults to 1.
+            single_precision (bool, optional): Evolve complex64 states with the
+            Hamiltonian stored in single precision, halving the memory of the
+            emulation, requires `solver_name="jit_dopri5"`. Defaults to False.
+            exact (bool, optional): Store the exact distribution of the
+            measurements of the final states instead of sampling `shots`, the
+            report then returns exact densities and the probabilities of the
+            bitstrings as counts. Defaults to False.
+            pool (Optional[EmulatorPool], optional): Run the tasks in the
+            workers of this pool, reused between calls, instead of starting
+            new processes. The matrices are shared between the workers as
+            with `multiprocessing`. Defaults to None.
 
         Returns:
             LocalBatch: Batch of local tasks that have been executed.
         """
-        if multiprocessing and cache_matrices:
-            raise ValueError(
-                "Cannot use multiprocessing and cache_matrices at the same time."
-            )
-
         compile_options = dict(
             shots=shots,
             args=args,
@@ -286,6 +542,7 @@ class BloqadePythonRoutine(RoutineBase):
             blockade_radius=blockade_radius,
             cache_matrices=cache_matrices,
             waveform_runtime=waveform_runtime,
+            multiprocessing=multiprocessing or pool is not None,
         )
 
         solver_options = dict(
@@ -296,6 +553,10 @@ class BloqadePythonRoutine(RoutineBase):
             rtol=rtol,
             nsteps=nsteps,
             interaction_picture=interaction_picture,
+            num_threads=num_threads,
+            single_precision=single_precision,
+            exact=exact,
+            pool=pool,
         )
 
         batch = self._compile(**compile_options)
@@ -314,11 +575,15 @@ class BloqadePythonRoutine(RoutineBase):
         interaction_picture: bool = False,
         multiprocessing: bool = False,
         num_workers: Optional[int] = None,
-        cache_matrices: bool = False,
+        cache_matrices: Union[bool, CompileCache] = False,
         solver_name: str = "dop853",
         atol: float = 1e-7,
         rtol: float = 1e-14,
         nsteps: int = 2_147_483_647,
+        num_threads: int = 1,
+        single_precision: bool = False,
+        exact: bool = False,
+        pool: Optional[EmulatorPool] = None,
     ) -> LocalBatch:
         options = dict(
             shots=shots,
@@ -334,6 +599,10 @@ class BloqadePythonRoutine(RoutineBase):
             rtol=rtol,
             nsteps=nsteps,
             interaction_picture=interaction_picture,
+            num_threads=num_threads,
+            single_precision=single_precision,
+            exact=exact,
+            pool=pool,
         )
         return self.run(**options)
 
@@ -347,7 +616,7 @@ class BloqadePythonRoutine(RoutineBase):
         blockade_radius: float = 0.0,
         waveform_runtime: str = "interpret",
         interaction_picture: bool = False,
-        cache_matrices: bool = False,
+        cache_matrices: Union[bool, CompileCache] = False,
         multiprocessing: bool = False,
         num_workers: Optional[int] = None,
         solver_name: str = "dop853",
@@ -355,6 +624,11 @@ class BloqadePythonRoutine(RoutineBase):
         rtol: float = 1e-14,
         nsteps: int = 2_147_483_647,
         use_hyperfine: bool = False,
+        num_threads: int = 1,
+        single_precision: bool = False,
+        observables: Sequence[Observable] = (),
+        times: Sequence[float] = (),
+        pool: Optional[EmulatorPool] = None,
     ) -> List:
         """Run state-vector simulation with a callback to access full state-vector from
         emulator
@@ -373,23 +647,45 @@ class BloqadePythonRoutine(RoutineBase):
             blockade_radius (float, optional): Use the Blockade subspace given a
             particular radius. Defaults to 0.0.
             waveform_runtime: (str, optional): Specify which runtime to use for
-            waveforms. Defaults to "interpret".
+            waveforms, "tabulated" interpolates the waveforms from a table
+            computed once. Defaults to "interpret".
             interaction_picture (bool, optional): Use the interaction picture when
             solving schrodinger equation. Defaults to False.
-            cache_matrices (bool, optional): Reuse previously evaluated matrcies when
-            possible. Defaults to False.
+            cache_matrices (Union[bool, CompileCache], optional): Reuse previously
+            evaluated matrcies when possible, with `multiprocessing` the matrices
+            are shared between the processes, see `SharedCompileCache`. A
+            `CompileCache` is used as is, e.g. a `PersistentCompileCache` to reuse
+            the matrices across sessions. Defaults to False.
             multiprocessing (bool, optional): Use multiple processes to process the
             batches. Defaults to False.
             num_workers (Optional[int], optional): Number of processes to run with
             multiprocessing. Defaults to None.
-            solver_name (str, optional): Which SciPy Solver to use. Defaults to
-            "dop853".
+            solver_name (str, optional): Which SciPy Solver to use, "krylov"
+            for the adaptive Krylov propagator or "jit_dopri5" for the numba
+            compiled Dormand-Prince integrator. Defaults to "dop853".
             atol (float, optional): Absolute tolerance for ODE solver. Defaults to
             1e-14.
             rtol (float, optional): Relative tolerance for adaptive step in ODE solver.
             Defaults to 1e-7.
             nsteps (int, optional): Maximum number of steps allowed per integration
             step. Defaults to 2_147_483_647, the maximum value.
+            num_threads (int, optional): Number of threads used by the sparse
+            kernels of a single task, values larger than 1 select the parallel
+            kernels. Defaults to 1.
+            single_precision (bool, optional): Evolve complex64 states with the
+            Hamiltonian stored in single precision, halving the memory of the
+            emulation, requires `solver_name="jit_dopri5"`. Defaults to False.
+            observables (Sequence[Observable], optional): Observables evaluated
+            during the evolution, see `BloqadeEmulation.observe`. If provided the
+            callback receives the (n_times, n_observables) array of the
+            observables instead of the final state vector. Defaults to ().
+            times (Sequence[float], optional): The times to evaluate the
+            `observables` at. Defaults to the end of the program.
+            pool (Optional[EmulatorPool], optional): Run the tasks in the
+            workers of this pool, reused between calls, instead of starting
+            new processes. The `callback` and its arguments must be picklable,
+            e.g. a function defined at the top level of a module. Defaults to
+            None.
 
         Returns:
             List: List of resulting outputs from the callbacks
@@ -409,15 +705,19 @@ class BloqadePythonRoutine(RoutineBase):
 
 
         """
+        if pool is not None and (multiprocessing or num_workers is not None):
+            raise ValueError(
+                "multiprocessing and num_workers can not be used with a pool."
+            )
+
         if multiprocessing:
             from multiprocessing import Process, Queue, cpu_count
         else:
             from queue import Queue
 
-        if cache_matrices:
-            compile_cache = CompileCache()
-        else:
-            compile_cache = None
+        compile_cache = _compile_cache(
+            cache_matrices, multiprocessing or pool is not None
+        )
 
         solver_args = dict(
             solver_name=solver_name,
@@ -432,27 +732,46 @@ class BloqadePythonRoutine(RoutineBase):
             solver_args=solver_args,
             callback=callback,
             callback_args=callback_args,
+            num_threads=num_threads,
+            single_precision=single_precision,
+            observables=tuple(observables),
+            times=tuple(times),
         )
 
+        items = [
+            (task_data.task_id, (task_data.emulator_ir, task_data.metadata_dict))
+            for task_data in self._generate_ir(
+                program_args, blockade_radius, waveform_runtime, use_hyperfine
+            )
+        ]
+        total_tasks = len(items)
+
+        if pool is not None or multiprocessing:
+            costs = task_costs([emulator_ir for _, (emulator_ir, _) in items])
+
+        if pool is not None:
+            function = functools.partial(_run_pool_callback_task, runner)
+            id_results = list(pool.imap_unordered(function, items, costs=costs))
+            return self._collect_callback_results(id_results, ignore_exceptions)
+
+        if multiprocessing:
+            # the costly tasks first so that none is left running alone
+            order = np.argsort(np.negative(costs), kind="stable")
+            items = [items[index] for index in order]
+
         tasks = Queue()
         results = Queue()
-
-        total_tasks = 0
-        ir_iter = self._generate_ir(
-            program_args, blockade_radius, waveform_runtime, use_hyperfine
-        )
-        for task_data in ir_iter:
-            task_number = task_data.task_id
-            emulator_ir = task_data.emulator_ir
-            metadata = task_data.metadata_dict
-            total_tasks += 1
-            tasks.put((task_number, (emulator_ir, metadata)))
+        for item in items:
+            tasks.put(item)
 
         workers = []
         if multiprocessing:
             num_workers = max(int(num_workers or cpu_count()), 1)
             num_workers = min(total_tasks, num_workers)
 
+            for _ in range(num_workers):
+                tasks.put(None)
+
             for _ in range(num_workers):
                 worker = Process(
                     target=BloqadePythonRoutine.process_tasks,
@@ -462,6 +781,7 @@ class BloqadePythonRoutine(RoutineBase):
 
                 workers.append(worker)
         else:
+            tasks.put(None)
             self.process_tasks(runner, tasks, results)
 
         # blocks until all
@@ -478,6 +798,10 @@ class BloqadePythonRoutine(RoutineBase):
             tasks.close()
             results.close()
 
+        return self._collect_callback_results(id_results, ignore_exceptions)
+
+    @staticmethod
+    def _collect_callback_results(id_results, ignore_exceptions):
         id_results.sort(key=lambda x: x[0])
         results = []
 
@@ -501,7 +825,8 @@ class BloqadePythonRoutine(RoutineBase):
         blockade_radius: float = 0.0,
         use_hyperfine: bool = False,
         waveform_runtime: str = "interpret",
-        cache_matrices: bool = False,
+        cache_matrices: Union[bool, CompileCache] = False,
+        interaction_cutoff: Optional[float] = None,
     ) -> List[BloqadeEmulation]:
         """
         Generates a list of BloqadeEmulation objects which contain the Hamiltonian of your program.
@@ -520,9 +845,13 @@ class BloqadePythonRoutine(RoutineBase):
             blockade_radius (float): The radius in which atoms blockade eachother. Default value is 0.0 micrometers.
             use_hyperfine (bool): Should the Hamiltonian account for hyperfine levels. Default value is False.
             waveform_runtime (str): Specify which runtime to use for waveforms. If "numba" is specify the waveform
-                is compiled, otherwise it is interpreted via the "interpret" argument. Defaults to "interpret".
-            cache_matrices (bool): Speed up Hamiltonian generation by reusing data (when possible) from previously generated Hamiltonians.
-                Default value is False.
+                is compiled, if "tabulated" the waveform is interpolated from a table computed once (exact for
+                piecewise linear waveforms), otherwise it is interpreted via the "interpret" argument.
+                Defaults to "interpret".
+            cache_matrices (Union[bool, CompileCache]): Speed up Hamiltonian generation by reusing data (when possible) from previously generated Hamiltonians.
+                A `CompileCache` is used as is, e.g. a `PersistentCompileCache` to reuse the data across sessions. Default value is False.
+            interaction_cutoff (Optional[float]): Only include the Rydberg interaction between atoms closer than
+                this distance in micrometers. Default value is None, the interaction between all atoms.
 
         Returns:
             List[BloqadeEmulation]
@@ -532,12 +861,13 @@ class BloqadePythonRoutine(RoutineBase):
             args, blockade_radius, waveform_runtime, use_hyperfine
         )
 
-        if cache_matrices:
-            compile_cache = CompileCache()
-        else:
-            compile_cache = None
+        compile_cache = _compile_cache(cache_matrices)
 
         return [
-            BloqadeEmulation(task_data, compile_cache=compile_cache)
+            BloqadeEmulation(
+                task_data,
+                compile_cache=compile_cache,
+                interaction_cutoff=interaction_cutoff,
+            )
             for task_data in ir_iter
         ]
@@ -1,6 +1,10 @@
 from bloqade.submission.ir.braket import BraketTaskSpecification
 from bloqade.submission.ir.task_specification import QuEraTaskSpecification
-from bloqade.submission.ir.task_results import QuEraTaskResults, QuEraTaskStatusCode
+from bloqade.submission.ir.task_results import (
+    ColumnarTaskResults,
+    QuEraTaskResults,
+    QuEraTaskStatusCode,
+)
 from typing import Union
 from pydantic.v1 import BaseModel, Extra
 from bloqade.submission.capabilities import get_capabilities
@@ -31,7 +35,9 @@ class SubmissionBackend(BaseModel):
     def cancel_task(self, task_id: str) -> None:
         raise NotImplementedError
 
-    def task_results(self, task_id: str) -> QuEraTaskResults:
+    def task_results(
+        self, task_id: str
+    ) -> Union[QuEraTaskResults, ColumnarTaskResults]:
         raise NotImplementedError
 
     def task_status(self, task_id: str) -> QuEraTaskStatusCode:
@@ -1,9 +1,11 @@
+from dataclasses import dataclass
 from enum import Enum
 from pydantic.v1 import BaseModel, conlist, conint
-from typing import List, Tuple
+from typing import Any, Dict, List, Tuple, Union
+from numpy.typing import NDArray
 import numpy as np
 
-__all__ = ["QuEraTaskResults", "TaskProbabilities"]
+__all__ = ["QuEraTaskResults", "ColumnarTaskResults", "TaskProbabilities"]
 
 # TODO: add version to these models.
 
@@ -88,6 +90,15 @@ class QuEraTaskResults(BaseModel):
         Returns:
             TaskProbabilities: The task results as probabilties
         """
+        try:
+            results = ColumnarTaskResults.from_task_results(self)
+        except ValueError:
+            # sequences of different lengths do not fit in matrices
+            return self._count_configurations()
+
+        return results.export_as_probabilities()
+
+    def _count_configurations(self) -> TaskProbabilities:
         counts = dict()
         nshots = len(self.shot_outputs)
         for shot_result in self.shot_outputs:
@@ -102,3 +113,246 @@ class QuEraTaskResults(BaseModel):
 
         probabilities = [(config, count / nshots) for config, count in counts.items()]
         return TaskProbabilities(probabilities=probabilities)
+
+
+SHOT_STATUS_CODES = tuple(QuEraShotStatusCode)
+
+
+@dataclass(frozen=True, eq=False)
+class ColumnarTaskResults:
+    """Shot results of a task stored as columns instead of a list of
+    `QuEraShotResult`.
+
+    The status of the shots is stored as an array of codes, indices in
+    `SHOT_STATUS_CODES`, and the pre- and post-sequences as `uint8` matrices
+    of shape (shots, sites). The sequences of the shots missing them are
+    zeros. The results convert to and from the `QuEraTaskResults` schema,
+    which is used for serialization. The results compare their arrays and
+    are not hashable.
+    """
+
+    task_status: QuEraTaskStatusCode
+    shot_status: NDArray
+    pre_sequences: NDArray
+    post_sequences: NDArray
+
+    def __post_init__(self):
+        (n_shots,) = self.shot_status.shape
+        if self.pre_sequences.ndim != 2 or self.pre_sequences.shape[0] != n_shots:
+            raise ValueError(
+                f"expecting pre-sequences of {n_shots} shots, "
+                f"got shape {self.pre_sequences.shape}."
+            )
+        if self.post_sequences.shape != self.pre_sequences.shape:
+            raise ValueError(
+                f"expecting post-sequences of shape {self.pre_sequences.shape}, "
+                f"got {self.post_sequences.shape}."
+            )
+
+    @classmethod
+    def from_completed_shots(
+        cls, pre_sequences: NDArray, post_sequences: NDArray
+    ) -> "ColumnarTaskResults":
+        """Results of a completed task with all of its shots completed."""
+        pre_sequences = np.asarray(pre_sequences, dtype=np.uint8)
+        return cls(
+            task_status=QuEraTaskStatusCode.Completed,
+            shot_status=np.full(
+                pre_sequences.shape[0],
+                SHOT_STATUS_CODES.index(QuEraShotStatusCode.Completed),
+                dtype=np.uint8,
+            ),
+            pre_sequences=pre_sequences,
+            post_sequences=np.asarray(post_sequences, dtype=np.uint8),
+        )
+
+    @classmethod
+    def from_status(cls, task_status: QuEraTaskStatusCode) -> "ColumnarTaskResults":
+        """Results of a task with status `task_status` and no shots."""
+        return cls(
+            task_status=task_status,
+            shot_status=np.zeros(0, dtype=np.uint8),
+            pre_sequences=np.zeros((0, 0), dtype=np.uint8),
+            post_sequences=np.zeros((0, 0), dtype=np.uint8),
+        )
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ColumnarTaskResults":
+        """Results from the dictionary of a `QuEraTaskResults`."""
+        shot_outputs = d.get("shot_outputs", [])
+        shot_status = np.fromiter(
+            (
+                SHOT_STATUS_CODES.index(
+                    QuEraShotStatusCode(
+                        shot.get("shot_status", QuEraShotStatusCode.MissingMeasurement)
+                    )
+                )
+                for shot in shot_outputs
+            ),
+            dtype=np.uint8,
+            count=len(shot_outputs),
+        )
+        n_sites = max(
+            (
+                len(shot.get(key, []))
+                for shot in shot_outputs
+                for key in ("pre_sequence", "post_sequence")
+            ),
+            default=0,
+        )
+
+        def sequences(key):
+            matrix = np.zeros((len(shot_outputs), n_sites), dtype=np.uint8)
+            for row, shot in zip(matrix, shot_outputs):
+                sequence = shot.get(key, [])
+                if len(sequence) == 0:
+                    continue
+                if len(sequence) != n_sites:
+                    raise ValueError(
+                        f"expecting {key} of size {n_sites}, got {len(sequence)}."
+                    )
+                row[:] = sequence
+
+            if np.any(matrix > 1):
+                raise ValueError(f"{key} must only contain 0 and 1.")
+
+            return matrix
+
+        return cls(
+            task_status=QuEraTaskStatusCode(
+                d.get("task_status", QuEraTaskStatusCode.Failed)
+            ),
+            shot_status=shot_status,
+            pre_sequences=sequences("pre_sequence"),
+            post_sequences=sequences("post_sequence"),
+        )
+
+    @classmethod
+    def from_task_results(
+        cls, results: Union[QuEraTaskResults, "ColumnarTaskResults"]
+    ) -> "ColumnarTaskResults":
+        """Columnar results of `results`, returned as is if already columnar."""
+        if isinstance(results, ColumnarTaskResults):
+            return results
+
+        return cls.from_dict(results.dict())
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, QuEraTaskResults):
+            other = ColumnarTaskResults.from_task_results(other)
+
+        if not isinstance(other, ColumnarTaskResults):
+            return NotImplemented
+
+        return (
+            self.task_status == other.task_status
+            and np.array_equal(self.shot_status, other.shot_status)
+            and np.array_equal(self.pre_sequences, other.pre_sequences)
+            and np.array_equal(self.post_sequences, other.post_sequences)
+        )
+
+    @property
+    def nshots(self) -> int:
+        return self.shot_status.size
+
+    @property
+    def completed_shots(self) -> NDArray:
+        """Mask of the completed shots."""
+        code = SHOT_STATUS_CODES.index(QuEraShotStatusCode.Completed)
+        return self.shot_status == code
+
+    def _has_sequences(self) -> Tuple[NDArray, NDArray]:
+        missing_pre = [
+            SHOT_STATUS_CODES.index(QuEraShotStatusCode.MissingPreSequence),
+            SHOT_STATUS_CODES.index(QuEraShotStatusCode.MissingMeasurement),
+        ]
+        missing_post = [
+            SHOT_STATUS_CODES.index(QuEraShotStatusCode.MissingPostSequence),
+            SHOT_STATUS_CODES.index(QuEraShotStatusCode.MissingMeasurement),
+        ]
+        has_pre = ~np.isin(self.shot_status, missing_pre)
+        has_post = ~np.isin(self.shot_status, missing_post)
+        return has_pre, has_post
+
+    def dict(self) -> Dict[str, Any]:
+        """Dictionary of the results in the `QuEraTaskResults` schema, the
+        missing sequences being empty."""
+        has_pre, has_post = self._has_sequences()
+        pre_sequences = self.pre_sequences.tolist()
+        post_sequences = self.post_sequences.tolist()
+
+        shot_outputs = [
+            {
+                "shot_status": SHOT_STATUS_CODES[code].value,
+                "pre_sequence": pre if pre_exists else [],
+                "post_sequence": post if post_exists else [],
+            }
+            for code, pre, post, pre_exists, post_exists in zip(
+                self.shot_status.tolist(),
+                pre_sequences,
+                post_sequences,
+                has_pre,
+                has_post,
+            )
+        ]
+        return {"task_status": self.task_status.value, "shot_outputs": shot_outputs}
+
+    def to_task_results(self) -> QuEraTaskResults:
+        """Convert the results to the `QuEraTaskResults` schema."""
+        return QuEraTaskResults(**self.dict())
+
+    @property
+    def shot_outputs(self) -> List[QuEraShotResult]:
+        return self.to_task_results().shot_outputs
+
+    def export_as_probabilities(self) -> TaskProbabilities:
+        """converts from shot results to probabilities
+
+        Returns:
+            TaskProbabilities: The task results as probabilties
+        """
+        if self.nshots == 0:
+            return TaskProbabilities(probabilities=[])
+
+        has_pre, has_post = self._has_sequences()
+        n_sites = self.pre_sequences.shape[1]
+        # the missing sequences are distinguished by their flag
+        keys = np.hstack(
+            [
+                has_pre[:, None],
+                has_post[:, None],
+                self.pre_sequences * has_pre[:, None],
+                self.post_sequences * has_post[:, None],
+            ]
+        ).astype(np.uint8)
+        unique_keys, first_index, counts = np.unique(
+            np.packbits(keys, axis=1), axis=0, return_index=True, return_counts=True
+        )
+        unique_keys = np.unpackbits(unique_keys, axis=1, count=keys.shape[1])
+
+        # in the order of the first occurrence of each configuration
+        order = np.argsort(first_index, kind="stable")
+        unique_keys = unique_keys[order]
+        probabilities = counts[order] / self.nshots
+
+        def bitstrings(sequences, exists):
+            # encode the rows as ascii strings of "0" and "1"
+            if n_sites == 0:
+                return [""] * len(exists)
+
+            chars = np.ascontiguousarray(sequences + ord("0"), dtype=np.uint8)
+            strings = chars.view(f"S{n_sites}").ravel().tolist()
+            return [
+                string.decode() if flag else "" for string, flag in zip(strings, exists)
+            ]
+
+        pre_strings = bitstrings(unique_keys[:, 2 : 2 + n_sites], unique_keys[:, 0])
+        post_strings = bitstrings(unique_keys[:, 2 + n_sites :], unique_keys[:, 1])
+
+        probabilities = [
+            ((pre, post), probability)
+            for pre, post, probability in zip(
+                pre_strings, post_strings, probabilities.tolist()
+            )
+        ]
+        return TaskProbabilities(probabilities=probabilities)
@@ -4,11 +4,10 @@ from bloqade.submission.ir.task_specification import (
     QuEraTaskSpecification,
 )
 from bloqade.submission.ir.task_results import (
-    QuEraTaskResults,
+    ColumnarTaskResults,
     QuEraTaskStatusCode,
-    QuEraShotResult,
-    QuEraShotStatusCode,
 )
+import json
 import uuid
 import numpy as np
 
@@ -24,25 +23,14 @@ def simulate_task_results(task: QuEraTaskSpecification, p_full=0.99, p_empty=0.0
 
     rng = np.random.default_rng()
 
-    shot_outputs = []
-    for shot in range(task.nshots):
-        pre_sequence = rng.binomial(np.ones(natoms, dtype=int), pre_sequence_probs)
-        post_sequence = rng.binomial(
-            np.ones(natoms, dtype=int), pre_sequence * post_sequence_probs
-        )
-
-        shot_outputs.append(
-            QuEraShotResult(
-                shot_status=QuEraShotStatusCode.Completed,
-                pre_sequence=list(pre_sequence),
-                post_sequence=list(post_sequence),
-            )
-        )
-
-    return QuEraTaskResults(
-        task_status=QuEraTaskStatusCode.Completed, shot_outputs=shot_outputs
+    shape = (task.nshots, natoms)
+    pre_sequences = rng.binomial(np.ones(shape, dtype=int), pre_sequence_probs)
+    post_sequences = rng.binomial(
+        np.ones(shape, dtype=int), pre_sequences * post_sequence_probs
     )
 
+    return ColumnarTaskResults.from_completed_shots(pre_sequences, post_sequences)
+
 
 class MockBackend(SubmissionBackend):
     state_file: str = ".mock_state.txt"
@@ -55,17 +43,17 @@ class MockBackend(SubmissionBackend):
         task_id = str(uuid.uuid4())
         task_results = simulate_task_results(task)
         with open(self.state_file, "a") as IO:
-            IO.write(f"('{task_id}',{task_results.json()})\n")
+            IO.write(f"('{task_id}',{json.dumps(task_results.dict())})\n")
 
         return task_id
 
-    def task_results(self, task_id: str) -> QuEraTaskResults:
+    def task_results(self, task_id: str) -> ColumnarTaskResults:
         # lazily search database for task_id
         for line in open(self.state_file, "r"):
             potential_task_id, task_results = eval(line)
 
             if potential_task_id == task_id:
-                return QuEraTaskResults(**task_results)
+                return ColumnarTaskResults.from_dict(task_results)
 
         raise ValueError(f"unable to fetch results for task_id: {task_id}")
 
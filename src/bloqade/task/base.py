@@ -6,6 +6,7 @@ from beartype import beartype
 from numbers import Number
 
 from bloqade.submission.ir.task_results import (
+    ColumnarTaskResults,
     QuEraTaskResults,
     QuEraTaskStatusCode,
 )
@@ -54,6 +55,14 @@ class Task:
     def geometry(self) -> Geometry:
         return self._geometry()
 
+    def _columnar_result(self) -> Optional[ColumnarTaskResults]:
+        """The `result` of the task as columns, see `ColumnarTaskResults`."""
+        results = self.result()
+        if results is None:
+            return None
+
+        return ColumnarTaskResults.from_task_results(results)
+
 
 class RemoteTask(Task):
     """`Task` to use for remote executions to run the program on Quera
@@ -150,20 +159,28 @@ class Report:
     task_number
     0            0.053  0.054
     ```
+
+    ### Exact Results
+    Emulations run with `exact=True` store the distinct outcomes of the
+    measurement of the final state instead of shots, `weights` holds the
+    probability of every row of the dataframe. The densities are then exact
+    and the counts are the probabilities of the bitstrings.
     """
 
     dataframe: pd.DataFrame
     metas: List[Dict]
     geos: List[Geometry]
     name: str = ""
+    weights: Optional[pd.Series] = None
 
-    def __init__(self, data, metas, geos, name="") -> None:
+    def __init__(self, data, metas, geos, name="", weights=None) -> None:
         self.dataframe = data  # df
         self._bitstrings = None  # bitstring cache
         self._counts = None  # counts cache
         self.metas = metas
         self.geos = geos
         self.name = name + " " + str(datetime.datetime.now())
+        self.weights = weights
 
     def list_param(self, field_name: str) -> List[Union[Number, None]]:
         """
@@ -276,7 +293,7 @@ class Report:
         self,
         filter_perfect_filling: bool = True,
         clusters: Union[tuple[int, int], List[tuple[int, int]]] = [],
-    ) -> List[OrderedDict[str, int]]:
+    ) -> List[OrderedDict[str, Union[int, float]]]:
         """Get the counts of unique bit strings.
 
         Args:
@@ -298,7 +315,8 @@ class Report:
 
         Note:
             Note that nshots may vary between tasks if filter_perfect_filling
-            is set to True.
+            is set to True. For exact results the counts are the
+            probabilities of the bitstrings.
 
         """
 
@@ -314,10 +332,41 @@ class Report:
 
             return count
 
+        if self.weights is not None:
+            return self._weighted_counts(filter_perfect_filling, clusters)
+
         return list(
             map(_generate_counts, self.bitstrings(filter_perfect_filling, clusters))
         )
 
+    def _weighted_counts(self, filter_perfect_filling, clusters):
+        task_numbers = self.dataframe.index.get_level_values("task_number").unique()
+
+        counts = []
+        for task_number in task_numbers:
+            mask = self._filter(
+                task_number=task_number,
+                filter_perfect_filling=filter_perfect_filling,
+                clusters=clusters,
+            )
+            bitstrings, inverse = np.unique(
+                self.dataframe.loc[mask].to_numpy(), axis=0, return_inverse=True
+            )
+            weights = np.bincount(
+                inverse.ravel(),
+                weights=self.weights[mask].to_numpy(),
+                minlength=len(bitstrings),
+            )
+
+            count_list = [
+                ("".join(map(str, bitstring)), float(weight))
+                for bitstring, weight in zip(bitstrings, weights)
+            ]
+            count_list.sort(key=lambda x: x[1], reverse=True)
+            counts.append(OrderedDict(count_list))
+
+        return counts
+
     @beartype
     def rydberg_densities(
         self,
@@ -347,6 +396,12 @@ class Report:
             filter_perfect_filling=filter_perfect_filling, clusters=clusters
         )
         df = self.dataframe[mask]
+
+        if self.weights is not None:
+            weights = self.weights[mask]
+            total = df.mul(weights, axis="index").groupby("task_number").sum()
+            return 1 - total.div(weights.groupby("task_number").sum(), axis="index")
+
         return 1 - (df.groupby("task_number").mean())
 
     def show(self):
@@ -3,27 +3,32 @@ from numbers import Real
 from typing import Literal
 from bloqade.builder.typing import LiteralType
 from bloqade.serialize import Serializer
-from bloqade.task.base import Report
+from bloqade.task.base import Geometry, Report
 from bloqade.task.quera import QuEraTask
 from bloqade.task.braket import BraketTask
 from bloqade.task.braket_simulator import BraketEmulatorTask
 from bloqade.task.bloqade import BloqadeTask
+from bloqade.emulate.pool import (
+    EmulatorPool,
+    worker_compile_cache,
+    worker_num_threads,
+)
+from bloqade.emulate.schedule import schedule, task_costs
 
 from bloqade.builder.base import Builder
 
 from bloqade.submission.ir.task_results import (
-    QuEraShotStatusCode,
+    ColumnarTaskResults,
     QuEraTaskStatusCode,
     QuEraTaskResults,
 )
 
 # from bloqade.submission.base import ValidationError
 
-from beartype.typing import Union, Optional, Dict, Any, List
+from beartype.typing import Union, Optional, Dict, Any, List, Tuple
 from beartype import beartype
 from collections import OrderedDict
 from collections.abc import Sequence
-from itertools import product
 import traceback
 import datetime
 import sys
@@ -32,6 +37,7 @@ import warnings
 import pandas as pd
 import numpy as np
 from dataclasses import dataclass, field
+import dataclasses
 
 
 class Serializable:
@@ -51,6 +57,119 @@ class Serializable:
 MetadataFilterType = Union[Sequence[LiteralType], Sequence[List[LiteralType]]]
 
 
+def _bitstrings(sequences: np.ndarray) -> np.ndarray:
+    """Rows of a matrix of 0 and 1 as an array of strings."""
+    n_rows, n_bits = sequences.shape
+    if n_bits == 0:
+        return np.full(n_rows, "")
+
+    chars = np.ascontiguousarray(sequences + ord("0"), dtype=np.uint8)
+    return chars.view(f"S{n_bits}").ravel().astype(f"U{n_bits}")
+
+
+class _ReportRows:
+    """Rows of the report of a batch, gathered task by task.
+
+    The rows of a task are one per completed shot and cluster, in this order,
+    the sequences of all the clusters being gathered from the (shots, sites)
+    matrices of the results with a single fancy indexing.
+    """
+
+    def __init__(self) -> None:
+        self.task_numbers = []
+        self.clusters = []
+        self.perfect_sortings = []
+        self.pre_sequences = []
+        self.data = []
+        self.weights = []
+
+    def add(
+        self,
+        task_number: int,
+        geometry: Geometry,
+        results: Union[QuEraTaskResults, ColumnarTaskResults],
+        probabilities: Optional[List[float]] = None,
+    ) -> None:
+        results = ColumnarTaskResults.from_task_results(results)
+        filling = np.asarray(geometry.filling, dtype=np.uint8)
+        parallel_decoder = geometry.parallel_decoder
+
+        if parallel_decoder:
+            cluster_indices = parallel_decoder.get_cluster_indices()
+        else:
+            cluster_indices = {(0, 0): list(range(filling.size))}
+
+        completed = results.completed_shots
+        pre = results.pre_sequences[completed]
+        post = results.post_sequences[completed]
+        n_shots = pre.shape[0]
+
+        coordinates = np.empty(len(cluster_indices), dtype=object)
+        for cluster_number, cluster_coordinate in enumerate(cluster_indices):
+            coordinates[cluster_number] = cluster_coordinate
+
+        sites = list(cluster_indices.values())
+        if len(set(map(len, sites))) == 1:
+            sites = np.asarray(sites, dtype=np.int64)
+            size = sites.shape[1]
+            pre_sequences = _bitstrings(pre[:, sites].reshape(-1, size))
+            perfect_sortings = _bitstrings(filling[sites])
+            data = post[:, sites].reshape(-1, size).astype(np.int8)
+        else:
+            # clusters of different sizes, the rows have different lengths
+            pre_sequences = np.stack(
+                [_bitstrings(pre[:, cluster]) for cluster in sites], axis=1
+            ).ravel()
+            perfect_sortings = np.concatenate(
+                [_bitstrings(filling[None, cluster]) for cluster in sites]
+            )
+            data = [
+                row[cluster].astype(np.int8) for row in post for cluster in sites
+            ]
+
+        if probabilities is None:
+            weights = np.ones(n_shots)
+        else:
+            weights = np.asarray(probabilities, dtype=np.float64)[completed]
+
+        self.task_numbers.append(np.full(n_shots * len(sites), task_number))
+        self.clusters.append(np.tile(coordinates, n_shots))
+        self.perfect_sortings.append(np.tile(perfect_sortings, n_shots))
+        self.pre_sequences.append(pre_sequences)
+        self.data.append(data)
+        self.weights.append(np.repeat(weights, len(sites)))
+
+    def build(self) -> Tuple[pd.DataFrame, pd.Series]:
+        """The data of the report and the weights of its rows."""
+        names = ["task_number", "cluster", "perfect_sorting", "pre_sequence"]
+        if not self.task_numbers:
+            index = pd.MultiIndex.from_tuples([], names=names)
+            weights = pd.Series([], index=index, dtype=np.float64)
+            return pd.DataFrame([], index=index), weights
+
+        index = pd.MultiIndex.from_arrays(
+            [
+                np.concatenate(self.task_numbers),
+                np.concatenate(self.clusters),
+                np.concatenate(self.perfect_sortings).astype(object),
+                np.concatenate(self.pre_sequences).astype(object),
+            ],
+            names=names,
+        )
+        weights = pd.Series(np.concatenate(self.weights), index=index)
+
+        widths = {
+            data.shape[1] if isinstance(data, np.ndarray) else None
+            for data in self.data
+        }
+        if len(widths) == 1 and None not in widths:
+            return pd.DataFrame(np.concatenate(self.data), index=index), weights
+
+        # rows of different lengths are padded by pandas
+        rows = [row for data in self.data for row in data]
+        return pd.DataFrame(rows, index=index), weights
+
+
 class Filter:
     @beartype
     def filter_metadata(
@@ -131,76 +250,45 @@ class LocalBatch(Serializable, Filter):
 
         ## this potentially can be specialize/disatch
         ## offline
-        index = []
-        data = []
+        rows = _ReportRows()
         metas = []
         geos = []
 
         for task_number, task in self.tasks.items():
-            geometry = task.geometry
-            perfect_sorting = "".join(map(str, geometry.filling))
-            parallel_decoder = geometry.parallel_decoder
-
-            if parallel_decoder:
-                cluster_indices = parallel_decoder.get_cluster_indices()
-            else:
-                cluster_indices = {(0, 0): list(range(len(perfect_sorting)))}
-
-            shot_iter = filter(
-                lambda shot: shot.shot_status == QuEraShotStatusCode.Completed,
-                task.result().shot_outputs,
+            # shots of an exact run are weighted by their probabilities
+            rows.add(
+                task_number,
+                task.geometry,
+                task._columnar_result(),
+                getattr(task, "probabilities", None),
             )
-
-            for shot, (cluster_coordinate, cluster_index) in product(
-                shot_iter, cluster_indices.items()
-            ):
-                pre_sequence = "".join(
-                    map(
-                        str,
-                        (shot.pre_sequence[index] for index in cluster_index),
-                    )
-                )
-
-                post_sequence = np.asarray(
-                    [shot.post_sequence[index] for index in cluster_index],
-                    dtype=np.int8,
-                )
-
-                pfc_sorting = "".join(
-                    [perfect_sorting[index] for index in cluster_index]
-                )
-
-                key = (
-                    task_number,
-                    cluster_coordinate,
-                    pfc_sorting,
-                    pre_sequence,
-                )
-
-                index.append(key)
-                data.append(post_sequence)
-
             metas.append(task.metadata)
             geos.append(task.geometry)
 
-        index = pd.MultiIndex.from_tuples(
-            index, names=["task_number", "cluster", "perfect_sorting", "pre_sequence"]
-        )
+        df, weights = rows.build()
 
-        df = pd.DataFrame(data, index=index)
-        df.sort_index(axis="index")
+        exact = any(
+            getattr(task, "probabilities", None) is not None
+            for task in self.tasks.values()
+        )
+        if not exact:
+            weights = None
 
         rept = None
         if self.name is None:
-            rept = Report(df, metas, geos, "Local")
+            rept = Report(df, metas, geos, "Local", weights=weights)
         else:
-            rept = Report(df, metas, geos, self.name)
+            rept = Report(df, metas, geos, self.name, weights=weights)
 
         return rept
 
     @beartype
     def rerun(
-        self, multiprocessing: bool = False, num_workers: Optional[int] = None, **kwargs
+        self,
+        multiprocessing: bool = False,
+        num_workers: Optional[int] = None,
+        pool: Optional[EmulatorPool] = None,
+        **kwargs,
     ):
         """
         Rerun all the tasks in the LocalBatch.
@@ -211,11 +299,18 @@ class LocalBatch(Serializable, Filter):
         """
 
         return self._run(
-            multiprocessing=multiprocessing, num_workers=num_workers, **kwargs
+            multiprocessing=multiprocessing,
+            num_workers=num_workers,
+            pool=pool,
+            **kwargs,
         )
 
     def _run(
-        self, multiprocessing: bool = False, num_workers: Optional[int] = None, **kwargs
+        self,
+        multiprocessing: bool = False,
+        num_workers: Optional[int] = None,
+        pool: Optional[EmulatorPool] = None,
+        **kwargs,
     ):
         """
         Private method to run tasks in the batch.
@@ -225,6 +320,8 @@ class LocalBatch(Serializable, Filter):
                 If False, tasks are run sequentially in a single process. Defaults to False.
             num_workers (Optional[int], optional): The maximum number of processes that can be used to
                 execute the given calls if multiprocessing is True. If None, the number of workers will be the number of processors on the machine.
+            pool (Optional[EmulatorPool], optional): Run the tasks in the workers of
+                this pool instead, only their results are sent back. Defaults to None.
             **kwargs: Arbitrary keyword arguments passed to the task's run method.
 
         Raises:
@@ -233,16 +330,44 @@ class LocalBatch(Serializable, Filter):
         Returns:
             self: The instance of the batch with tasks run.
         """
-        if multiprocessing:
+        if pool is not None:
+            if num_workers is not None:
+                raise ValueError("num_workers is set by the pool.")
+
+            items = [
+                (task_number, (_without_results(task), kwargs))
+                for task_number, task in self.tasks.items()
+            ]
+            costs = _task_costs(self.tasks.values())
+            results = pool.imap_unordered(_run_local_task, items, costs=costs)
+            for task_number, result in results:
+                if isinstance(result, tuple):
+                    task = self.tasks[task_number]
+                    task.task_result_ir, task.probabilities = result
+                else:
+                    self.tasks[task_number] = result
+
+        elif multiprocessing:
             from concurrent.futures import ProcessPoolExecutor as Pool
 
+            task_numbers = list(self.tasks.keys())
+            tasks = list(self.tasks.values())
+            costs = _task_costs(tasks)
+            if costs is None:
+                chunks = [[index] for index in range(len(tasks))]
+            else:
+                # the costly tasks first, the small ones packed together
+                chunks = schedule(costs, num_workers or os.cpu_count() or 1)
+
             with Pool(max_workers=num_workers) as pool:
-                futures = OrderedDict()
-                for task_number, task in enumerate(self.tasks.values()):
-                    futures[task_number] = pool.submit(task.run, **kwargs)
+                futures = [
+                    (chunk, pool.submit(_run_tasks, [tasks[i] for i in chunk], kwargs))
+                    for chunk in chunks
+                ]
 
-                for task_number, future in futures.items():
-                    self.tasks[task_number] = future.result()
+                for chunk, future in futures:
+                    for index, task in zip(chunk, future.result()):
+                        self.tasks[task_numbers[index]] = task
 
         else:
             if num_workers is not None:
@@ -255,6 +380,45 @@ class LocalBatch(Serializable, Filter):
         return self
 
 
+def _task_costs(tasks) -> Optional[List[float]]:
+    """Costs of the emulations of the tasks, `None` if they are not all
+    `BloqadeTask`."""
+    tasks = list(tasks)
+    if not all(isinstance(task, BloqadeTask) for task in tasks):
+        return None
+
+    return task_costs([task.emulator_ir for task in tasks])
+
+
+def _run_tasks(tasks, kwargs):
+    """Run a chunk of the tasks of a `LocalBatch` in a worker process."""
+    return [task.run(**kwargs) for task in tasks]
+
+
+def _without_results(task):
+    # the previous results are not sent to the workers
+    if isinstance(task, BloqadeTask):
+        return dataclasses.replace(task, task_result_ir=None, probabilities=None)
+
+    return task
+
+
+def _run_local_task(task, kwargs):
+    """Run a task of a `LocalBatch` in a worker of an `EmulatorPool`, only the
+    results of a `BloqadeTask` are sent back."""
+    if not isinstance(task, BloqadeTask):
+        return task.run(**kwargs)
+
+    if task.compile_cache is None:
+        task.compile_cache = worker_compile_cache()
+
+    if worker_num_threads() is not None:
+        kwargs = {**kwargs, "num_threads": worker_num_threads()}
+
+    task.run(**kwargs)
+    return task.task_result_ir, task.probabilities
+
+
 @LocalBatch.set_serializer
 def _serialize(obj: LocalBatch) -> Dict[str, Any]:
     return {
@@ -526,9 +690,14 @@ class RemoteBatch(Serializable, Filter):
                     stack_trace=traceback.format_exc(),
                 )
 
-                task.task_result_ir = QuEraTaskResults(
-                    task_status=QuEraTaskStatusCode.Unaccepted
-                )
+                if isinstance(task, QuEraTask):
+                    task.task_result_ir = ColumnarTaskResults.from_status(
+                        QuEraTaskStatusCode.Unaccepted
+                    )
+                else:
+                    task.task_result_ir = QuEraTaskResults(
+                        task_status=QuEraTaskStatusCode.Unaccepted
+                    )
 
         self.tasks = shuffled_tasks  # permute order using dump way
 
@@ -723,8 +892,7 @@ class RemoteBatch(Serializable, Filter):
         """
         ## this potentially can be specialize/disatch
         ## offline
-        index = []
-        data = []
+        rows = _ReportRows()
         metas = []
         geos = []
 
@@ -740,58 +908,15 @@ class RemoteBatch(Serializable, Filter):
             ]:
                 continue
 
-            geometry = task.geometry
-            perfect_sorting = "".join(map(str, geometry.filling))
-            parallel_decoder = geometry.parallel_decoder
-
-            if parallel_decoder:
-                cluster_indices = parallel_decoder.get_cluster_indices()
-            else:
-                cluster_indices = {(0, 0): list(range(len(perfect_sorting)))}
-
-            shot_iter = filter(
-                lambda shot: shot.shot_status == QuEraShotStatusCode.Completed,
-                task.result().shot_outputs,
+            rows.add(
+                task_number,
+                task.geometry,
+                task._columnar_result(),
             )
-
-            for shot, (cluster_coordinate, cluster_index) in product(
-                shot_iter, cluster_indices.items()
-            ):
-                pre_sequence = "".join(
-                    map(
-                        str,
-                        (shot.pre_sequence[index] for index in cluster_index),
-                    )
-                )
-
-                post_sequence = np.asarray(
-                    [shot.post_sequence[index] for index in cluster_index],
-                    dtype=np.int8,
-                )
-
-                pfc_sorting = "".join(
-                    [perfect_sorting[index] for index in cluster_index]
-                )
-
-                key = (
-                    task_number,
-                    cluster_coordinate,
-                    pfc_sorting,
-                    pre_sequence,
-                )
-
-                index.append(key)
-                data.append(post_sequence)
-
             metas.append(task.metadata)
             geos.append(task.geometry)
 
-        index = pd.MultiIndex.from_tuples(
-            index, names=["task_number", "cluster", "perfect_sorting", "pre_sequence"]
-        )
-
-        df = pd.DataFrame(data, index=index)
-        df.sort_index(axis="index")
+        df, _ = rows.build()
 
         rept = None
         if self.name is None:
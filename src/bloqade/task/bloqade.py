@@ -8,12 +8,10 @@ from bloqade.emulate.codegen.hamiltonian import (
 from bloqade.emulate.ir.state_vector import AnalogGate
 
 from bloqade.submission.ir.task_results import (
+    ColumnarTaskResults,
     QuEraTaskResults,
-    QuEraShotResult,
-    QuEraTaskStatusCode,
-    QuEraShotStatusCode,
 )
-from beartype.typing import Dict, Any
+from beartype.typing import Dict, Any, List
 from bloqade.builder.base import ParamType
 from dataclasses import dataclass
 from typing import Optional
@@ -27,12 +25,20 @@ class BloqadeTask(LocalTask):
     emulator_ir: EmulatorProgram
     metadata: Dict[str, ParamType]
     compile_cache: Optional[CompileCache] = None
-    task_result_ir: Optional[QuEraTaskResults] = None
+    task_result_ir: Optional[ColumnarTaskResults] = None
+    # probabilities of the shots of an exact run, see `run`
+    probabilities: Optional[List[float]] = None
 
     def _geometry(self) -> Geometry:
         return self.emulator_ir.register.geometry
 
-    def result(self) -> QuEraTaskResults:
+    def result(self) -> Optional[QuEraTaskResults]:
+        if self.task_result_ir is None:
+            return None
+
+        return self.task_result_ir.to_task_results()
+
+    def _columnar_result(self) -> Optional[ColumnarTaskResults]:
         return self.task_result_ir
 
     @property
@@ -46,7 +52,16 @@ class BloqadeTask(LocalTask):
         rtol: float = 1e-7,
         nsteps: int = 2_147_483_647,
         interaction_picture: bool = False,
+        num_threads: int = 1,
+        single_precision: bool = False,
+        exact: bool = False,
     ) -> "BloqadeTask":
+        """Run the emulation of the task and store its shots.
+
+        If `exact`, the shots are the distinct outcomes of the measurement of
+        the final state instead of samples, their probabilities are stored in
+        `probabilities` and the report computes exact values from them.
+        """
 
         hamiltonian = RydbergHamiltonianCodeGen(self.compile_cache).emit(
             self.emulator_ir
@@ -58,30 +73,30 @@ class BloqadeTask(LocalTask):
             nsteps=nsteps,
             interaction_picture=interaction_picture,
         )
-        shots_array = AnalogGate(hamiltonian).run(
-            self.shots, project_hyperfine=True, **options
+        gate = AnalogGate(
+            hamiltonian, num_threads=num_threads, single_precision=single_precision
         )
 
-        geometry = self.emulator_ir.register.geometry
-
-        filling = np.asarray(geometry.filling, dtype=int)
-        full_shot = np.zeros_like(filling, dtype=int)
+        if exact:
+            shots_array, probabilities = gate.distribution(
+                project_hyperfine=True, **options
+            )
+            self.probabilities = probabilities.tolist()
+        else:
+            shots_array = gate.run(self.shots, project_hyperfine=True, **options)
+            self.probabilities = None
 
-        shot_outputs = []
-        for shot in shots_array[:]:
-            # flip the bits so that 1 = ground state and 0 = excited state
-            # and scatter shot results into the full shot array according to the filling
-            full_shot[filling == 1] = 1 - shot
+        geometry = self.emulator_ir.register.geometry
 
-            shot_result = QuEraShotResult(
-                shot_status=QuEraShotStatusCode.Completed,
-                pre_sequence=filling.tolist(),
-                post_sequence=full_shot.tolist(),
-            )
-            shot_outputs.append(shot_result)
+        filling = np.asarray(geometry.filling, dtype=np.uint8)
+        pre_sequences = np.tile(filling, (shots_array.shape[0], 1))
+        post_sequences = np.zeros_like(pre_sequences)
+        # flip the bits so that 1 = ground state and 0 = excited state
+        # and scatter shot results into the full shot array according to the filling
+        post_sequences[:, filling == 1] = 1 - shots_array
 
-        self.task_result_ir = QuEraTaskResults(
-            task_status=QuEraTaskStatusCode.Completed, shot_outputs=shot_outputs
+        self.task_result_ir = ColumnarTaskResults.from_completed_shots(
+            pre_sequences, post_sequences
         )
 
         return self
@@ -94,12 +109,19 @@ def _serialize(obj: BloqadeTask) -> Dict[str, Any]:
         "emulator_ir": obj.emulator_ir,
         "metadata": obj.metadata,
         "task_result_ir": obj.task_result_ir.dict() if obj.task_result_ir else None,
+        "probabilities": obj.probabilities,
     }
 
 
 @BloqadeTask.set_deserializer
 def _deserialize(d: Dict[str, Any]) -> BloqadeTask:
     d["task_result_ir"] = (
-        QuEraTaskResults(**d["task_result_ir"]) if d["task_result_ir"] else None
+        ColumnarTaskResults.from_dict(d["task_result_ir"])
+        if d["task_result_ir"]
+        else None
     )
+    if d.get("probabilities") is not None:
+        # numbers are deserialized as decimals
+        d["probabilities"] = list(map(float, d["probabilities"]))
+
     return BloqadeTask(**d)
@@ -4,7 +4,11 @@ from bloqade.task.base import Geometry
 from bloqade.task.base import RemoteTask
 
 from bloqade.submission.base import ValidationError
-from bloqade.submission.ir.task_results import QuEraTaskResults, QuEraTaskStatusCode
+from bloqade.submission.ir.task_results import (
+    ColumnarTaskResults,
+    QuEraTaskResults,
+    QuEraTaskStatusCode,
+)
 from bloqade.submission.ir.task_specification import QuEraTaskSpecification
 from bloqade.submission.ir.parallel import ParallelDecoder
 from bloqade.submission.quera import QuEraBackend
@@ -23,9 +27,9 @@ class QuEraTask(RemoteTask):
     task_ir: QuEraTaskSpecification
     metadata: Dict[str, ParamType]
     parallel_decoder: Optional[ParallelDecoder] = None
-    task_result_ir: QuEraTaskResults = field(
-        default_factory=lambda: QuEraTaskResults(
-            task_status=QuEraTaskStatusCode.Unsubmitted
+    task_result_ir: ColumnarTaskResults = field(
+        default_factory=lambda: ColumnarTaskResults.from_status(
+            QuEraTaskStatusCode.Unsubmitted
         )
     )
 
@@ -38,7 +42,9 @@ class QuEraTask(RemoteTask):
 
         self.task_id = self.backend.submit_task(self.task_ir)
 
-        self.task_result_ir = QuEraTaskResults(task_status=QuEraTaskStatusCode.Enqueued)
+        self.task_result_ir = ColumnarTaskResults.from_status(
+            QuEraTaskStatusCode.Enqueued
+        )
 
         return self
 
@@ -66,9 +72,9 @@ class QuEraTask(RemoteTask):
 
         status = self.status()
         if status in [QuEraTaskStatusCode.Completed, QuEraTaskStatusCode.Partial]:
-            self.task_result_ir = self.backend.task_results(self.task_id)
+            self.task_result_ir = self._task_results()
         else:
-            self.task_result_ir = QuEraTaskResults(task_status=status)
+            self.task_result_ir = ColumnarTaskResults.from_status(status)
 
         return self
 
@@ -77,13 +83,22 @@ class QuEraTask(RemoteTask):
         if self.task_id is None:
             raise ValueError("Task ID not found.")
 
-        self.task_result_ir = self.backend.task_results(self.task_id)
+        self.task_result_ir = self._task_results()
 
         return self
 
+    def _task_results(self) -> ColumnarTaskResults:
+        return ColumnarTaskResults.from_task_results(
+            self.backend.task_results(self.task_id)
+        )
+
     def result(self) -> QuEraTaskResults:
         # blocking, caching
+        results = self._columnar_result()
+        return None if results is None else results.to_task_results()
 
+    def _columnar_result(self) -> Optional[ColumnarTaskResults]:
+        # the results are stored as columns, see `ColumnarTaskResults`
         if self.task_result_ir is None:
             pass
         else:
@@ -157,7 +172,9 @@ def _serialze(obj: QuEraTask) -> Dict[str, ParamType]:
 def _deserializer(d: Dict[str, Any]) -> QuEraTask:
     d["task_ir"] = QuEraTaskSpecification(**d["task_ir"])
     d["task_result_ir"] = (
-        QuEraTaskResults(**d["task_result_ir"]) if d["task_result_ir"] else None
+        ColumnarTaskResults.from_dict(d["task_result_ir"])
+        if d["task_result_ir"]
+        else None
     )
     d["backend"] = (
         QuEraBackend(**d["backend"]["QuEraBackend"])
@@ -0,0 +1,184 @@
+from bloqade.atom_arrangement import Chain
+import bloqade
+from bloqade.emulate.codegen.cache import (
+    ObjectStore,
+    PersistentCompileCache,
+    SharedCompileCache,
+)
+import bloqade.emulate.codegen.cache as cache_module
+from bloqade.emulate.codegen.hamiltonian import (
+    CompileCache,
+    RydbergHamiltonianCodeGen,
+)
+import numpy as np
+import gc
+import os
+import pickle
+import pytest
+import time
+
+
+def get_program(n_atoms=4):
+    return (
+        Chain(n_atoms, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.constant("detuning", 1.0)
+        .location(0, 0.5)
+        .constant(1.0, 1.0)
+        .rabi.amplitude.uniform.constant(15.0, 1.0)
+        .location(1, 0.5)
+        .constant(2.0, 1.0)
+        .batch_assign(detuning=[-1.0, 1.0])
+    )
+
+
+def matrices(hamiltonian):
+    ops = [op.op for op in hamiltonian.rabi_ops]
+    return (
+        [hamiltonian.space.configurations, hamiltonian.rydberg]
+        + [op.diagonal for op in hamiltonian.detuning_ops]
+        + [op.tocsr().toarray() for op in ops]
+    )
+
+
+@pytest.mark.parametrize("blockade_radius", [0.0, 6.2])
+def test_shared_compile_cache(blockade_radius, monkeypatch):
+    # map all the arrays
+    monkeypatch.setattr(cache_module, "MIN_MAPPED_BYTES", 1)
+    emulations = get_program().bloqade.python().hamiltonian(
+        blockade_radius=blockade_radius
+    )
+    programs = [emulation.task_data.emulator_ir for emulation in emulations]
+
+    cache = SharedCompileCache()
+    directory = cache.directory
+    for program in programs:
+        expected = RydbergHamiltonianCodeGen(CompileCache()).emit(program)
+        result = RydbergHamiltonianCodeGen(cache).emit(program)
+
+        for expected_matrix, matrix in zip(matrices(expected), matrices(result)):
+            np.testing.assert_array_equal(expected_matrix, matrix)
+
+    # the copies of the cache share the stores of the process
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.directory == directory
+    assert copy.operator_cache is cache.operator_cache
+
+    # a new store maps the arrays from the files
+    space_store = ObjectStore(cache.space_cache.directory)
+    operator_store = ObjectStore(cache.operator_cache.directory)
+    for program in programs:
+        codegen = RydbergHamiltonianCodeGen()
+        codegen.compile_cache.space_cache = space_store
+        codegen.compile_cache.operator_cache = operator_store
+        hamiltonian = codegen.emit(program)
+
+        assert isinstance(hamiltonian.space.configurations.base, np.memmap)
+        expected = RydbergHamiltonianCodeGen(CompileCache()).emit(program)
+        for expected_matrix, matrix in zip(matrices(expected), matrices(hamiltonian)):
+            np.testing.assert_array_equal(expected_matrix, matrix)
+
+    del cache, copy, codegen, hamiltonian, space_store, operator_store
+    gc.collect()
+    assert not os.path.exists(directory)
+
+
+def test_shared_compile_cache_multiprocessing():
+    routine = get_program().bloqade.python()
+
+    expected = routine.run(1, blockade_radius=6.2, exact=True)
+    batch = routine.run(
+        1,
+        blockade_radius=6.2,
+        exact=True,
+        cache_matrices=True,
+        multiprocessing=True,
+        num_workers=2,
+    )
+
+    compile_cache = batch.tasks[0].compile_cache
+    assert isinstance(compile_cache, SharedCompileCache)
+    assert len(os.listdir(compile_cache.space_cache.directory)) == 1
+
+    for expected_task, task in zip(expected.tasks.values(), batch.tasks.values()):
+        np.testing.assert_allclose(task.probabilities, expected_task.probabilities)
+
+
+def test_persistent_compile_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "MIN_MAPPED_BYTES", 1)
+    routine = get_program().bloqade.python()
+    (program, _) = [
+        emulation.task_data.emulator_ir
+        for emulation in routine.hamiltonian(blockade_radius=6.2)
+    ]
+    expected = RydbergHamiltonianCodeGen().emit(program)
+
+    cache = PersistentCompileCache(str(tmp_path))
+    assert cache.entries() == []
+
+    RydbergHamiltonianCodeGen(cache).emit(program)
+    entries = cache.entries()
+    assert sorted(entry.kind for entry in entries) == ["operators"] * 4 + ["spaces"]
+    assert cache.size() == sum(entry.size for entry in entries) > 0
+
+    # a new session maps the stored matrices
+    hamiltonian = RydbergHamiltonianCodeGen(
+        PersistentCompileCache(str(tmp_path))
+    ).emit(program)
+    assert isinstance(hamiltonian.space.configurations.base, np.memmap)
+    for expected_matrix, matrix in zip(matrices(expected), matrices(hamiltonian)):
+        np.testing.assert_array_equal(expected_matrix, matrix)
+
+    # the entries are evicted least recently used first
+    (space_entry,) = [entry for entry in entries if entry.kind == "spaces"]
+    time.sleep(0.01)
+    PersistentCompileCache(str(tmp_path)).space_cache[
+        (program.register, None)
+    ]
+    assert cache.entries()[-1].name == space_entry.name
+
+    cache.evict(max_size=space_entry.size)
+    assert [entry.name for entry in cache.entries()] == [space_entry.name]
+
+    cache.clear()
+    assert cache.entries() == []
+
+    batch = routine.run(1, blockade_radius=6.2, exact=True, cache_matrices=cache)
+    expected_batch = routine.run(1, blockade_radius=6.2, exact=True)
+    assert len(cache.entries()) == 5
+    for expected_task, task in zip(expected_batch.tasks.values(), batch.tasks.values()):
+        np.testing.assert_allclose(task.probabilities, expected_task.probabilities)
+
+
+def test_persistent_compile_cache_invalid_entries(tmp_path):
+    routine = get_program().bloqade.python()
+    (program, _) = [
+        emulation.task_data.emulator_ir
+        for emulation in routine.hamiltonian(blockade_radius=6.2)
+    ]
+    expected = RydbergHamiltonianCodeGen().emit(program)
+
+    cache = PersistentCompileCache(str(tmp_path))
+    RydbergHamiltonianCodeGen(cache).emit(program)
+    assert bloqade.__version__ in os.path.relpath(cache._path("spaces"), tmp_path)
+
+    # entries that can not be unpickled are misses and are stored again
+    (space_entry,) = [entry for entry in cache.entries() if entry.kind == "spaces"]
+    object_path = os.path.join(cache._path("spaces"), space_entry.name, "object.pkl")
+    with open(object_path, "wb") as file:
+        file.write(b"not a pickle")
+
+    new_cache = PersistentCompileCache(str(tmp_path))
+    with pytest.raises(KeyError):
+        new_cache.space_cache[(program.register, None)]
+
+    hamiltonian = RydbergHamiltonianCodeGen(new_cache).emit(program)
+    for expected_matrix, matrix in zip(matrices(expected), matrices(hamiltonian)):
+        np.testing.assert_array_equal(expected_matrix, matrix)
+
+    new_cache = PersistentCompileCache(str(tmp_path))
+    assert (program.register, None) in new_cache.space_cache
+
+    # entries of other versions are removed with the cache
+    os.makedirs(os.path.join(tmp_path, "v0", "spaces"))
+    new_cache.clear()
+    assert os.listdir(tmp_path) == []
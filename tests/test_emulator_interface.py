@@ -1,6 +1,7 @@
 import pytest
 from bloqade import start
 from bloqade.atom_arrangement import Chain
+from bloqade.emulate.ir.state_vector import StateVector
 import numpy as np
 from itertools import product
 from math import isclose
@@ -96,3 +97,346 @@ def test_solution(N: int, phi: float, interaction: bool):
         ), f"failed variance_2 at time {time}"
 
     # assert False
+
+
+@pytest.mark.parametrize("N", [1, 2, 3, 4])
+def test_krylov_solution(N: int):
+    program = (
+        Chain(N, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.piecewise_linear([0.5, 1.0, 0.5], [-5, -5, 5, 5])
+        .amplitude.uniform.piecewise_linear([0.5, 1.0, 0.5], [0, 15, 15, 0])
+        .phase.uniform.piecewise_constant([1.0, 1.0], [0.0, 0.5])
+    )
+
+    [emu] = program.bloqade.python().hamiltonian()
+
+    times = np.linspace(0, 2, 11)
+    expected = emu.evolve(times=times, atol=1e-12, rtol=1e-14)
+    result = emu.evolve(times=times, atol=1e-10, rtol=1e-14, solver_name="krylov")
+
+    for expected_state, state in zip(expected, result):
+        assert np.linalg.norm(expected_state.data - state.data) < 1e-7
+
+
+def test_krylov_interaction_picture():
+    [emu] = (
+        Chain(2, lattice_spacing=6.1)
+        .rydberg.rabi.amplitude.uniform.constant(15.0, 1.0)
+        .bloqade.python()
+        .hamiltonian()
+    )
+
+    with pytest.raises(ValueError):
+        list(emu.evolve(solver_name="krylov", interaction_picture=True))
+
+
+@pytest.mark.parametrize("N", [1, 2, 3])
+def test_jit_dopri5_solution(N: int):
+    program = (
+        Chain(N, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.piecewise_linear([0.5, 1.0, 0.5], [-5, -5, 5, 5])
+        .detuning.location(0, 0.5)
+        .piecewise_linear([0.5, 1.0, 0.5], [0, 1, 1, 0])
+        .amplitude.uniform.piecewise_linear([0.5, 1.0, 0.5], [0, 15, 15, 0])
+        .phase.uniform.piecewise_constant([1.0, 1.0], [0.0, 0.5])
+        .hyperfine.rabi.amplitude.uniform.constant(3.0, 2.0)
+    )
+
+    [emu] = program.bloqade.python().hamiltonian()
+
+    times = np.linspace(0, 2, 11)
+    expected = emu.evolve(times=times, atol=1e-12, rtol=1e-14)
+    result = emu.evolve(times=times, atol=1e-10, rtol=1e-14, solver_name="jit_dopri5")
+
+    for expected_state, state in zip(expected, result):
+        assert np.linalg.norm(expected_state.data - state.data) < 1e-7
+
+    states = np.stack(
+        [emu.zero_state().data, emu.fock_state("r" * N).data], axis=1
+    )
+    expected = emu.evolve_batch(states, times=times, atol=1e-12, rtol=1e-14)
+    result = emu.evolve_batch(
+        states, times=times, atol=1e-10, rtol=1e-14, solver_name="jit_dopri5"
+    )
+
+    for expected_states, states in zip(expected, result):
+        assert np.linalg.norm(expected_states - states) < 1e-7
+
+
+def test_jit_dopri5_errors():
+    [emu] = (
+        Chain(2, lattice_spacing=6.1)
+        .rydberg.rabi.amplitude.uniform.constant(15.0, 1.0)
+        .bloqade.python()
+        .hamiltonian()
+    )
+
+    with pytest.raises(ValueError):
+        list(emu.evolve(solver_name="jit_dopri5", interaction_picture=True))
+
+    with pytest.raises(ValueError):
+        list(emu.evolve(solver_name="jit_dopri5", times=[0.5, 0.1]))
+
+    with pytest.raises(RuntimeError):
+        list(emu.evolve(solver_name="jit_dopri5", nsteps=2))
+
+
+def test_compiled_coefficients_params():
+    emulations = (
+        Chain(2, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.constant("detuning", 1.0)
+        .rabi.amplitude.uniform.constant(15.0, 1.0)
+        .phase.uniform.constant("phase", 1.0)
+        .batch_assign(detuning=[1.0, 2.0], phase=[0.5, 1.5])
+        .bloqade.python()
+        .hamiltonian()
+    )
+    first, second = [emu.hamiltonian.compiled_coefficients for emu in emulations]
+
+    # the values of the waveforms are arguments of the compiled function
+    assert not np.array_equal(first.params, second.params)
+    diag_coeffs = np.zeros(1)
+    term_coeffs = np.zeros(2, dtype=np.complex128)
+    first.function(0.5, second.params, diag_coeffs, term_coeffs)
+
+    np.testing.assert_allclose(diag_coeffs, [2.0])
+    rabi = 7.5 * np.exp(1.5j)
+    np.testing.assert_allclose(term_coeffs, [rabi, np.conj(rabi)])
+
+
+def test_compiled_coefficients_reuse():
+    routine = (
+        Chain(2, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.piecewise_linear([0.5, 0.5], [0, "detuning", 0])
+        .rabi.amplitude.uniform.constant("rabi", 1.0)
+        .batch_assign(detuning=[1.0, 2.0], rabi=[10.0, 15.0])
+        .bloqade.python()
+    )
+    first, second = [
+        emu.hamiltonian.compiled_coefficients for emu in routine.hamiltonian()
+    ]
+
+    # tasks differing only in the values of their waveforms share the function
+    assert first.function is second.function
+    assert not np.array_equal(first.params, second.params)
+
+    batch = routine.run(1, exact=True, solver_name="jit_dopri5")
+    expected = routine.run(1, exact=True, atol=1e-10, rtol=1e-10)
+    for expected_task, task in zip(expected.tasks.values(), batch.tasks.values()):
+        np.testing.assert_allclose(
+            task.probabilities, expected_task.probabilities, atol=1e-5
+        )
+
+
+def test_single_precision():
+    program = (
+        Chain(3, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.piecewise_linear([0.5, 1.0, 0.5], [-5, -5, 5, 5])
+        .amplitude.uniform.piecewise_linear([0.5, 1.0, 0.5], [0, 15, 15, 0])
+        .phase.uniform.piecewise_constant([1.0, 1.0], [0.0, 0.5])
+    )
+
+    [emu] = program.bloqade.python().hamiltonian()
+
+    times = np.linspace(0, 2, 11)
+    expected = emu.evolve(times=times, atol=1e-10, rtol=1e-10, solver_name="jit_dopri5")
+    result = emu.evolve(
+        times=times,
+        atol=1e-10,
+        rtol=1e-10,
+        solver_name="jit_dopri5",
+        single_precision=True,
+    )
+
+    for expected_state, state in zip(expected, result):
+        assert state.data.dtype == np.complex64
+        assert np.linalg.norm(expected_state.data - state.data) < 1e-5
+
+    with pytest.raises(ValueError):
+        list(emu.evolve(solver_name="dop853", single_precision=True))
+
+
+def test_constant_segments():
+    program = (
+        Chain(3, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.piecewise_linear([0.2, 1.0, 0.2], [-5, 5, 5, 5])
+        .amplitude.uniform.piecewise_linear([0.2, 1.0, 0.2], [0, 15, 15, 0])
+        .phase.uniform.piecewise_constant([0.7, 0.7], [0.0, 0.5])
+    )
+
+    [emu] = program.bloqade.python().hamiltonian()
+
+    hamiltonian = emu.hamiltonian
+    assert np.allclose(hamiltonian.breakpoints, [0.0, 0.2, 0.7, 1.2, 1.4])
+    assert hamiltonian.constant_segments.tolist() == [False, True, True, False]
+    assert hamiltonian.segments(0.1, 1.0) == [
+        (0.1, 0.2, False),
+        (0.2, 0.7, True),
+        (0.7, 1.0, True),
+    ]
+
+    times = np.linspace(0, 1.4, 8)
+    # the interaction picture always integrates the ODE
+    expected = emu.evolve(
+        times=times, atol=1e-12, rtol=1e-14, interaction_picture=True
+    )
+    result = emu.evolve(times=times, atol=1e-10, rtol=1e-10)
+
+    for expected_state, state in zip(expected, result):
+        assert np.linalg.norm(expected_state.data - state.data) < 1e-7
+
+
+@pytest.mark.parametrize(
+    ["solver_name", "interaction"],
+    [("dop853", False), ("dop853", True), ("krylov", False)],
+)
+def test_evolve_batch(solver_name: str, interaction: bool):
+    program = (
+        Chain(3, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.piecewise_linear([0.2, 1.0, 0.2], [-5, 5, 5, 5])
+        .amplitude.uniform.piecewise_linear([0.2, 1.0, 0.2], [0, 15, 15, 0])
+    )
+
+    [emu] = program.bloqade.python().hamiltonian()
+
+    fock_states = ["ggg", "rgr", "grg"]
+    states = np.stack(
+        [emu.fock_state(fock_state, np.complex128).data for fock_state in fock_states],
+        axis=1,
+    )
+    times = np.linspace(0, 1.4, 5)
+    options = dict(
+        solver_name=solver_name,
+        atol=1e-12,
+        rtol=1e-12,
+        times=times,
+        interaction_picture=interaction,
+    )
+
+    space = emu.hamiltonian.space
+    expected = [
+        [state.data for state in emu.evolve(StateVector(column, space), **options)]
+        for column in states.T
+    ]
+
+    for i, result in enumerate(emu.evolve_batch(states, **options)):
+        assert result.shape == states.shape
+        for k, column in enumerate(result.T):
+            assert np.linalg.norm(column - expected[k][i]) < 1e-8
+
+    with pytest.raises(ValueError):
+        emu.evolve_batch(states[:-1])
+
+
+def test_num_threads():
+    program = (
+        Chain(4, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.piecewise_linear([0.2, 1.0, 0.2], [-5, 5, 5, 5])
+        .amplitude.uniform.piecewise_linear([0.2, 1.0, 0.2], [0, 15, 15, 0])
+    )
+
+    [emu] = program.bloqade.python().hamiltonian()
+
+    for solver_name in ["dop853", "krylov", "jit_dopri5"]:
+        (expected,) = emu.evolve(solver_name=solver_name, atol=1e-10, rtol=1e-10)
+        (result,) = emu.evolve(
+            solver_name=solver_name, atol=1e-10, rtol=1e-10, num_threads=2
+        )
+        assert np.allclose(result.data, expected.data)
+
+    batch = program.bloqade.python().run(10, num_threads=2)
+    assert len(batch.report().bitstrings()[0]) == 10
+
+
+def test_num_threads_restored(monkeypatch):
+    import bloqade.emulate.sparse_operator as sparse_operator
+    import numba
+
+    [emu] = (
+        Chain(3, lattice_spacing=6.1)
+        .rydberg.rabi.amplitude.uniform.piecewise_linear([0.2, 0.6], [0, 15, 15])
+        .bloqade.python()
+        .hamiltonian()
+    )
+
+    calls = []
+
+    def set_num_threads(num_threads):
+        calls.append(num_threads)
+        numba.set_num_threads(num_threads)
+
+    monkeypatch.setattr(sparse_operator, "set_num_threads", set_num_threads)
+    previous = numba.get_num_threads()
+
+    times = [0.2, 0.5, 0.8]
+    for solver_name in ["dop853", "krylov", "jit_dopri5"]:
+        calls.clear()
+        states = list(emu.evolve(times=times, solver_name=solver_name, num_threads=2))
+
+        # set around the evolution of each state, not each product with H
+        assert len(states) == 3
+        assert calls == [sparse_operator.numba_thread_count(2), previous] * 4
+        assert numba.get_num_threads() == previous
+
+
+@pytest.mark.parametrize("solver_name", ["dop853", "jit_dopri5"])
+def test_observe(solver_name, monkeypatch):
+    import bloqade.emulate.dormand_prince as dormand_prince
+    from bloqade.emulate.ir.observables import (
+        Correlation,
+        Density,
+        DiagonalOperator,
+        Energy,
+    )
+
+    program = (
+        Chain(4, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.piecewise_linear([0.2, 1.0, 0.2], [-5, -5, 5, 5])
+        .amplitude.uniform.piecewise_linear([0.2, 1.0, 0.2], [0, 15, 15, 0])
+    )
+    [emu] = program.bloqade.python().hamiltonian(blockade_radius=7.0)
+
+    # integrate the times in several chunks
+    size = emu.hamiltonian.space.size
+    monkeypatch.setattr(dormand_prince, "MAX_OUTPUT_SIZE", 3 * size)
+
+    diagonal = np.random.normal(size=size)
+    observables = [
+        Energy(),
+        Density(0),
+        Correlation(0, 2),
+        Density(1, "g"),
+        DiagonalOperator(diagonal),
+    ]
+    times = np.linspace(0, 1.4, 11)
+    options = dict(times=times, solver_name=solver_name, atol=1e-10)
+
+    values = emu.observe(observables, **options)
+    assert values.shape == (11, 5)
+
+    expected_states = emu.evolve(times=times, atol=1e-10)
+    for row, time, state in zip(values, times, expected_states):
+        correlations = state.density_correlations()
+        expected = [
+            emu.hamiltonian.average(state, time),
+            correlations[0, 0],
+            correlations[0, 2],
+            state.densities("g")[1],
+            np.abs(state.data) ** 2 @ diagonal,
+        ]
+        assert np.allclose(row, expected, atol=1e-6)
+
+    (result,) = program.bloqade.python().run_callback(
+        lambda values, *_: values,
+        observables=observables[:4],
+        times=times.tolist(),
+        blockade_radius=7.0,
+        **{key: value for key, value in options.items() if key != "times"},
+    )
+    assert np.allclose(result, values[:, :4], atol=1e-6)
+
+    with pytest.raises(ValueError):
+        emu.observe([Density(4)])
+
+    with pytest.raises(ValueError):
+        emu.observe([DiagonalOperator(diagonal[1:])])
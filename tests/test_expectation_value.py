@@ -296,3 +296,49 @@ def test_errors():
         .bloqade.python()
         .run_callback(callback=error_tests)
     )
+
+
+@pytest.mark.parametrize("atom_type", [TwoLevelAtom, ThreeLevelAtom])
+def test_batched_observables(atom_type):
+    from bloqade.task.base import Geometry
+    from bloqade.emulate.ir.state_vector import StateVector
+
+    sites = [(0.0, 0.0), (0.0, 1.0), (0.0, 5.0), (4.0, 0.0)]
+    geometry = Geometry(sites[:2] + [(0.0, 2.0)] + sites[2:], [1, 1, 0, 1, 1])
+    space = Space.create(Register(atom_type, sites, Decimal("1.0"), geometry))
+
+    psi = np.random.normal(size=space.size) + 1j * np.random.normal(size=space.size)
+    state = StateVector(psi / np.linalg.norm(psi), space)
+
+    n_level = atom_type.n_level
+    density_op = np.zeros((n_level, n_level))
+    density_op[-1, -1] = 1
+    filled = [0, 1, 3, 4]
+
+    correlations = state.density_correlations()
+    assert np.isnan(correlations[2]).all() and np.isnan(correlations[:, 2]).all()
+    np.testing.assert_allclose(
+        state.densities()[filled],
+        [state.local_trace(density_op, i).real for i in filled],
+    )
+    for i, j in product(filled, filled):
+        if i != j:
+            expected = state.local_trace(np.kron(density_op, density_op), (i, j))
+            np.testing.assert_almost_equal(correlations[i, j], expected.real)
+
+    operators = []
+    for i, j in product(filled, filled):
+        shape = (n_level, n_level) if i == j else (n_level**2, n_level**2)
+        operators.append((np.random.normal(size=shape), i if i == j else (i, j)))
+
+    expected = [state.local_trace(op, site) for op, site in operators]
+    np.testing.assert_allclose(state.local_traces(operators), expected, atol=1e-12)
+
+    with pytest.raises(ValueError):
+        state.local_traces([(density_op, 2)])
+
+    with pytest.raises(ValueError):
+        state.local_traces([(density_op, (0, 1))])
+
+    with pytest.raises(ValueError):
+        state.densities("x")
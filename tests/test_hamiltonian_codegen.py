@@ -1114,3 +1114,44 @@ def test_3_level_multi_atom_complex(sites, L):
     rabi_op_proj = project_to_subspace(rabi, hamiltonian.space.configurations)
 
     assert np.all(hamiltonian.rabi_ops[0].op.tocsr().toarray() == rabi_op_proj)
+
+
+@pytest.mark.parametrize("L", L_VALUES)
+@pytest.mark.parametrize("use_hyperfine", [False, True])
+@pytest.mark.parametrize("interaction_cutoff", [None, 9.0])
+def test_rydberg_interaction(L, use_hyperfine, interaction_cutoff):
+    from bloqade.constants import RB_C6
+
+    program = Chain(L, lattice_spacing=4.5).rydberg.detuning.uniform.constant(1.0, 1.0)
+    rydberg_op = np.array([0, 0, 1] if use_hyperfine else [0, 1], dtype=int)
+
+    interaction = np.zeros(rydberg_op.size**L)
+    for i, j in combinations(range(L), 2):
+        distance = 4.5 * (j - i)
+        if interaction_cutoff is None or distance <= interaction_cutoff:
+            interaction += (
+                RB_C6
+                / distance**6
+                * get_manybody_op(i, L, rydberg_op)
+                * get_manybody_op(j, L, rydberg_op)
+            )
+
+    (hamiltonian_data,) = program.bloqade.python().hamiltonian(
+        use_hyperfine=use_hyperfine, interaction_cutoff=interaction_cutoff
+    )
+    hamiltonian = hamiltonian_data.hamiltonian
+
+    assert np.allclose(hamiltonian.rydberg, interaction, rtol=1e-12, atol=0)
+
+    (hamiltonian_data,) = program.bloqade.python().hamiltonian(
+        blockade_radius=5.0,
+        use_hyperfine=use_hyperfine,
+        interaction_cutoff=interaction_cutoff,
+    )
+    hamiltonian = hamiltonian_data.hamiltonian
+
+    interaction_proj = project_to_subspace(
+        interaction, hamiltonian.space.configurations
+    )
+
+    assert np.allclose(hamiltonian.rydberg, interaction_proj, rtol=1e-12, atol=0)
@@ -0,0 +1,77 @@
+from bloqade.atom_arrangement import Chain
+from bloqade.emulate.pool import EmulatorPool
+import numpy as np
+import pytest
+
+
+def get_program():
+    return (
+        Chain(3, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.constant("detuning", 0.5)
+        .rabi.amplitude.uniform.constant(15.0, 0.5)
+        .batch_assign(detuning=[-1.0, 0.0, 1.0, 2.0])
+        .bloqade.python()
+    )
+
+
+def callback(register, metadata, *_):
+    return metadata.detuning, register.data
+
+
+def callback_exception(*_):
+    raise ValueError
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with EmulatorPool(num_workers=2, chunksize=1, warmup=False) as pool:
+        yield pool
+
+
+def test_pool_run(pool):
+    routine = get_program()
+    expected = routine.run(1, exact=True)
+
+    # the pool is reused between the calls
+    for _ in range(2):
+        batch = routine.run(1, exact=True, pool=pool)
+        for expected_task, task in zip(expected.tasks.values(), batch.tasks.values()):
+            assert task.task_result_ir is not None
+            np.testing.assert_allclose(task.probabilities, expected_task.probabilities)
+
+    batch.rerun(exact=True, pool=pool)
+    for expected_task, task in zip(expected.tasks.values(), batch.tasks.values()):
+        np.testing.assert_allclose(task.probabilities, expected_task.probabilities)
+
+    with pytest.raises(ValueError):
+        batch.rerun(num_workers=2, pool=pool)
+
+
+def test_pool_run_callback(pool):
+    routine = get_program()
+    expected = routine.run_callback(callback)
+    results = routine.run_callback(callback, pool=pool)
+
+    assert [detuning for detuning, _ in results] == [-1.0, 0.0, 1.0, 2.0]
+    for (_, expected_data), (_, data) in zip(expected, results):
+        np.testing.assert_allclose(data, expected_data)
+
+    with pytest.raises(RuntimeError):
+        routine.run_callback(callback_exception, pool=pool)
+
+    results = routine.run_callback(
+        callback_exception, ignore_exceptions=True, pool=pool
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+
+    with pytest.raises(ValueError):
+        routine.run_callback(callback, multiprocessing=True, pool=pool)
+
+
+def test_pool_imap_unordered(pool):
+    items = [(i, (i, 2)) for i in range(10)]
+    results = dict(pool.imap_unordered(pow, items, chunksize=3))
+    assert results == {i: i**2 for i in range(10)}
+
+    with pytest.raises(ValueError):
+        EmulatorPool(num_workers=0)
@@ -295,11 +295,17 @@ def test_interpret_vs_python_vs_numba():
         collect_callback, waveform_runtime="numba"
     )
 
-    for interp_result, python_result, numba_result in zip(
-        interp_results, python_results, numba_results
+    tabulated_results = program.bloqade.python().run_callback(
+        collect_callback, waveform_runtime="tabulated"
+    )
+
+    for interp_result, python_result, numba_result, tabulated_result in zip(
+        interp_results, python_results, numba_results, tabulated_results
     ):
         assert np.allclose(interp_result, python_result)
         assert np.allclose(interp_result, numba_result)
+        # the phase and the polynomial detuning are interpolated
+        assert np.allclose(interp_result, tabulated_result, atol=1e-5)
 
 
 if __name__ == "__main__":
@@ -290,5 +290,30 @@ def test_bloqade_filling():
     KS_test(a_post_processed, b)
 
 
+def test_exact_report():
+    program = (
+        Chain(4, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.piecewise_linear([0.2, 1.0, 0.2], [-5, -5, "d", "d"])
+        .amplitude.uniform.piecewise_linear([0.2, 1.0, 0.2], [0, 15, 15, 0])
+        .batch_assign(d=[0, 5])
+    )
+
+    batch = program.bloqade.python().run(100, blockade_radius=7.0, exact=True)
+    report = batch.report()
+    emulations = program.bloqade.python().hamiltonian(blockade_radius=7.0)
+
+    for emulation, densities, counts in zip(
+        emulations, report.rydberg_densities().to_numpy(), report.counts()
+    ):
+        (state,) = emulation.evolve(atol=1e-14, rtol=1e-7)
+        assert np.allclose(densities, state.densities())
+        assert np.isclose(sum(counts.values()), 1.0)
+
+    loaded_batch = loads(dumps(batch))
+    assert np.allclose(
+        loaded_batch.report().rydberg_densities(), report.rydberg_densities()
+    )
+
+
 if __name__ == "__main__":
     test_bloqade_filling()
@@ -279,3 +279,138 @@ def test_rydberg_densities():
             filter_perfect_filling=True, clusters=(1, 0)
         ).to_numpy(),
     ), "failed, filter perfect filling and cluster (1, 0)"
+
+
+def test_report_rows():
+    from bloqade.submission.ir.parallel import ClusterLocationInfo, ParallelDecoder
+    from bloqade.submission.ir.task_results import QuEraTaskResults
+    from bloqade.task.batch import _ReportRows
+
+    mapping = [
+        ClusterLocationInfo(
+            cluster_index=cluster_index,
+            global_location_index=global_location_index,
+            cluster_location_index=cluster_location_index,
+        )
+        for cluster_index, global_location_index, cluster_location_index in [
+            ((0, 0), 0, 0),
+            ((0, 0), 1, 1),
+            ((0, 1), 2, 1),
+            ((0, 1), 3, 0),
+        ]
+    ]
+    geometry = Geometry(
+        sites=[(0, 0), (0, 5), (10, 5), (10, 0)],
+        filling=[1, 0, 1, 1],
+        parallel_decoder=ParallelDecoder(mapping),
+    )
+    results = QuEraTaskResults(
+        task_status="Completed",
+        shot_outputs=[
+            {
+                "shot_status": "Completed",
+                "pre_sequence": [1, 0, 1, 0],
+                "post_sequence": [1, 0, 0, 0],
+            },
+            {"shot_status": "MissingMeasurement"},
+            {
+                "shot_status": "Completed",
+                "pre_sequence": [1, 0, 1, 1],
+                "post_sequence": [0, 0, 1, 1],
+            },
+        ],
+    )
+
+    rows = _ReportRows()
+    rows.add(2, geometry, results, [0.5, 0.25, 0.25])
+    df, weights = rows.build()
+
+    index = pd.MultiIndex.from_tuples(
+        [
+            (2, (0, 0), "10", "10"),
+            (2, (0, 1), "11", "01"),
+            (2, (0, 0), "10", "10"),
+            (2, (0, 1), "11", "11"),
+        ],
+        names=["task_number", "cluster", "perfect_sorting", "pre_sequence"],
+    )
+    expected = pd.DataFrame(
+        np.array([[1, 0], [0, 0], [0, 0], [1, 1]], dtype=np.int8), index=index
+    )
+
+    assert df.equals(expected)
+    assert df.index.equals(index)
+    assert weights.tolist() == [0.5, 0.5, 0.25, 0.25]
+
+
+def report_loop(tasks):
+    """Data of the report of `tasks` built shot by shot and cluster by cluster,
+    the reference of the vectorized `_ReportRows`."""
+    from bloqade.submission.ir.task_results import QuEraShotStatusCode
+
+    index = []
+    data = []
+    for task_number, task in tasks.items():
+        perfect_sorting = "".join(map(str, task.geometry.filling))
+        cluster_indices = task.geometry.parallel_decoder.get_cluster_indices()
+
+        for shot in task.result().shot_outputs:
+            if shot.shot_status != QuEraShotStatusCode.Completed:
+                continue
+
+            pre = np.asarray(shot.pre_sequence)
+            post = np.asarray(shot.post_sequence)
+            for cluster_coordinate, cluster_index in cluster_indices.items():
+                pfc_sorting = "".join(perfect_sorting[i] for i in cluster_index)
+                pre_sequence = "".join(map(str, pre[cluster_index]))
+                index.append(
+                    (task_number, cluster_coordinate, pfc_sorting, pre_sequence)
+                )
+                data.append(post[cluster_index].astype(np.int8))
+
+    index = pd.MultiIndex.from_tuples(
+        index, names=["task_number", "cluster", "perfect_sorting", "pre_sequence"]
+    )
+    return pd.DataFrame(data, index=index)
+
+
+def test_report_ragged_clusters(tmp_path):
+    from bloqade.atom_arrangement import Chain
+    from bloqade.submission.ir.parallel import ClusterLocationInfo, ParallelDecoder
+    from bloqade.task.batch import LocalBatch
+
+    batch = (
+        Chain(5, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.constant("detuning", 1.0)
+        .batch_assign(detuning=[0.0, 1.0])
+        .quera.mock(state_file=str(tmp_path / "mock_state.txt"))
+        .run_async(50)
+    )
+
+    # clusters of 3 and 2 sites, the second one in reverse order
+    mapping = [
+        ClusterLocationInfo(
+            cluster_index=cluster_index,
+            global_location_index=global_location_index,
+            cluster_location_index=cluster_location_index,
+        )
+        for cluster_index, global_location_index, cluster_location_index in [
+            ((0, 0), 0, 0),
+            ((0, 0), 1, 1),
+            ((0, 0), 2, 2),
+            ((0, 1), 3, 1),
+            ((0, 1), 4, 0),
+        ]
+    ]
+    for task in batch.tasks.values():
+        task.parallel_decoder = ParallelDecoder(mapping)
+        task.fetch()
+
+    expected = report_loop(batch.tasks)
+    assert expected.shape == (2 * 50 * 2, 3)
+
+    remote_report = batch.report()
+    local_report = LocalBatch(None, batch.tasks).report()
+
+    pd.testing.assert_frame_equal(remote_report.dataframe, expected)
+    pd.testing.assert_frame_equal(local_report.dataframe, expected)
@@ -0,0 +1,88 @@
+from decimal import Decimal
+import bloqade.ir.control.waveform as waveform
+from bloqade.ir.scalar import cast
+from bloqade.compiler.analysis.common import ScanBreakpoints
+
+
+def test_instruction():
+    wf = waveform.Linear(0.0, 1.0, 2.0)
+    assert ScanBreakpoints().scan(wf) == (Decimal("0"), Decimal("2.0"))
+
+
+def test_append_and_slice():
+    wf = waveform.Constant(1.0, 1.0).append(waveform.Linear(0.0, 1.0, 2.0))
+    assert ScanBreakpoints().scan(wf) == (
+        Decimal("0"),
+        Decimal("1.0"),
+        Decimal("3.0"),
+    )
+
+    assert ScanBreakpoints().scan(wf[0.5:2.5]) == (
+        Decimal("0"),
+        Decimal("0.5"),
+        Decimal("2.0"),
+    )
+
+    assert ScanBreakpoints().scan(-wf) == ScanBreakpoints().scan(wf)
+    assert ScanBreakpoints().scan(wf.smooth(0.1, waveform.Gaussian())) == (
+        Decimal("0"),
+        Decimal("3.0"),
+    )
+
+
+def test_add_and_sample():
+    wf = waveform.Constant(1.0, 1.0).append(waveform.Constant(2.0, 1.0))
+    other = waveform.Linear(0.0, 1.0, 1.5)
+    assert ScanBreakpoints().scan(wf + other) == (
+        Decimal("0"),
+        Decimal("1.0"),
+        Decimal("1.5"),
+        Decimal("2.0"),
+    )
+
+    sampled = waveform.Sample(
+        waveform.Linear(0.0, 1.0, 1.0), waveform.Interpolation.Linear, cast(0.3)
+    )
+    assert ScanBreakpoints().scan(sampled) == (
+        Decimal("0"),
+        Decimal("0.3"),
+        Decimal("0.6"),
+        Decimal("1.0"),
+    )
+
+
+def test_assignments():
+    wf = waveform.Constant(1.0, "t").append(waveform.Constant(2.0, 1.0))
+    assert ScanBreakpoints({"t": 0.5}).scan(wf) == (
+        Decimal("0"),
+        Decimal("0.5"),
+        Decimal("1.5"),
+    )
+
+
+def test_constant_intervals():
+    wf = (
+        waveform.Linear(0.0, 1.0, 0.5)
+        .append(waveform.Constant(1.0, 2.0))
+        .append(waveform.Linear(1.0, 0.0, 0.5))
+    )
+    assert ScanBreakpoints().scan_constant_intervals(wf) == (
+        (Decimal("0.5"), Decimal("2.5")),
+    )
+
+    assert ScanBreakpoints().scan_constant_intervals(wf[1.0:3.0]) == (
+        (Decimal("0"), Decimal("1.5")),
+    )
+
+    other = waveform.Constant(1.0, 1.0).append(waveform.Linear(1.0, 0.0, 2.0))
+    assert ScanBreakpoints().scan_constant_intervals(wf + other) == (
+        (Decimal("0.5"), Decimal("1.0")),
+    )
+
+    sampled = waveform.Sample(
+        waveform.Linear(0.0, 1.0, 1.0), waveform.Interpolation.Constant, cast(0.5)
+    )
+    assert ScanBreakpoints().scan_constant_intervals(sampled) == (
+        (Decimal("0"), Decimal("0.5")),
+        (Decimal("0.5"), Decimal("1.0")),
+    )
@@ -0,0 +1,161 @@
+from bloqade.atom_arrangement import Chain, Square
+from bloqade.emulate.ir.space import Space
+from bloqade.emulate.pool import EmulatorPool, worker_num_threads
+from bloqade.emulate.schedule import (
+    MIN_THREADED_SIZE,
+    ParallelPlan,
+    plan_parallelism,
+    schedule,
+    task_cost,
+    task_costs,
+)
+import numpy as np
+import pytest
+
+
+def get_programs(blockade_radius):
+    routine = (
+        Chain(4, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.constant(1.0, "duration")
+        .rabi.amplitude.uniform.constant(15.0, "duration")
+        .location(0)
+        .constant(1.0, "duration")
+        .batch_assign(duration=[0.5, 2.0])
+        .bloqade.python()
+    )
+    return [
+        emulation.task_data.emulator_ir
+        for emulation in routine.hamiltonian(blockade_radius=blockade_radius)
+    ]
+
+
+def test_space_estimate_size():
+    (full_space, _) = get_programs(0.0)
+    assert Space.estimate_size(full_space.register) == 2**4
+
+    chain = (
+        Chain(12, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.constant(1.0, 0.5)
+        .bloqade.python()
+        .hamiltonian(blockade_radius=6.2)
+    )
+    (program,) = [emulation.task_data.emulator_ir for emulation in chain]
+    size = Space.create(program.register).size
+    assert size <= Space.estimate_size(program.register) <= 1.05 * size
+
+
+def test_task_cost():
+    short, long = get_programs(6.2)
+    size = Space.estimate_size(short.register)
+
+    # the interactions, the detuning and the rabi terms on 4 atoms and 1 atom
+    assert task_cost(short) == size * 0.5 * (1 + 1 + 4 + 1)
+    assert task_costs([short, long]) == [task_cost(short), task_cost(long)]
+
+    (full_space, _) = get_programs(0.0)
+    assert task_cost(full_space) == 2**4 * 0.5 * 7
+
+    square = (
+        Square(3, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.constant(1.0, 0.5)
+        .bloqade.python()
+        .hamiltonian()
+    )
+    (program,) = [emulation.task_data.emulator_ir for emulation in square]
+    assert task_cost(program) > task_cost(full_space)
+
+
+def test_schedule():
+    costs = [1.0, 8.0, 1.0, 4.0, 1.0, 1.0]
+
+    # chunks of at least a quarter of the average cost per worker
+    assert schedule(costs, num_workers=4) == [[1], [3], [0], [2], [4], [5]]
+    assert schedule(costs, num_workers=2) == [[1], [3], [0, 2], [4, 5]]
+    assert schedule(costs, num_workers=1) == [[1], [3], [0, 2, 4, 5]]
+    assert schedule(costs, num_workers=1, chunksize=3) == [[1], [3], [0, 2, 4], [5]]
+    assert schedule([], num_workers=2) == []
+
+
+def test_schedule_pool():
+    items = [(i, (i, 2)) for i in range(6)]
+    costs = [1.0, 8.0, 1.0, 4.0, 1.0, 1.0]
+
+    with EmulatorPool(num_workers=1, warmup=False) as pool:
+        results = list(pool.imap_unordered(pow, items, costs=costs))
+
+    # a single worker completes the chunks in the order of submission
+    assert [key for key, _ in results] == [1, 3, 0, 2, 4, 5]
+    np.testing.assert_equal([result for _, result in results], [1, 9, 0, 4, 16, 25])
+
+
+def test_plan_parallelism():
+    # many small tasks, a process per core
+    plan = plan_parallelism([1.0] * 16, [16] * 16, num_cores=8)
+    assert (plan.num_workers, plan.num_threads, plan.max_threads) == (8, 1, 1)
+    assert plan.makespan == 2.0
+
+    # a few large tasks, the cores left are used as threads
+    sizes = [MIN_THREADED_SIZE] * 2
+    plan = plan_parallelism([1.0, 1.0], sizes, num_cores=8)
+    assert (plan.num_workers, plan.num_threads, plan.max_threads) == (2, 4, 8)
+
+    # a large task dominates the batch
+    plan = plan_parallelism([8.0, 1.0, 1.0], [MIN_THREADED_SIZE, 16, 16], 4)
+    assert (plan.num_workers, plan.num_threads) == (1, 4)
+
+    assert plan_parallelism([], [], num_cores=4).num_workers == 1
+
+    with pytest.raises(ValueError):
+        plan_parallelism([1.0], [1], num_cores=0)
+
+
+def test_parallel_plan_threads():
+    plan = ParallelPlan(2, 2, 4, 4, 0.0)
+    assert [plan.threads(n) for n in (3, 2, 1)] == [2, 2, 4]
+
+    plan = ParallelPlan(4, 1, 1, 4, 0.0)
+    assert [plan.threads(n) for n in (4, 1)] == [1, 1]
+
+
+def threads(*_):
+    return worker_num_threads()
+
+
+def test_plan_pool():
+    routine = (
+        Chain(4, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.constant("detuning", 0.5)
+        .rabi.amplitude.uniform.constant(15.0, 0.5)
+        .batch_assign(detuning=[-1.0, 1.0, 2.0])
+        .bloqade.python()
+    )
+    plan = routine.plan(num_cores=2)
+    assert (plan.num_workers, plan.num_threads) == (2, 1)
+
+    expected = routine.run(1, exact=True)
+    with plan.pool(warmup=False, chunksize=1) as pool:
+        assert pool.num_workers == 2
+
+        results = dict(pool.imap_unordered(threads, [(i, ()) for i in range(3)]))
+        assert set(results.values()) == {1}
+
+        batch = routine.run(1, exact=True, pool=pool)
+        for expected_task, task in zip(expected.tasks.values(), batch.tasks.values()):
+            np.testing.assert_allclose(task.probabilities, expected_task.probabilities)
+
+
+def test_multiprocessing_chunks():
+    routine = (
+        Chain(3, lattice_spacing=6.1)
+        .rydberg.detuning.uniform.constant("detuning", 0.5)
+        .rabi.amplitude.uniform.constant(15.0, 0.5)
+        .batch_assign(detuning=[-1.0, 0.0, 1.0, 2.0, 3.0])
+        .bloqade.python()
+    )
+    expected = routine.run(1, exact=True)
+    batch = routine.run(1, exact=True, multiprocessing=True, num_workers=2)
+
+    assert list(batch.tasks.keys()) == list(expected.tasks.keys())
+    for expected_task, task in zip(expected.tasks.values(), batch.tasks.values()):
+        assert task.metadata == expected_task.metadata
+        np.testing.assert_allclose(task.probabilities, expected_task.probabilities)
@@ -52,6 +52,57 @@ def test_two_level_subspace_3():
     np.testing.assert_equal(space.configurations, actual_configs)
 
 
+@pytest.mark.parametrize("atom_type", [TwoLevelAtom, ThreeLevelAtom])
+@pytest.mark.parametrize("grow", [False, True])
+def test_subspace_brute_force(atom_type, grow, monkeypatch):
+    rng = np.random.default_rng(1234)
+    positions = list(map(tuple, rng.uniform(0, 10, size=(9, 2)).round(1)))
+    blockade_radius = 3.5
+    register = Register(atom_type, positions, blockade_radius)
+    if grow:
+        # the configurations are enumerated into a buffer growing from one
+        monkeypatch.setattr(Space, "estimate_size", staticmethod(lambda _: 0.0))
+
+    space = Space.create(register)
+
+    full_space = Space.create(Register(atom_type, positions, 0))
+    is_rydberg = np.array(
+        [full_space.is_rydberg_at(index) for index in range(len(positions))]
+    )
+    mask = np.ones(full_space.size, dtype=bool)
+    for i, site_1 in enumerate(positions):
+        for j, site_2 in enumerate(positions[:i]):
+            if np.linalg.norm(np.subtract(site_1, site_2)) <= blockade_radius:
+                mask &= ~(is_rydberg[i] & is_rydberg[j])
+
+    assert space.space_type.value == "sub_space"
+    assert space.configurations.dtype == full_space.configurations.dtype
+    np.testing.assert_equal(space.configurations, full_space.configurations[mask])
+
+
+@pytest.mark.parametrize("atom_type", [TwoLevelAtom, ThreeLevelAtom])
+@pytest.mark.parametrize("blockade_radius", [1.0, 1.5, 2.1])
+def test_configuration_ranking(atom_type, blockade_radius):
+    positions = [(i, j) for i in range(3) for j in range(4)]
+    space = Space.create(Register(atom_type, positions, blockade_radius))
+    full_space = Space.create(Register(atom_type, positions, 0))
+
+    # the configurations of two level atoms are ranked without searching them
+    assert (space.ranking is not None) == (atom_type is TwoLevelAtom)
+    indices = np.searchsorted(space.configurations, full_space.configurations)
+    found = np.zeros_like(indices, dtype=bool)
+    found[indices < space.size] = (
+        space.configurations[indices[indices < space.size]]
+        == full_space.configurations[indices < space.size]
+    )
+    expected = np.where(found, indices, -1)
+
+    np.testing.assert_equal(space.index_of(full_space.configurations), expected)
+    np.testing.assert_equal(
+        full_space.index_of(full_space.configurations), np.arange(full_space.size)
+    )
+
+
 def test_three_level_space():
     positions = [(0, 0), (0, 1)]
     register = Register(ThreeLevelAtom, positions, 0)
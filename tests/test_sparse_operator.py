@@ -11,6 +11,7 @@ from bloqade.emulate.sparse_operator import (
 )
 from scipy.sparse import random
 import numpy as np
+import pytest
 
 np.random.seed(12039)
 
@@ -188,3 +189,273 @@ def test_index_mapping_3():
     print(expected_result)
 
     assert np.allclose(result, expected_result)
+
+
+def test_fused_operator():
+    from bloqade.emulate.sparse_operator import FusedOperator, _fused_matvec_impl
+
+    size = 10
+    rydberg = np.random.normal(size=size)
+    diagonals = [np.random.normal(size=size) for _ in range(2)]
+    terms = [random(size, size, density=0.3, format="coo") for _ in range(3)]
+
+    B = FusedOperator.create(rydberg, diagonals, terms)
+
+    diag_coeffs = np.random.normal(size=2)
+    term_coeffs = np.random.normal(size=3) + 1j * np.random.normal(size=3)
+    v = np.random.normal(size=size) + 1j * np.random.normal(size=size)
+    a = 3j
+
+    A = np.diag(rydberg + diag_coeffs @ np.stack(diagonals)) + sum(
+        coeff * term.toarray() for coeff, term in zip(term_coeffs, terms)
+    )
+    expected_result = a * A.dot(v)
+
+    result = B.matvec(diag_coeffs, term_coeffs, v, scale=a)
+
+    assert np.allclose(result, expected_result)
+
+    result = np.zeros_like(v)
+
+    _fused_matvec_impl.py_func(
+        1.0,
+        B.rydberg,
+        diag_coeffs,
+        B.diagonals,
+        term_coeffs,
+        B.terms,
+        B.data,
+        B.indices,
+        B.indptr,
+        B.flip_terms,
+        B.flip_masks,
+        B.flip_targets,
+        B.flip_values,
+        a,
+        v,
+        result,
+    )
+
+    assert np.allclose(result, expected_result)
+
+    expected_result = a * (A - np.diag(rydberg)).dot(v)
+    result = B.matvec(diag_coeffs, term_coeffs, v, scale=a, rydberg_scale=0.0)
+
+    assert np.allclose(result, expected_result)
+
+
+def test_matmat():
+    from bloqade.emulate.sparse_operator import (
+        FusedOperator,
+        _fused_matvec_impl,
+    )
+
+    A = random(10, 10, density=0.5, format="csr")
+    V = np.random.normal(size=(10, 4)) + 1j * np.random.normal(size=(10, 4))
+    a = 3
+
+    expected_result = a * A.dot(V) + V
+
+    for B in [SparseMatrixCSR.create(A), SparseMatrixCSC.create(A)]:
+        result = V.copy()
+        B.matvec(V, out=result, scale=a)
+        assert np.allclose(result, expected_result)
+
+        # strided vectors are viewed as a single column as well
+        result = V.copy()
+        B.matvec(V[:, 1], out=result[:, 1], scale=a)
+        assert np.allclose(result[:, 1], expected_result[:, 1])
+        assert np.array_equal(np.delete(result, 1, axis=1), np.delete(V, 1, axis=1))
+
+    B = SparseMatrixCSR.create(A)
+    result = V.copy()
+    _csr_matvec_impl.py_func(B.shape[0], B.data, B.indices, B.indptr, a, V, result)
+    assert np.allclose(result, expected_result)
+
+    B = SparseMatrixCSC.create(A)
+    result = V.copy()
+    _csc_matvec_impl.py_func(B.shape[1], B.data, B.indices, B.indptr, a, V, result)
+    assert np.allclose(result, expected_result)
+
+    for B in [
+        IndexMapping(10, slice(0, None, 2), slice(1, None, 2)),
+        IndexMapping(10, np.random.permutation(10), np.random.permutation(10)),
+    ]:
+        expected_result = a * B.tocsr().dot(V) + V
+
+        result = V.copy()
+        B.matvec(V, out=result, scale=a)
+        assert np.allclose(result, expected_result)
+
+        rows, cols = B._coo_indices
+        result = V.copy()
+        _index_mapping_impl.py_func(cols, rows, a, V, result)
+        assert np.allclose(result, expected_result)
+
+    rydberg = np.random.normal(size=10)
+    diagonals = [np.random.normal(size=10)]
+    terms = [random(10, 10, density=0.3, format="coo") for _ in range(2)]
+    B = FusedOperator.create(rydberg, diagonals, terms)
+
+    diag_coeffs = np.random.normal(size=1)
+    term_coeffs = np.random.normal(size=2) + 1j * np.random.normal(size=2)
+
+    expected_result = np.stack(
+        [B.matvec(diag_coeffs, term_coeffs, v, scale=-1j) for v in V.T], axis=1
+    )
+
+    result = B.matvec(diag_coeffs, term_coeffs, V, scale=-1j)
+    assert np.allclose(result, expected_result)
+
+    result = np.zeros_like(V)
+    _fused_matvec_impl.py_func(
+        1.0,
+        B.rydberg,
+        diag_coeffs,
+        B.diagonals,
+        term_coeffs,
+        B.terms,
+        B.data,
+        B.indices,
+        B.indptr,
+        B.flip_terms,
+        B.flip_masks,
+        B.flip_targets,
+        B.flip_values,
+        -1j,
+        V,
+        result,
+    )
+    assert np.allclose(result, expected_result)
+
+
+def test_parallel():
+    from bloqade.emulate.sparse_operator import (
+        FusedOperator,
+        _csr_matvec_parallel_impl,
+        _fused_matvec_parallel_impl,
+        _index_mapping_parallel_impl,
+    )
+
+    A = random(10, 10, density=0.5, format="csr")
+    v = np.random.normal(size=10) + 1j * np.random.normal(size=10)
+    V = np.random.normal(size=(10, 3)) + 1j * np.random.normal(size=(10, 3))
+    a = 3
+
+    for B in [SparseMatrixCSR.create(A), SparseMatrixCSC.create(A)]:
+        for x in [v, V]:
+            result = x.copy()
+            B.matvec(x, out=result, scale=a, num_threads=2)
+            assert np.allclose(result, a * A.dot(x) + x)
+
+    B = SparseMatrixCSR.create(A)
+    result = v.copy()
+    _csr_matvec_parallel_impl.py_func(
+        B.shape[0], B.data, B.indices, B.indptr, a, v, result
+    )
+    assert np.allclose(result, a * A.dot(v) + v)
+
+    for B in [
+        IndexMapping(10, slice(0, None, 2), slice(1, None, 2)),
+        IndexMapping(10, np.random.permutation(10), np.random.permutation(10)),
+    ]:
+        for x in [v, V]:
+            result = x.copy()
+            B.matvec(x, out=result, scale=a, num_threads=2)
+            assert np.allclose(result, a * B.tocsr().dot(x) + x)
+
+        rows, cols = B._coo_indices
+        result = v.copy()
+        _index_mapping_parallel_impl.py_func(cols, rows, a, v, result)
+        assert np.allclose(result, a * B.tocsr().dot(v) + v)
+
+    rydberg = np.random.normal(size=10)
+    diagonals = [np.random.normal(size=10)]
+    terms = [random(10, 10, density=0.3, format="coo") for _ in range(2)]
+    B = FusedOperator.create(rydberg, diagonals, terms)
+
+    diag_coeffs = np.random.normal(size=1)
+    term_coeffs = np.random.normal(size=2) + 1j * np.random.normal(size=2)
+
+    for x in [v, V]:
+        expected_result = B.matvec(diag_coeffs, term_coeffs, x, scale=-1j)
+        result = B.matvec(diag_coeffs, term_coeffs, x, scale=-1j, num_threads=2)
+        assert np.allclose(result, expected_result)
+
+    result = np.zeros_like(v)
+    _fused_matvec_parallel_impl.py_func(
+        1.0,
+        B.rydberg,
+        diag_coeffs,
+        B.diagonals,
+        term_coeffs,
+        B.terms,
+        B.data,
+        B.indices,
+        B.indptr,
+        B.flip_terms,
+        B.flip_masks,
+        B.flip_targets,
+        B.flip_values,
+        -1j,
+        v,
+        result,
+    )
+    assert np.allclose(result, B.matvec(diag_coeffs, term_coeffs, v, scale=-1j))
+
+
+@pytest.mark.parametrize("state", [None, 0, 1])
+def test_bit_flip_operator(state):
+    from bloqade.emulate.sparse_operator import (
+        BitFlipOperator,
+        FusedOperator,
+        _bit_flip_impl,
+    )
+
+    sites = [0, 2, 3]
+    values = np.random.normal(size=3)
+    B = BitFlipOperator.create(16, sites, values, state)
+
+    sigma = np.array([[0, 1], [1, 0]])
+    if state is not None:
+        sigma = np.tril(sigma) if state == 1 else np.triu(sigma)
+
+    A = sum(
+        value * np.kron(np.kron(np.eye(2 ** (3 - site)), sigma), np.eye(2**site))
+        for site, value in zip(sites, values)
+    )
+    assert np.array_equal(B.tocsr().toarray(), A)
+    assert np.array_equal(B.T.tocsr().toarray(), A.T)
+
+    v = np.random.normal(size=16) + 1j * np.random.normal(size=16)
+    V = np.random.normal(size=(16, 3)) + 1j * np.random.normal(size=(16, 3))
+    a = 3
+
+    for x in [v, V]:
+        for num_threads in [1, 2]:
+            result = x.copy()
+            B.matvec(x, out=result, scale=a, num_threads=num_threads)
+            assert np.allclose(result, a * A.dot(x) + x)
+
+    result = v.copy()
+    _bit_flip_impl.py_func(B.masks, B.targets, B.values, a, v, result)
+    assert np.allclose(result, a * A.dot(v) + v)
+
+    result = V.copy()
+    _bit_flip_impl.py_func(B.masks, B.targets, B.values, a, V, result)
+    assert np.allclose(result, a * A.dot(V) + V)
+
+    rydberg = np.random.normal(size=16)
+    terms = [B, random(16, 16, density=0.3, format="coo"), B.T]
+    fused = FusedOperator.create(rydberg, [], terms)
+    term_coeffs = np.random.normal(size=3) + 1j * np.random.normal(size=3)
+
+    expected = np.diag(rydberg) + sum(
+        coeff * term.tocsr().toarray() for coeff, term in zip(term_coeffs, terms)
+    )
+    for x in [v, V]:
+        for num_threads in [1, 2]:
+            result = fused.matvec(
+                np.zeros(0), term_coeffs, x, scale=-1j, num_threads=num_threads
+            )
+            assert np.allclose(result, -1j * expected.dot(x))
@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+from bloqade import dumps, loads
+from bloqade.atom_arrangement import Chain
+from bloqade.submission.ir.task_results import (
+    ColumnarTaskResults,
+    QuEraTaskResults,
+    QuEraTaskStatusCode,
+)
+
+
+def shot(status, pre_sequence, post_sequence):
+    return {
+        "shot_status": status,
+        "pre_sequence": pre_sequence,
+        "post_sequence": post_sequence,
+    }
+
+
+def test_columnar_task_results():
+    results = QuEraTaskResults(
+        task_status="Partial",
+        shot_outputs=[
+            shot("Completed", [1, 1, 0], [0, 1, 0]),
+            shot("MissingPostSequence", [1, 1, 0], []),
+            shot("Completed", [1, 1, 0], [0, 1, 0]),
+            shot("MissingMeasurement", [], []),
+        ],
+    )
+
+    columns = ColumnarTaskResults.from_task_results(results)
+
+    assert columns.task_status == QuEraTaskStatusCode.Partial
+    assert columns.nshots == 4
+    assert columns.pre_sequences.dtype == np.uint8
+    np.testing.assert_equal(columns.completed_shots, [True, False, True, False])
+    np.testing.assert_equal(
+        columns.pre_sequences, [[1, 1, 0], [1, 1, 0], [1, 1, 0], [0, 0, 0]]
+    )
+    np.testing.assert_equal(
+        columns.post_sequences, [[0, 1, 0], [0, 0, 0], [0, 1, 0], [0, 0, 0]]
+    )
+
+    assert ColumnarTaskResults.from_task_results(columns) is columns
+    assert columns.to_task_results() == results
+    assert columns == results
+    assert columns != ColumnarTaskResults.from_status(QuEraTaskStatusCode.Partial)
+    assert columns.shot_outputs == results.shot_outputs
+
+    probabilities = columns.export_as_probabilities().probabilities
+    assert probabilities == [
+        (("110", "010"), 0.5),
+        (("110", ""), 0.25),
+        (("", ""), 0.25),
+    ]
+    assert results.export_as_probabilities().probabilities == probabilities
+
+
+def test_columnar_task_results_errors():
+    with pytest.raises(ValueError):
+        ColumnarTaskResults.from_dict(
+            {"shot_outputs": [shot("Completed", [1, 0], [1])]}
+        )
+
+    with pytest.raises(ValueError):
+        ColumnarTaskResults.from_dict(
+            {"shot_outputs": [shot("Completed", [1, 2], [1, 0])]}
+        )
+
+    with pytest.raises(ValueError):
+        ColumnarTaskResults.from_completed_shots(np.zeros((2, 3)), np.zeros((3, 3)))
+
+
+def test_columnar_task_results_serialization():
+    batch = (
+        Chain(3, lattice_spacing=6.1)
+        .rydberg.rabi.amplitude.uniform.constant(15, 1.0)
+        .bloqade.python()
+        .run(20)
+    )
+    (task,) = batch.tasks.values()
+    results = task.task_result_ir
+
+    assert isinstance(results, ColumnarTaskResults)
+    assert results.pre_sequences.shape == (20, 3)
+    assert isinstance(task.result(), QuEraTaskResults)
+    assert task.result() == results.to_task_results()
+
+    (loaded_task,) = loads(dumps(batch)).tasks.values()
+    loaded_results = loaded_task.task_result_ir
+    np.testing.assert_equal(loaded_results.pre_sequences, results.pre_sequences)
+    np.testing.assert_equal(loaded_results.post_sequences, results.post_sequences)
+    assert loaded_results.task_status == results.task_status
+
+
+def test_quera_task_results_serialization(tmp_path):
+    batch = (
+        Chain(3, lattice_spacing=6.1)
+        .rydberg.rabi.amplitude.uniform.constant(15, 1.0)
+        .quera.mock(state_file=str(tmp_path / "mock_state.txt"))
+        .run_async(20)
+    )
+    (task,) = batch.tasks.values()
+    assert isinstance(task.task_result_ir, ColumnarTaskResults)
+    assert task.task_result_ir.task_status == QuEraTaskStatusCode.Enqueued
+
+    results = task.result()
+    assert isinstance(results, QuEraTaskResults)
+    assert len(results.shot_outputs) == 20
+    assert task.task_result_ir.pre_sequences.shape == (20, 3)
+    assert results.json()
+
+    (loaded_task,) = loads(dumps(batch)).tasks.values()
+    assert isinstance(loaded_task.task_result_ir, ColumnarTaskResults)
+    assert loaded_task.task_result_ir == task.task_result_ir
+    assert loaded_task.result() == results
+
+
+def test_columnar_task_results_hash():
+    results = ColumnarTaskResults.from_status(QuEraTaskStatusCode.Completed)
+
+    with pytest.raises(TypeError):
+        hash(results)
+
+
+def test_ragged_export_as_probabilities():
+    results = QuEraTaskResults(
+        task_status="Completed",
+        shot_outputs=[
+            shot("Completed", [1, 1], [0, 1]),
+            shot("Completed", [1, 1, 0], [0, 1, 0]),
+            shot("Completed", [1, 1], [0, 1]),
+            shot("Completed", [1, 1, 0], [0, 1, 1]),
+        ],
+    )
+
+    with pytest.raises(ValueError):
+        ColumnarTaskResults.from_task_results(results)
+
+    assert results.export_as_probabilities().probabilities == [
+        (("11", "01"), 0.5),
+        (("110", "010"), 0.25),
+        (("110", "011"), 0.25),
+    ]
@@ -543,6 +543,25 @@ def test_wvfm_sample():
     )
 
 
+def test_wvfm_sample_exact():
+    wv = (
+        Linear(0, 15.7, 0.1)
+        .append(Constant(15.7, 3.8))
+        .append(Linear(15.7, 0, 0.1))
+    )
+    wf = Sample(wv, Interpolation.Linear, cast(0.05))
+
+    # the samples sent to the hardware are exact decimals
+    clocks, values = wf.samples()
+    assert values[1] == Decimal("7.85")
+    assert values[2:-2] == [Decimal("15.7")] * (len(values) - 4)
+    assert values[-1] == Decimal("0")
+
+    sample_clocks, sample_values = wf.sample_values()
+    assert sample_clocks == clocks
+    np.testing.assert_allclose(sample_values, list(map(float, values)))
+
+
 """
 print(wf[:0.5].duration)
 print(wf[1.0:].duration)
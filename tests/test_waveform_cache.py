@@ -0,0 +1,97 @@
+import numpy as np
+import bloqade.compiler.codegen.python.waveform as codegen_waveform
+from bloqade.compiler.codegen.python.waveform_cache import (
+    CompiledWaveformCache,
+    compiled_waveforms,
+)
+from bloqade.ir.control import waveform
+
+
+def phase_function(t):
+    return np.sin(t)
+
+
+def test_cache_hits():
+    cache = CompiledWaveformCache(maxsize=2)
+    wf = waveform.Linear(0, 1, 0.3).append(waveform.Constant(1, 1.0))
+
+    func = cache.compile(wf)
+    # structurally equal waveforms share the compiled function
+    same_wf = waveform.Linear(0, 1, 0.3).append(waveform.Constant(1, 1.0))
+    assert cache.compile(same_wf) is func
+    assert cache.compile(wf, jit_compiled=False) is not func
+    assert func(0.15) == 0.5
+
+    assert cache.info() == (1, 2, 2, 2)
+    assert not any(
+        name.startswith("__bloqade_waveform") for name in vars(codegen_waveform)
+    )
+
+    cache.clear()
+    assert cache.info() == (0, 0, 2, 0)
+
+
+def test_cache_eviction():
+    cache = CompiledWaveformCache(maxsize=2)
+    wfs = [waveform.Constant(value, 1.0) for value in range(3)]
+
+    funcs = [cache.compile(wf, jit_compiled=False) for wf in wfs]
+    assert len(cache) == 1
+
+    # least recently used waveform has been evicted
+    assert cache.compile(wfs[2], jit_compiled=False) is funcs[2]
+    assert cache.compile(wfs[0], jit_compiled=False) is not funcs[0]
+    assert cache.info() == (4, 1, 2, 1)
+
+
+def test_parameterized_kernel():
+    cache = CompiledWaveformCache()
+    wfs = [
+        waveform.Linear(0, value, 0.3)
+        .append(waveform.Constant(value, 1.0))
+        .append(waveform.PythonFn.create(phase_function, 0.5).scale(value))[0.1:]
+        for value in [0.5, 2.5, 4]
+    ]
+
+    funcs = [cache.compile(wf) for wf in wfs]
+
+    # waveforms with the same structure share the compiled kernel
+    assert len(cache) == 1
+    assert all(func.kernel is funcs[0].kernel for func in funcs)
+    assert cache.info().misses == 1
+
+    times = np.linspace(0, 1.8, 37)
+    for wf, func in zip(wfs, funcs):
+        assert np.allclose([func(time) for time in times], wf.sample_array(times))
+
+
+def test_disk_cache(tmp_path):
+    wf = waveform.Linear(0, 1, 0.3).append(waveform.Constant(1, 1.0))
+
+    func = CompiledWaveformCache(cache_dir=str(tmp_path)).compile(wf)
+    assert len(list(tmp_path.glob("*.py"))) == 1
+
+    other_func = CompiledWaveformCache(cache_dir=str(tmp_path)).compile(wf)
+    assert len(list(tmp_path.glob("*.py"))) == 1
+    assert func(0.15) == other_func(0.15) == 0.5
+
+    # python functions are only cached in memory
+    cache = CompiledWaveformCache(cache_dir=str(tmp_path))
+    func = cache.compile(waveform.PythonFn.create(phase_function, 1.0))
+    assert len(list(tmp_path.glob("*.py"))) == 1
+    assert np.isclose(func(0.5), np.sin(0.5))
+
+
+def test_global_cache_dir(tmp_path):
+    wf = waveform.Linear(0, 2, 0.7).append(waveform.Constant(3, 0.2))
+
+    assert compiled_waveforms.cache_dir is None
+    compiled_waveforms.set_cache_dir(str(tmp_path))
+    try:
+        func = compiled_waveforms.compile(wf)
+        assert len(list(tmp_path.glob("*.py"))) == 1
+        assert np.isclose(func(0.35), 1.0)
+    finally:
+        compiled_waveforms.set_cache_dir(None)
+
+    assert compiled_waveforms.cache_dir is None
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from bloqade import cast
+from bloqade.ir.control import waveform
+from bloqade.compiler.analysis.common import ScanBreakpoints
+from bloqade.compiler.codegen.python.waveform_interpreter import WaveformInterpreter
+from bloqade.compiler.codegen.python.waveform_tabulate import TabulateWaveform
+
+
+def phase_function(t, *, omega=2.0):
+    return np.sin(omega * t)
+
+
+waveforms = [
+    waveform.Constant(1.5, 1.0),
+    waveform.Linear(-5, 5, 0.3),
+    waveform.Poly([1, -2, 3], 0.4),
+    waveform.PythonFn.create(phase_function, 1.3),
+    waveform.Linear(-5, 5, 0.3)
+    .append(waveform.Constant(5, 1.0))
+    .append(waveform.Poly([1, -2, 3], 0.4)),
+    waveform.Linear(0, 15, 0.3).append(waveform.Constant(15, 1.0))[0.1:1.2],
+    waveform.Sample(
+        waveform.PythonFn.create(phase_function, 1.3),
+        waveform.Interpolation.Linear,
+        cast(0.05),
+    ),
+    waveform.Sample(
+        waveform.PythonFn.create(phase_function, 1.3),
+        waveform.Interpolation.Constant,
+        cast(0.05),
+    ),
+    waveform.Linear(0, 1, 1.0).scale(2.0).add(waveform.Constant(2, 0.5)),
+    -waveform.Constant(2, 0.5),
+    waveform.Smooth(
+        0.1,
+        waveform.GaussianKernel,
+        waveform.Linear(-5, 5, 0.3).append(waveform.Constant(5, 1.0)),
+    ),
+]
+
+
+@pytest.mark.parametrize("wf", waveforms)
+def test_interpreter(wf: waveform.Waveform):
+    func = WaveformInterpreter().emit(wf)
+
+    duration = float(wf.duration())
+    times = np.concatenate([np.linspace(-0.1, duration + 0.1, 51), [duration]])
+
+    for time in times:
+        assert np.isclose(func(time), wf(time), rtol=1e-12, atol=1e-12)
+
+
+def test_zero_duration_linear():
+    func = WaveformInterpreter().emit(waveform.Linear(0, 1, 0))
+
+    assert func(0.1) == 0.0
+    with pytest.raises(ValueError):
+        func(0.0)
+
+
+@pytest.mark.parametrize("wf", waveforms)
+def test_sample_array(wf: waveform.Waveform):
+    duration = float(wf.duration())
+    times = np.concatenate([np.linspace(-0.1, duration + 0.1, 51), [duration]])
+
+    values = wf.sample_array(times)
+
+    assert values.dtype == np.float64
+    assert np.allclose(values, [wf(time) for time in times], rtol=1e-12, atol=1e-12)
+
+
+def test_sample_array_assignments():
+    wf = waveform.Linear("a", 5, "t").append(waveform.Constant("b", 1.0))
+    assignments = dict(a=-5, b=3, t=0.5)
+    times = np.linspace(0, 1.6, 33)
+
+    assert np.allclose(
+        wf.sample_array(times, **assignments),
+        [wf(time, **assignments) for time in times],
+    )
+
+
+@pytest.mark.parametrize(
+    "wf",
+    [
+        waveform.Linear(-5, 5, 0.3)
+        .append(waveform.Constant(7, 1.0))
+        .append(waveform.Linear(5, 0, 0.2)),
+        waveform.Linear(0, 15, 0.3).append(waveform.Constant(15, 1.0))[0.1:1.2],
+        waveform.Sample(
+            waveform.PythonFn.create(phase_function, 1.3),
+            waveform.Interpolation.Linear,
+            cast(0.05),
+        ),
+        waveform.Sample(
+            waveform.PythonFn.create(phase_function, 1.3),
+            waveform.Interpolation.Constant,
+            cast(0.05),
+        ),
+        waveform.Linear(0, 1, 1.0).scale(2.0).add(waveform.Constant(2, 0.5)),
+    ],
+)
+def test_tabulate_piecewise_linear(wf: waveform.Waveform):
+    func = TabulateWaveform().emit(wf)
+
+    duration = float(wf.duration())
+    times = np.concatenate([np.linspace(0, duration + 0.1, 101), func.times])
+
+    # only the breakpoints are tabulated
+    assert len(np.unique(func.times)) == len(ScanBreakpoints().scan(wf))
+    for time in times:
+        assert np.isclose(func(time), wf(time), rtol=1e-12, atol=1e-12)
+
+
+def test_tabulate_smooth():
+    wf = waveform.PythonFn.create(phase_function, 1.3)
+    func = TabulateWaveform(atol=1e-8, rtol=1e-8).emit(wf)
+
+    times = np.linspace(0, 1.4, 1001)
+    values = [func(time) for time in times]
+    assert np.allclose(values, wf.sample_array(times), atol=1e-7)